@@ -0,0 +1,118 @@
+# 特徴量抽出モジュールのインポート時間の計測と、重い依存を読み込んでいないかの確認
+# 各モジュールを新しいPythonプロセスでインポートし、
+# - インポートにかかった時間（中央値）
+# - 読み込まれた禁止モジュール（matplotlib, sklearn, seaborn, pandas, umap）
+# を表示する。禁止モジュールが読み込まれた場合・時間の上限を超えた場合は終了コード1
+#
+# 使用例:
+#   python analyze/benchmark/import_time_benchmark.py
+#   python analyze/benchmark/import_time_benchmark.py --repeat 5 --max-seconds 2.0
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+ANALYZE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 計測対象モジュール（ワーカー・オンライン割り当てで読み込まれるもの）
+TARGET_MODULES = [
+    'ext_cfg_dfg_feature',
+    'kmeans_final_clean',
+    'cluster_service',
+]
+
+# 特徴量抽出・割り当て時に読み込まれてはいけないモジュール
+FORBIDDEN_MODULES = ['matplotlib', 'sklearn', 'seaborn', 'pandas', 'umap']
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+error = None
+try:
+    import {module}
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+elapsed = time.perf_counter() - start
+forbidden = {forbidden!r}
+loaded = sorted({{name.split('.')[0] for name in sys.modules}} & set(forbidden))
+print(json.dumps({{'elapsed': elapsed, 'loaded': loaded, 'error': error}}))
+"""
+
+def measure_import(module, repeat=3):
+    """
+    モジュールを新しいプロセスで repeat 回インポートして計測
+
+    Args:
+        module (str): モジュール名
+        repeat (int): 計測回数
+
+    Returns:
+        dict: {'module', 'median', 'runs', 'loaded', 'error'}
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ANALYZE_DIR, env.get('PYTHONPATH')]))
+    code = _PROBE.format(module=module, forbidden=FORBIDDEN_MODULES)
+
+    runs = []
+    loaded = set()
+    error = None
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=ANALYZE_DIR, env=env, capture_output=True, text=True
+        )
+        try:
+            # インポート時の print 出力が混ざるため最終行だけを読む
+            report = json.loads(completed.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'no output'
+            break
+        runs.append(report['elapsed'])
+        loaded.update(report['loaded'])
+        if report['error']:
+            error = report['error']
+            break
+
+    return {
+        'module': module,
+        'median': statistics.median(runs) if runs else None,
+        'runs': runs,
+        'loaded': sorted(loaded),
+        'error': error,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='インポート時間と重い依存の読み込みを確認')
+    parser.add_argument('modules', nargs='*', default=TARGET_MODULES,
+                        help='計測するモジュール（既定: 特徴量抽出・クラスタリング関連）')
+    parser.add_argument('--repeat', type=int, default=3, help='計測回数（中央値を表示）')
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help='インポート時間の上限（秒）。超えた場合は失敗')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"🚀 インポート時間の計測（{args.repeat}回の中央値）")
+    for module in args.modules:
+        result = measure_import(module, repeat=args.repeat)
+        if result['error']:
+            print(f"❌ {module}: インポートエラー ({result['error']})")
+            failed = True
+            continue
+
+        line = f"{module}: {result['median'] * 1000:.1f} ms"
+        if result['loaded']:
+            print(f"❌ {line}  禁止モジュールを読み込み: {', '.join(result['loaded'])}")
+            failed = True
+        elif args.max_seconds is not None and result['median'] > args.max_seconds:
+            print(f"❌ {line}  上限 {args.max_seconds:.2f} 秒を超過")
+            failed = True
+        else:
+            print(f"✅ {line}")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+# 特徴量抽出・クラスタリングの再現可能なベンチマーク
+# - AtCoder形式（submissions_typical90_*/patternN/submission_M.py）の合成コーパスを生成
+#   （パターン数・ファイル数・関数数・ネストの深さ・ループ/分岐の密度を指定可能、乱数シード固定）
+# - 既存のコーパス（../atcoder/submissions_typical90_* と同じ構成）も使用可能
+# - 次の処理の所要時間（repeat回の中央値）とスループットを計測し、JSONで保存する
+#   batch_extract_integrated_features / general_kmeans_algorithm /
+#   hungarian_cluster_pattern_assignment / キャッシュの保存・読み込み（JSON, SQLite）
+# - --compare で前回の結果と比較（比 = 今回 / 前回、1より大きければ遅くなった）
+#
+# 使用例:
+#   python analyze/benchmark/pipeline_benchmark.py --patterns 4 --files-per-pattern 25
+#   python analyze/benchmark/pipeline_benchmark.py --corpus ../atcoder/submissions_typical90_d --jobs 4
+#   python analyze/benchmark/pipeline_benchmark.py --skip-extraction --kmeans-samples 100000 --compare bench_prev.json
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+ANALYZE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ANALYZE_DIR)
+
+INTEGRATED_VECTOR_SIZE = 11
+
+# --- 合成コーパス ---
+def _generate_block(rng, depth, max_depth, loop_density, branch_density, variables, indent):
+    """ネストしたループ・分岐を含む文の並びを生成"""
+    pad = '    ' * indent
+    lines = []
+    for _ in range(rng.randint(1, 3)):
+        var = rng.choice(variables)
+        other = rng.choice(variables)
+        r = rng.random()
+        if depth < max_depth and r < loop_density:
+            if rng.random() < 0.7:
+                loop_var = f"i{depth}"
+                lines.append(f"{pad}for {loop_var} in range({other} % 7 + 1):")
+                lines.append(f"{pad}    {var} += {loop_var}")
+            else:
+                lines.append(f"{pad}while {var} > {rng.randint(1, 50)}:")
+                lines.append(f"{pad}    {var} //= 2")
+            lines.extend(_generate_block(rng, depth + 1, max_depth, loop_density, branch_density, variables, indent + 1))
+        elif depth < max_depth and r < loop_density + branch_density:
+            lines.append(f"{pad}if {var} % {rng.randint(2, 5)} == 0:")
+            lines.extend(_generate_block(rng, depth + 1, max_depth, loop_density, branch_density, variables, indent + 1))
+            if rng.random() < 0.5:
+                lines.append(f"{pad}else:")
+                lines.append(f"{pad}    {var} = {other} - 1")
+        else:
+            lines.append(f"{pad}{var} = {other} * {rng.randint(1, 9)} + {var}")
+    return lines
+
+def generate_submission(rng, n_functions, nesting_depth, loop_density, branch_density):
+    """
+    AtCoderの提出風のPythonソースを1つ生成
+
+    Args:
+        rng (random.Random): 乱数生成器
+        n_functions (int): 関数の数
+        nesting_depth (int): ループ・分岐の最大ネスト深さ
+        loop_density (float): 各文がループになる確率
+        branch_density (float): 各文が分岐になる確率
+
+    Returns:
+        str: ソースコード
+    """
+    lines = []
+    for f in range(n_functions):
+        variables = ['a', 'b', 'total']
+        lines.append(f"def solve{f}(a, b):")
+        lines.append("    total = 0")
+        lines.extend(_generate_block(rng, 0, nesting_depth, loop_density, branch_density, variables, 1))
+        lines.append("    return total + a - b")
+        lines.append("")
+
+    lines.append("n = int(input())")
+    lines.append("m = n * 2")
+    for f in range(n_functions):
+        lines.append(f"n = solve{f}(n, m)")
+    lines.append("print(n)")
+    return '\n'.join(lines) + '\n'
+
+def generate_corpus(output_dir, n_patterns=4, files_per_pattern=25, n_functions=2, nesting_depth=3,
+                    loop_density=0.3, branch_density=0.3, seed=0):
+    """
+    合成コーパスを submissions_typical90_*/patternN/submission_M.py の構成で生成
+
+    パターンごとに関数数・ネストの深さ・ループ/分岐の密度を少しずつ変え、
+    クラスタリングで区別できる程度の違いを持たせる
+
+    Returns:
+        list: 生成したファイルパスのリスト
+    """
+    rng = random.Random(seed)
+    files = []
+    submission_id = 0
+    for pattern in range(1, n_patterns + 1):
+        pattern_dir = os.path.join(output_dir, f"pattern{pattern}")
+        os.makedirs(pattern_dir, exist_ok=True)
+        shape = {
+            'n_functions': max(1, n_functions + (pattern % 3) - 1),
+            'nesting_depth': max(1, nesting_depth + (pattern % 2)),
+            'loop_density': min(0.9, loop_density * (1 + 0.5 * (pattern % 3))),
+            'branch_density': min(0.9, branch_density * (1 + 0.5 * ((pattern + 1) % 3))),
+        }
+        for _ in range(files_per_pattern):
+            submission_id += 1
+            path = os.path.join(pattern_dir, f"submission_{submission_id}.py")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(generate_submission(rng, **shape))
+            files.append(path)
+    return files
+
+# --- 計測 ---
+def measure(func, repeat):
+    """func を repeat 回実行し、(中央値, 各回の秒数, 最後の戻り値) を返す"""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs), runs, result
+
+def _record(seconds, runs, items, unit):
+    return {
+        'seconds': seconds,
+        'runs': runs,
+        'items': items,
+        'throughput': items / seconds if seconds > 0 else None,
+        'unit': unit
+    }
+
+def synthetic_vectors(n_samples, n_patterns, seed=0):
+    """パターンごとの中心の周りに散らばる11次元の非負整数ベクトル（抽出できない環境・大規模k-means用）"""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0, 30, size=(n_patterns, INTEGRATED_VECTOR_SIZE))
+    labels = rng.integers(0, n_patterns, size=n_samples)
+    X = np.rint(np.abs(centers[labels] + rng.normal(0, 2.0, size=(n_samples, INTEGRATED_VECTOR_SIZE))))
+    return X, labels
+
+def benchmark_extraction(files, repeat, jobs):
+    """batch_extract_integrated_features のスループット（ファイル/秒）"""
+    from ext_cfg_dfg_feature import batch_extract_integrated_features
+
+    seconds, runs, results = measure(lambda: batch_extract_integrated_features(files, workers=jobs), repeat)
+    record = _record(seconds, runs, len(files), 'files/s')
+    record['errors'] = sum(1 for r in results if 'error' in r)
+    return record, results
+
+def benchmark_kmeans(X, k, repeat, seed):
+    """general_kmeans_algorithm のスループット（サンプル/秒、標準化済みデータ）"""
+    from kmeans_final_clean import OnlineStandardScaler, general_kmeans_algorithm
+
+    X_scaled = OnlineStandardScaler(X.shape[1]).fit_transform(X)
+
+    def run():
+        np.random.seed(seed)
+        return general_kmeans_algorithm(X_scaled, k)
+
+    seconds, runs, (_, labels) = measure(run, repeat)
+    return _record(seconds, runs, len(X), 'samples/s'), labels
+
+def benchmark_hungarian(labels, file_paths, repeat):
+    """hungarian_cluster_pattern_assignment のスループット（ファイル/秒）"""
+    from kmeans_final_clean import hungarian_cluster_pattern_assignment
+
+    seconds, runs, result = measure(lambda: hungarian_cluster_pattern_assignment(labels, file_paths), repeat)
+    record = _record(seconds, runs, len(file_paths), 'files/s')
+    record['assignment_score'] = int(result[4])
+    return record
+
+def benchmark_cache(batch_results, repeat, work_dir):
+    """キャッシュの保存・読み込み（JSON, SQLite）のスループット（件/秒）"""
+    from ext_cfg_dfg_feature import save_feature_vectors, load_feature_vectors
+
+    records = {}
+    for cache_format, extension in [('json', 'json'), ('sqlite', 'sqlite')]:
+        cache_file = os.path.join(work_dir, f"bench_cache.{extension}")
+
+        def save():
+            # SQLiteは変更行だけ書くため、毎回新しいファイルに保存して全件書き込みを計測
+            for path in (cache_file, f"{cache_file}-wal", f"{cache_file}-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+            return save_feature_vectors(batch_results, output_file=cache_file, format=cache_format)
+
+        seconds, runs, _ = measure(save, repeat)
+        records[f"cache_save_{cache_format}"] = _record(seconds, runs, len(batch_results), 'records/s')
+        seconds, runs, _ = measure(lambda: load_feature_vectors(cache_file), repeat)
+        records[f"cache_load_{cache_format}"] = _record(seconds, runs, len(batch_results), 'records/s')
+    return records
+
+def _git_commit():
+    try:
+        completed = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ANALYZE_DIR, capture_output=True, text=True)
+        return completed.stdout.strip() or None
+    except OSError:
+        return None
+
+def compare_results(current, previous):
+    """前回の結果との比較を表示（比 = 今回 / 前回）"""
+    print(f"\n📊 前回との比較（{previous.get('timestamp')} / {previous.get('git_commit')}）")
+    keys = ('corpus', 'corpus_files', 'patterns', 'files_per_pattern', 'functions', 'nesting_depth',
+            'loop_density', 'branch_density', 'seed', 'k', 'kmeans_samples', 'jobs')
+    changed = [key for key in keys if current['params'].get(key) != previous.get('params', {}).get(key)]
+    if changed:
+        print(f"⚠️ 条件が前回と異なります: {', '.join(changed)}")
+    for name, record in current['results'].items():
+        before = previous.get('results', {}).get(name)
+        if not before or not before.get('seconds') or 'seconds' not in record:
+            continue
+        ratio = record['seconds'] / before['seconds']
+        mark = "⚠️" if ratio > 1.1 else ("🚀" if ratio < 0.9 else "  ")
+        print(f"{mark} {name:<22} {before['seconds'] * 1000:10.1f} ms -> {record['seconds'] * 1000:10.1f} ms  (x{ratio:.2f})")
+
+def run_benchmarks(args):
+    """引数に従ってベンチマークを実行し、結果の辞書を返す"""
+    work_dir = tempfile.mkdtemp(prefix='pyjoern_bench_')
+    results = {}
+    params = vars(args).copy()
+    try:
+        # コーパス（既存 or 合成）
+        if args.corpus:
+            from file_scanner import scan_files
+            corpus_dir = args.corpus
+            files = list(scan_files(corpus_dir, ('.py',)))
+        else:
+            corpus_dir = os.path.join(work_dir, 'submissions_typical90_bench')
+            start = time.perf_counter()
+            files = generate_corpus(corpus_dir, args.patterns, args.files_per_pattern, args.functions,
+                                    args.nesting_depth, args.loop_density, args.branch_density, args.seed)
+            results['corpus_generation'] = _record(time.perf_counter() - start, [], len(files), 'files/s')
+        print(f"📁 コーパス: {corpus_dir} ({len(files)}ファイル)")
+        params['corpus_files'] = len(files)
+
+        # 特徴量抽出（pyjoernが使えない環境では合成ベクトルで続行）
+        batch_results = None
+        if not args.skip_extraction:
+            try:
+                results['batch_extract'], batch_results = benchmark_extraction(files, args.extract_repeat, args.jobs)
+            except Exception as e:
+                print(f"⚠️ 特徴量抽出のベンチマークをスキップ: {e}")
+                results['batch_extract'] = {'error': str(e)}
+        if batch_results is None:
+            n_patterns = args.patterns if not args.corpus else 4
+            X, _ = synthetic_vectors(len(files), n_patterns, args.seed)
+            batch_results = [{'source_file': f, 'integrated_vector': [int(v) for v in x]} for f, x in zip(files, X)]
+
+        # k-means（コーパスのベクトル、--kmeans-samples 指定時は合成ベクトルも）
+        X = np.array([r['integrated_vector'] for r in batch_results], dtype=float)
+        try:
+            results['kmeans'], labels = benchmark_kmeans(X, args.k, args.repeat, args.seed)
+            if args.kmeans_samples:
+                X_large, _ = synthetic_vectors(args.kmeans_samples, args.k, args.seed)
+                results['kmeans_large'], _ = benchmark_kmeans(X_large, args.k, args.repeat, args.seed)
+        except Exception as e:
+            print(f"⚠️ k-meansのベンチマークをスキップ: {e}")
+            results['kmeans'] = {'error': str(e)}
+            labels = np.arange(len(X)) % args.k
+
+        # ハンガリアン法によるクラスタ-パターン割り当て
+        results['hungarian'] = benchmark_hungarian(labels, [r['source_file'] for r in batch_results], args.repeat)
+
+        # キャッシュの保存・読み込み
+        try:
+            results.update(benchmark_cache(batch_results, args.repeat, work_dir))
+        except Exception as e:
+            print(f"⚠️ キャッシュのベンチマークをスキップ: {e}")
+            results['cache'] = {'error': str(e)}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': params,
+        'results': results
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='特徴量抽出・クラスタリングのベンチマーク')
+    parser.add_argument('--corpus', default=None, help='既存のコーパス（例: ../atcoder/submissions_typical90_d）。省略時は合成コーパス')
+    parser.add_argument('--patterns', type=int, default=4, help='合成コーパスのパターン数')
+    parser.add_argument('--files-per-pattern', type=int, default=25, help='パターンあたりのファイル数')
+    parser.add_argument('--functions', type=int, default=2, help='1ファイルあたりの関数数（パターンごとに±1）')
+    parser.add_argument('--nesting-depth', type=int, default=3, help='ループ・分岐の最大ネスト深さ')
+    parser.add_argument('--loop-density', type=float, default=0.3, help='各文がループになる確率')
+    parser.add_argument('--branch-density', type=float, default=0.3, help='各文が分岐になる確率')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    parser.add_argument('--k', type=int, default=4, help='k-meansのクラスタ数')
+    parser.add_argument('--kmeans-samples', type=int, default=0, help='合成ベクトルでの大規模k-meansのサンプル数（0で省略）')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='特徴量抽出の並列ワーカー数')
+    parser.add_argument('--repeat', type=int, default=3, help='計測回数（中央値を記録）')
+    parser.add_argument('--extract-repeat', type=int, default=1, help='特徴量抽出の計測回数')
+    parser.add_argument('--skip-extraction', action='store_true', help='特徴量抽出を計測せず合成ベクトルを使う')
+    parser.add_argument('--output', default=None, help='結果のJSON（既定: benchmark_results_<日時>.json）')
+    parser.add_argument('--compare', default=None, help='比較する前回の結果JSON')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+
+    print(f"\n⏱️ ベンチマーク結果（{args.repeat}回の中央値）")
+    for name, record in report['results'].items():
+        if 'error' in record:
+            print(f"❌ {name}: {record['error']}")
+            continue
+        throughput = f"{record['throughput']:.1f} {record['unit']}" if record['throughput'] else '-'
+        print(f"✅ {name:<22} {record['seconds'] * 1000:10.1f} ms  {throughput}")
+
+    output = args.output or f"benchmark_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 結果保存: '{output}'")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare_results(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+# リアルタイム増分クラスタリングサービス（AsanasCluster方式のオンライン割り当て）
+# - OnlineStandardScaler の状態とセントロイドをメモリに保持する常駐HTTPサービス
+# - ソースファイルを受け取り、11次元ベクトルを抽出して最も近いクラスタIDを返す
+# - 受理された提出はモデルに追加（セントロイドを学習率 1/N で移動、標準化の平均・分散も更新）
+# - モデル状態を定期的にディスクへスナップショット（.npz、clustering_model.ClusteringModel と同じ形式）
+#
+# エンドポイント:
+#   GET  /health    死活確認
+#   GET  /model     モデルの概要（クラスタ数・各クラスタの要素数など）
+#   POST /assign    {"source_file": "...", "update": true} または {"vector": [...11次元...]}
+#   POST /snapshot  スナップショットを即時保存
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from kmeans_final_clean import (
+    FEATURE_WEIGHTS,
+    OnlineStandardScaler,
+    general_kmeans_algorithm,
+    pairwise_dist
+)
+from clustering_model import ClusteringModel
+
+MODEL_SCHEMA_VERSION = 1
+DEFAULT_MAX_CLUSTERS = 16  # AsanasClusterと同じくクラスタ数の上限は16
+
+class OnlineClusterModel:
+    """
+    標準化状態とセントロイドを保持するオンラインk-meansモデル
+
+    セントロイドは元のスケールで保持し、割り当て時に現在の平均・標準偏差で標準化する
+    （標準化の統計量が更新されてもセントロイドを変換し直す必要がない）
+    """
+    def __init__(self, n_features=11, k=DEFAULT_MAX_CLUSTERS, metric='euclidean', weights=FEATURE_WEIGHTS):
+        self.n_features = n_features
+        self.k = k
+        self.metric = metric
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+        self.scaler = OnlineStandardScaler(n_features)
+        self.centroids = np.zeros((0, n_features))  # 元のスケール
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.total_assigned = 0
+
+    @classmethod
+    def from_vectors(cls, X, k=DEFAULT_MAX_CLUSTERS, metric='euclidean', weights=FEATURE_WEIGHTS):
+        """
+        既存の特徴量ベクトルからモデルを構築（バッチk-means）
+
+        Args:
+            X: 特徴量データ (n, 11)
+            k: クラスタ数（データ数が少ない場合はデータ数まで）
+
+        Returns:
+            OnlineClusterModel: モデル
+        """
+        X = np.asarray(X, dtype=float)
+        model = cls(X.shape[1], k, metric, weights)
+        k = min(k, len(X))
+        X_scaled = model.scaler.fit_transform(X)
+        C, labels = general_kmeans_algorithm(X_scaled, k, metric=metric, weights=model.weights)
+        model.centroids = model.scaler.inverse_transform(C)
+        model.counts = np.bincount(labels, minlength=k).astype(np.int64)
+        model.total_assigned = len(X)
+        return model
+
+    @classmethod
+    def from_feature_cache(cls, cache_file, k=DEFAULT_MAX_CLUSTERS, metric='euclidean', weights=FEATURE_WEIGHTS):
+        """特徴量キャッシュ（JSON/SQLite）の成功データからモデルを構築"""
+        from ext_cfg_dfg_feature import load_feature_vectors
+
+        cached_data = load_feature_vectors(cache_file)
+        if not cached_data:
+            raise ValueError(f"キャッシュを読み込めません: {cache_file}")
+        X = [r['integrated_vector'] for r in cached_data['data'] if 'error' not in r]
+        if not X:
+            raise ValueError(f"キャッシュに有効なデータがありません: {cache_file}")
+        return cls.from_vectors(X, k, metric, weights)
+
+    # --- 割り当て ---
+    def nearest(self, vector):
+        """
+        最も近いクラスタを求める（モデルは変更しない）
+
+        Returns:
+            tuple: (クラスタID, 距離)  セントロイドがまだない場合は (None, None)
+        """
+        if len(self.centroids) == 0:
+            return None, None
+        x = self.scaler.transform(np.asarray(vector, dtype=float).reshape(1, -1))
+        C = self.scaler.transform(self.centroids)
+        dists = pairwise_dist(x, C, self.metric, self.weights)[0]
+        cluster_id = int(np.argmin(dists))
+        return cluster_id, float(dists[cluster_id])
+
+    def assign(self, vector, update=True):
+        """
+        最も近いクラスタに割り当て、updateの場合はモデルに追加
+
+        クラスタ数がkに満たない間は新しいクラスタとして追加する。
+        追加時はセントロイドを学習率 1/N（N: そのクラスタの要素数）で新しい要素の方向へ移動する。
+
+        Returns:
+            dict: {'cluster_id', 'distance', 'cluster_size', 'updated'}
+        """
+        x = np.asarray(vector, dtype=float)
+        cluster_id, distance = self.nearest(x)
+
+        if update:
+            self.scaler.partial_fit(x)
+            if len(self.centroids) < self.k and (cluster_id is None or distance > 0):
+                self.centroids = np.vstack([self.centroids, x])
+                self.counts = np.append(self.counts, 1)
+                cluster_id, distance = len(self.centroids) - 1, 0.0
+            else:
+                self.counts[cluster_id] += 1
+                self.centroids[cluster_id] += (x - self.centroids[cluster_id]) / self.counts[cluster_id]
+            self.total_assigned += 1
+
+        return {
+            'cluster_id': cluster_id,
+            'distance': distance,
+            'cluster_size': None if cluster_id is None else int(self.counts[cluster_id]),
+            'updated': bool(update)
+        }
+
+    # --- 保存・読み込み ---
+    def to_dict(self):
+        """スナップショット用の辞書"""
+        return {
+            'schema_version': MODEL_SCHEMA_VERSION,
+            'timestamp': datetime.now().isoformat(),
+            'n_features': self.n_features,
+            'k': self.k,
+            'metric': self.metric,
+            'weights': None if self.weights is None else self.weights.tolist(),
+            'scaler': {
+                'n_samples': self.scaler.n_samples,
+                'mean': self.scaler.mean.tolist(),
+                'M2': self.scaler.M2.tolist()
+            },
+            'centroids': self.centroids.tolist(),
+            'counts': self.counts.tolist(),
+            'total_assigned': self.total_assigned
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """to_dict() の結果からモデルを復元"""
+        if data.get('schema_version') != MODEL_SCHEMA_VERSION:
+            raise ValueError(f"モデルのスキーマバージョンが違います: {data.get('schema_version')}")
+        model = cls(data['n_features'], data['k'], data['metric'], data['weights'])
+        scaler = data['scaler']
+        model.scaler = OnlineStandardScaler.from_stats(scaler['n_samples'], scaler['mean'], scaler['M2'])
+        model.centroids = np.asarray(data['centroids'], dtype=float).reshape(-1, model.n_features)
+        model.counts = np.asarray(data['counts'], dtype=np.int64)
+        model.total_assigned = data.get('total_assigned', int(model.counts.sum()))
+        return model
+
+    def to_artifact(self):
+        """バイナリ保存用の ClusteringModel"""
+        return ClusteringModel(self.scaler, self.centroids, self.counts, self.weights, self.metric, self.k,
+                               total_assigned=self.total_assigned)
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        """ClusteringModel からモデルを復元"""
+        model = cls(artifact.n_features, artifact.k, artifact.metric, artifact.weights)
+        model.scaler = artifact.scaler
+        model.centroids = artifact.centroids
+        model.counts = artifact.counts
+        model.total_assigned = artifact.total_assigned
+        return model
+
+    def save(self, model_file):
+        """モデルを保存（.json はJSON、それ以外はバイナリの .npz、一時ファイル経由で置き換え）"""
+        if not model_file.endswith('.json'):
+            self.to_artifact().save(model_file)
+            return
+        tmp_file = f"{model_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, model_file)
+
+    @classmethod
+    def load(cls, model_file):
+        """save() で保存したモデルを読み込み（以前のJSON形式も読める）"""
+        if not model_file.endswith('.json'):
+            return cls.from_artifact(ClusteringModel.load(model_file))
+        with open(model_file, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def summary(self):
+        return {
+            'n_clusters': int(len(self.centroids)),
+            'k': self.k,
+            'metric': self.metric,
+            'counts': self.counts.tolist(),
+            'total_assigned': self.total_assigned,
+            'scaler_samples': int(self.scaler.n_samples)
+        }
+
+class ClusterService:
+    """
+    モデル・特徴量抽出・スナップショットをまとめたサービス本体（HTTPハンドラから呼ばれる）
+    """
+    def __init__(self, model, model_file=None, snapshot_interval=60, pool=None, extract_timeout=None):
+        """
+        Args:
+            model (OnlineClusterModel): クラスタリングモデル
+            model_file (str): スナップショットの保存先（Noneの場合は保存しない）
+            snapshot_interval (float): 変更があった場合にスナップショットを保存する間隔（秒）
+            pool (JoernWorkerPool): 特徴量抽出用のワーカープール（Noneの場合はこのプロセスで抽出）
+            extract_timeout (float): 1ファイルあたりの抽出タイムアウト秒数（プール使用時）
+        """
+        self.model = model
+        self.model_file = model_file
+        self.snapshot_interval = snapshot_interval
+        self.pool = pool
+        self.extract_timeout = extract_timeout
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._snapshot_thread = None
+
+    def extract(self, source_file):
+        """
+        ソースファイルから11次元ベクトルを抽出
+
+        抽出に失敗した場合（タイムアウト・メモリ超過を含む）は RuntimeError を送出する
+        （ゼロベクトルや部分特徴量でモデルを更新しないため、/assign はエラーを返しモデルは変わらない）
+        """
+        if self.pool is not None:
+            result = self.pool.run(source_file, timeout=self.extract_timeout)
+            if 'error' in result or 'status' in result:
+                raise RuntimeError(f"特徴量抽出エラー ({result.get('status', 'error')}): {result.get('error')}")
+            return result['integrated_vector']
+
+        from ext_cfg_dfg_feature import extract_integrated_features_vector
+        try:
+            return extract_integrated_features_vector(source_file)
+        except MemoryError:
+            raise RuntimeError(f"特徴量抽出エラー (oom): {source_file}")
+        except Exception as e:
+            raise RuntimeError(f"特徴量抽出エラー (error): {e}") from e
+
+    def assign(self, request):
+        """
+        /assign の処理
+
+        Args:
+            request (dict): {'source_file'} または {'vector'}、任意で {'update': bool}
+
+        Returns:
+            dict: 割り当て結果（抽出・割り当ての所要時間付き）
+        """
+        start = time.perf_counter()
+        if 'vector' in request:
+            vector = request['vector']
+        elif 'source_file' in request:
+            vector = self.extract(request['source_file'])
+        else:
+            raise ValueError("'source_file' または 'vector' を指定してください")
+        if len(vector) != self.model.n_features:
+            raise ValueError(f"ベクトルの次元が違います: {len(vector)} (期待値: {self.model.n_features})")
+        extracted = time.perf_counter()
+
+        with self._lock:
+            result = self.model.assign(vector, update=request.get('update', True))
+            if result['updated']:
+                self._dirty = True
+        assigned = time.perf_counter()
+
+        result['vector'] = list(vector)
+        result['extract_ms'] = round((extracted - start) * 1000, 3)
+        result['assign_ms'] = round((assigned - extracted) * 1000, 3)
+        if 'source_file' in request:
+            result['source_file'] = request['source_file']
+        return result
+
+    def summary(self):
+        with self._lock:
+            return self.model.summary()
+
+    def snapshot(self, force=False):
+        """変更があればモデルを保存（forceの場合は常に保存）"""
+        if self.model_file is None:
+            return False
+        with self._lock:
+            if not (self._dirty or force):
+                return False
+            self.model.save(self.model_file)
+            self._dirty = False
+        print(f"💾 モデルスナップショット保存: {self.model_file}")
+        return True
+
+    def start_snapshots(self):
+        """定期スナップショットのスレッドを開始"""
+        if self.model_file is None or self.snapshot_interval is None:
+            return
+
+        def loop():
+            while not self._stop.wait(self.snapshot_interval):
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    print(f"❌ スナップショット保存エラー: {e}")
+
+        self._snapshot_thread = threading.Thread(target=loop, daemon=True)
+        self._snapshot_thread.start()
+
+    def stop(self):
+        """定期スナップショットを止め、最後に保存"""
+        self._stop.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        self.snapshot()
+
+def make_handler(service):
+    """ClusterServiceを呼び出すHTTPハンドラクラスを作る"""
+    class ClusterRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get('Content-Length', 0))
+            if length == 0:
+                return {}
+            return json.loads(self.rfile.read(length).decode('utf-8'))
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send_json(200, {'status': 'ok'})
+            elif self.path == '/model':
+                self._send_json(200, service.summary())
+            else:
+                self._send_json(404, {'error': f"not found: {self.path}"})
+
+        def do_POST(self):
+            try:
+                if self.path == '/assign':
+                    self._send_json(200, service.assign(self._read_json()))
+                elif self.path == '/snapshot':
+                    self._send_json(200, {'saved': service.snapshot(force=True)})
+                else:
+                    self._send_json(404, {'error': f"not found: {self.path}"})
+            except (ValueError, KeyError) as e:
+                self._send_json(400, {'error': str(e)})
+            except Exception as e:
+                self._send_json(500, {'error': str(e)})
+
+        def log_message(self, format, *args):
+            # リクエストごとのログは出さない（エラーはレスポンスで返す）
+            pass
+
+    return ClusterRequestHandler
+
+def serve(service, host='127.0.0.1', port=8765):
+    """HTTPサービスを起動（Ctrl+Cで停止し、最後にスナップショットを保存）"""
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    service.start_snapshots()
+    print(f"🚀 クラスタリングサービス起動: http://{host}:{port} ({service.model.summary()['n_clusters']}クラスタ)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 停止中...")
+    finally:
+        server.server_close()
+        service.stop()
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="リアルタイム増分クラスタリングサービス")
+    parser.add_argument('--model', default='cluster_model.npz', help="モデルのスナップショットファイル（存在すれば読み込み）")
+    parser.add_argument('--init-cache', default=None, help="モデルがない場合に初期化に使う特徴量キャッシュ（JSON/SQLite）")
+    parser.add_argument('--k', type=int, default=DEFAULT_MAX_CLUSTERS, help="最大クラスタ数（デフォルト: 16）")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--snapshot-interval', type=float, default=60, help="スナップショット間隔（秒）")
+    parser.add_argument('--workers', type=int, default=1, help="特徴量抽出ワーカー数（0でこのプロセスで抽出）")
+    parser.add_argument('--timeout', type=float, default=120, help="1ファイルあたりの抽出タイムアウト秒数")
+    args = parser.parse_args()
+
+    if os.path.exists(args.model):
+        model = OnlineClusterModel.load(args.model)
+        print(f"📂 モデル読み込み: {args.model}")
+    elif args.init_cache:
+        model = OnlineClusterModel.from_feature_cache(args.init_cache, k=args.k)
+        print(f"🆕 キャッシュからモデル構築: {args.init_cache}")
+    else:
+        model = OnlineClusterModel(k=args.k)
+        print("🆕 空のモデルで開始（最初のk件がセントロイドになります）")
+
+    pool = None
+    if args.workers > 0:
+        from joern_worker_pool import JoernWorkerPool
+        pool = JoernWorkerPool(n_workers=args.workers, job_timeout=args.timeout).start()
+
+    service = ClusterService(model, args.model, args.snapshot_interval, pool, args.timeout)
+    try:
+        serve(service, args.host, args.port)
+    finally:
+        if pool is not None:
+            pool.close()
+
+if __name__ == "__main__":
+    main()
+
+# 使用例:
+#
+# # キャッシュからモデルを構築してサービス起動
+# python cluster_service.py --init-cache feature_cache_submissions_typical90_d.json --model model_d.npz
+#
+# # 新しい提出を割り当て（受理済みならモデルに追加）
+# curl -X POST localhost:8765/assign -d '{"source_file": "submission_123.py"}'
+# # 却下された提出は最も近いクラスタだけを確認（モデルは更新しない）
+# curl -X POST localhost:8765/assign -d '{"source_file": "submission_124.py", "update": false}'
@@ -0,0 +1,166 @@
+# クラスタリングモデルのバイナリ保存（.npz）
+# - 標準化の状態（件数・平均・M2）、セントロイド（元のスケール）、各クラスタの要素数、特徴量の重み、
+#   学習済みのファイル一覧（パスと学習時の内容のSHA-256）、スキーマバージョンを1つの .npz に保存する
+#   （pickleを使わず数ミリ秒で読み込める）
+# - kmeans_final_clean.main(model_file=...) のウォームスタートに使う
+#   （前回のセントロイドから開始し、標準化の統計量には新しい提出だけを追加する）
+# - 学習済みのファイルが書き換えられた場合は watch_mode と同じく割り当てのみ（古い寄与を取り除けないため、
+#   統計量には追加せず、記録しているハッシュだけを新しい内容に置き換える）
+# - cluster_service / watch_mode のモデルスナップショットも同じ形式
+#
+# 使用例:
+#   model = ClusteringModel.load('clustering_model_d.npz')
+#   C, labels = general_kmeans_algorithm(model.scaler.transform(X), model.k, weights=model.weights,
+#                                        initial_centroids=model.scaled_centroids())
+
+import os
+from datetime import datetime
+
+import numpy as np
+
+from kmeans_final_clean import OnlineStandardScaler
+from feature_store import file_sha256
+
+MODEL_ARTIFACT_VERSION = 1
+
+def file_content_hashes(file_paths):
+    """学習済みファイルのキー用に各ファイルのSHA-256を計算（読めないファイルは空文字列）"""
+    hashes = []
+    for path in file_paths:
+        try:
+            hashes.append(file_sha256(path))
+        except OSError:
+            hashes.append('')
+    return hashes
+
+class ClusteringModel:
+    """
+    標準化の状態・セントロイド・要素数をまとめたクラスタリングモデル
+
+    セントロイドは元のスケールで保持する（標準化の統計量を更新してもセントロイドを変換し直す必要がない）
+    """
+    def __init__(self, scaler, centroids, counts, weights=None, metric='euclidean', k=None, file_paths=None,
+                 total_assigned=None, file_hashes=None):
+        """
+        Args:
+            scaler (OnlineStandardScaler): 標準化の状態
+            centroids: セントロイド（元のスケール） (k, d)
+            counts: 各クラスタの要素数 (k,)
+            weights: 特徴量の重み（Noneで重みなし）
+            metric (str): 距離計算方法
+            k (int): クラスタ数（Noneの場合はセントロイドの数）
+            file_paths (list): 学習済みのファイル（ウォームスタート時に新しい提出だけを処理するため）
+            total_assigned (int): 割り当てた総数（Noneの場合は要素数の合計）
+            file_hashes (list): file_paths と同じ順の内容のSHA-256（Noneの場合は不明として空文字列）
+        """
+        self.scaler = scaler
+        self.centroids = np.asarray(centroids, dtype=float).reshape(-1, scaler.n_features)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+        self.metric = metric
+        self.k = len(self.centroids) if k is None else int(k)
+        self.file_paths = list(file_paths or [])
+        self.file_hashes = list(file_hashes) if file_hashes is not None else [''] * len(self.file_paths)
+        if len(self.file_hashes) != len(self.file_paths):
+            raise ValueError("file_paths と file_hashes の長さが違います")
+        self.total_assigned = int(self.counts.sum()) if total_assigned is None else int(total_assigned)
+
+    @property
+    def n_features(self):
+        return self.scaler.n_features
+
+    def scaled_centroids(self):
+        """現在の標準化でのセントロイド（general_kmeans_algorithm などの initial_centroids 用）"""
+        return self.scaler.transform(self.centroids)
+
+    def compatible_with(self, k, n_features, metric='euclidean', weights=None):
+        """同じ条件（クラスタ数・次元数・距離・重み）のクラスタリングをウォームスタートできるか"""
+        if self.k != k or self.n_features != n_features or self.metric != metric or len(self.centroids) != k:
+            return False
+        if (self.weights is None) != (weights is None):
+            return False
+        return weights is None or np.allclose(self.weights, weights)
+
+    # --- 学習済みのファイル ---
+    def learned_mask(self, file_paths):
+        """
+        各ファイルが学習済み（標準化の統計量に寄与済み）か（パスで判定、内容が変わっていても学習済み）
+
+        Returns:
+            np.ndarray: 学習済みならTrue (len(file_paths),)
+        """
+        learned = set(self.file_paths)
+        return np.array([path in learned for path in file_paths], dtype=bool)
+
+    def modified_mask(self, file_paths, file_hashes):
+        """
+        学習後に内容が変わったファイルか（学習済みで、記録しているSHA-256と違う）
+
+        変更ファイルは watch_mode と同じく割り当てのみ（古い寄与を取り除けないため統計量には追加しない）
+        ハッシュを持たない古いモデルのファイルは変更なしとみなす
+
+        Returns:
+            np.ndarray: 変更されていればTrue (len(file_paths),)
+        """
+        recorded = dict(zip(self.file_paths, self.file_hashes))
+        return np.array([bool(recorded.get(path)) and recorded[path] != content_hash
+                         for path, content_hash in zip(file_paths, file_hashes)], dtype=bool)
+
+    def add_learned_files(self, file_paths, file_hashes):
+        """
+        学習済みのファイルを記録（これまでのファイルとの和集合、1パス1件）
+
+        記録済みのパスはハッシュだけ新しい内容に置き換える（古い組を残さない）
+        """
+        position = {path: i for i, path in enumerate(self.file_paths)}
+        for path, content_hash in zip(file_paths, file_hashes):
+            if path in position:
+                self.file_hashes[position[path]] = content_hash
+            else:
+                position[path] = len(self.file_paths)
+                self.file_paths.append(path)
+                self.file_hashes.append(content_hash)
+
+    # --- 保存・読み込み ---
+    def save(self, model_file):
+        """モデルを .npz で保存（一時ファイル経由で置き換え）"""
+        arrays = {
+            'schema_version': np.array(MODEL_ARTIFACT_VERSION),
+            'timestamp': np.array(datetime.now().isoformat()),
+            'k': np.array(self.k),
+            'metric': np.array(self.metric),
+            'weights': np.zeros(0) if self.weights is None else self.weights,
+            'has_weights': np.array(self.weights is not None),
+            'scaler_n_samples': np.array(self.scaler.n_samples),
+            'scaler_mean': self.scaler.mean,
+            'scaler_M2': self.scaler.M2,
+            'centroids': self.centroids,
+            'counts': self.counts,
+            'total_assigned': np.array(self.total_assigned),
+            'file_paths': np.array(self.file_paths, dtype=str),
+            'file_hashes': np.array(self.file_hashes, dtype=str)
+        }
+        tmp_file = f"{model_file}.tmp"
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_file, model_file)
+
+    @classmethod
+    def load(cls, model_file):
+        """save() で保存したモデルを読み込み"""
+        with np.load(model_file, allow_pickle=False) as data:
+            version = int(data['schema_version'])
+            if version != MODEL_ARTIFACT_VERSION:
+                raise ValueError(f"モデルのスキーマバージョンが違います: {version}")
+            scaler = OnlineStandardScaler.from_stats(int(data['scaler_n_samples']), data['scaler_mean'], data['scaler_M2'])
+            return cls(
+                scaler,
+                data['centroids'],
+                data['counts'],
+                weights=data['weights'] if bool(data['has_weights']) else None,
+                metric=str(data['metric']),
+                k=int(data['k']),
+                file_paths=data['file_paths'].tolist(),
+                total_assigned=int(data['total_assigned']),
+                file_hashes=data['file_hashes'].tolist() if 'file_hashes' in data.files else None
+            )
@@ -0,0 +1,624 @@
+# CFGを整数インデックスのCSR（NumPy配列）に変換して構造的特徴量を計算するツール
+# - pyjoernのブロック（Block）はハッシュ・比較がステートメント内容ベースで重いため、
+#   変換時に1回だけ整数インデックスを振り、以降の計算はすべて整数で行う
+# - connected_components / cycles / paths / cyclomatic_complexity / エントリー・出口検出を配列上で計算
+#   （ext_cfg_feature.py の networkx 版と同じ値。networkx 版はデバッグ用に残している）
+# - パス数・サイクル数の実装はここだけに置く（path_dfs.py / cycle_count.py はCFGを変換してここを呼ぶ）
+# - 還元不可能なCFGのサイクル数だけは、従来どおり nx.simple_cycles（上限付き）で数える
+
+import os
+import sys
+import time
+import numpy as np
+import networkx as nx
+
+# pipeline_profiler.py（analyze/）から段階別計測をインポート
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pipeline_profiler import stage
+
+# 還元不可能なCFGのサイクル数の既定の上限
+DEFAULT_MAX_CYCLES = 100000
+DEFAULT_TIME_BUDGET = 5.0  # 秒
+
+class CFGArrays:
+    """
+    CFGの整数インデックス表現（CSR）
+
+    - nodes: インデックス → 元のノード（cfg.nodes() の順）
+    - succ_indptr / succ_indices: 後続ノードのCSR
+    - pred_indptr / pred_indices: 前ノードのCSR
+    - entry_flags / exit_flags: _is_entrypoint / _is_exitpoint
+
+    使用例:
+        arrays = CFGArrays.from_cfg(func_obj.cfg)
+        entries, exits = arrays.entry_exit_nodes()
+        features = compute_structural_features(arrays)
+    """
+    def __init__(self, nodes, succ_indptr, succ_indices, entry_flags, exit_flags):
+        self.nodes = nodes
+        self.succ_indptr = succ_indptr
+        self.succ_indices = succ_indices
+        self.entry_flags = entry_flags
+        self.exit_flags = exit_flags
+
+        # 前ノードのCSR（後続CSRの転置）
+        sources = np.repeat(np.arange(self.num_nodes, dtype=succ_indices.dtype), np.diff(succ_indptr))
+        order = np.argsort(succ_indices, kind='stable')
+        self.pred_indices = sources[order]
+        self.pred_indptr = np.zeros(self.num_nodes + 1, dtype=succ_indptr.dtype)
+        np.cumsum(np.bincount(succ_indices, minlength=self.num_nodes), out=self.pred_indptr[1:])
+
+        self._successor_lists = None
+
+    @classmethod
+    def from_cfg(cls, cfg):
+        """
+        networkxのCFGから変換（ノードのハッシュはここで1回ずつだけ計算する）
+
+        Args:
+            cfg (nx.DiGraph): pyjoernのCFG
+
+        Returns:
+            CFGArrays: 整数インデックス表現
+        """
+        nodes = list(cfg.nodes())
+        index = {node: i for i, node in enumerate(nodes)}
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        indices = []
+        for i, node in enumerate(nodes):
+            successors = [index[successor] for successor in cfg.successors(node)]
+            indices.extend(successors)
+            indptr[i + 1] = indptr[i] + len(successors)
+
+        entry_flags = np.fromiter((bool(getattr(node, '_is_entrypoint', False)) for node in nodes),
+                                  dtype=bool, count=len(nodes))
+        exit_flags = np.fromiter((bool(getattr(node, '_is_exitpoint', False)) for node in nodes),
+                                 dtype=bool, count=len(nodes))
+        return cls(nodes, indptr, np.asarray(indices, dtype=np.int64), entry_flags, exit_flags)
+
+    @property
+    def num_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def num_edges(self):
+        return int(self.succ_indices.shape[0])
+
+    def in_degrees(self):
+        return np.diff(self.pred_indptr)
+
+    def out_degrees(self):
+        return np.diff(self.succ_indptr)
+
+    def successor_lists(self):
+        """ノードごとの後続インデックスのリスト（DFS用に1回だけPythonのリストへ展開）"""
+        if self._successor_lists is None:
+            flat = self.succ_indices.tolist()
+            bounds = self.succ_indptr.tolist()
+            self._successor_lists = [flat[bounds[i]:bounds[i + 1]] for i in range(self.num_nodes)]
+        return self._successor_lists
+
+    def edges(self):
+        """(元, 先) のインデックス配列"""
+        sources = np.repeat(np.arange(self.num_nodes, dtype=self.succ_indices.dtype), self.out_degrees())
+        return sources, self.succ_indices
+
+    def entry_exit_nodes(self):
+        """
+        エントリーノードと出口ノードを特定（path_dfs.find_entry_exit_nodes と同じ条件）
+
+        Returns:
+            tuple: (エントリーノードのインデックス配列, 出口ノードのインデックス配列)
+        """
+        entries = np.flatnonzero((self.in_degrees() == 0) | self.entry_flags)
+        exits = np.flatnonzero((self.out_degrees() == 0) | self.exit_flags)
+        return entries, exits
+
+    def to_networkx(self):
+        """整数ノードのnetworkxグラフ（デバッグ・還元不可能なCFGのサイクル数用）"""
+        graph = nx.DiGraph()
+        graph.add_nodes_from(range(self.num_nodes))
+        sources, targets = self.edges()
+        graph.add_edges_from(zip(sources.tolist(), targets.tolist()))
+        return graph
+
+def count_weakly_connected_components(arrays):
+    """弱連結成分の数（Union-Find）"""
+    parent = list(range(arrays.num_nodes))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    components = arrays.num_nodes
+    sources, targets = arrays.edges()
+    for u, v in zip(sources.tolist(), targets.tolist()):
+        root_u, root_v = find(u), find(v)
+        if root_u != root_v:
+            parent[root_u] = root_v
+            components -= 1
+    return components
+
+def strongly_connected_components(successors, nodes):
+    """
+    強連結成分（再帰を使わないTarjan法）
+
+    Args:
+        successors (list): ノードごとの後続インデックスのリスト
+        nodes (iterable): 対象ノード（この集合の外へ出る辺は無視する）
+
+    Returns:
+        list: 強連結成分（インデックスのリスト）のリスト
+    """
+    allowed = set(nodes)
+    index_of = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    components = []
+    counter = 0
+
+    for root in allowed:
+        if root in index_of:
+            continue
+        index_of[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors[root]))]
+        while work:
+            node, children = work[-1]
+            advanced = False
+            for child in children:
+                if child not in allowed:
+                    continue
+                if child not in index_of:
+                    index_of[child] = lowlink[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors[child])))
+                    advanced = True
+                    break
+                if child in on_stack and index_of[child] < lowlink[node]:
+                    lowlink[node] = index_of[child]
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if lowlink[node] < lowlink[parent]:
+                    lowlink[parent] = lowlink[node]
+            if lowlink[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+def _cycle_roots(arrays, successors):
+    """
+    支配木の根に繋ぐノードを返す
+
+    前ノードを持たないノード・_is_entrypointのノードに加えて、
+    外から入れない閉路（凝縮グラフのソース成分）からも1ノードずつ選ぶ
+    """
+    in_degrees = arrays.in_degrees()
+    roots = np.flatnonzero((in_degrees == 0) | arrays.entry_flags).tolist()
+    root_set = set(roots)
+
+    components = strongly_connected_components(successors, range(arrays.num_nodes))
+    component_of = [0] * arrays.num_nodes
+    for c, members in enumerate(components):
+        for node in members:
+            component_of[node] = c
+
+    # 外から入れない成分（凝縮グラフのソース成分）
+    has_incoming = [False] * len(components)
+    for u, targets in enumerate(successors):
+        for v in targets:
+            if component_of[u] != component_of[v]:
+                has_incoming[component_of[v]] = True
+    covered = {component_of[node] for node in roots}
+    for c, members in enumerate(components):
+        if has_incoming[c] or c in covered:
+            continue
+        entry = next((node for node in members if arrays.entry_flags[node]), None)
+        if entry is None:
+            entry = min(members, key=lambda node: str(arrays.nodes[node]))
+        if entry not in root_set:
+            roots.append(entry)
+            root_set.add(entry)
+    return roots
+
+def _immediate_dominators(successors, root):
+    """
+    支配木（Cooper-Harvey-Kennedy法）
+
+    Returns:
+        dict: {ノード: 直接支配ノード}（rootから到達できないノードは含まない）
+    """
+    # rootからの帰りがけ順
+    postorder = []
+    visited = {root}
+    work = [(root, iter(successors[root]))]
+    while work:
+        node, children = work[-1]
+        for child in children:
+            if child not in visited:
+                visited.add(child)
+                work.append((child, iter(successors[child])))
+                break
+        else:
+            work.pop()
+            postorder.append(node)
+
+    number = {node: i for i, node in enumerate(postorder)}
+    predecessors = {node: [] for node in postorder}
+    for node in postorder:
+        for child in successors[node]:
+            predecessors[child].append(node)
+
+    idom = {root: root}
+    order = postorder[-2::-1]  # root以外の逆帰りがけ順
+    changed = True
+    while changed:
+        changed = False
+        for node in order:
+            new_idom = None
+            for pred in predecessors[node]:
+                if pred not in idom:
+                    continue
+                if new_idom is None:
+                    new_idom = pred
+                    continue
+                a, b = pred, new_idom
+                while a != b:
+                    while number[a] < number[b]:
+                        a = idom[a]
+                    while number[b] < number[a]:
+                        b = idom[b]
+                new_idom = a
+            if idom.get(node) != new_idom:
+                idom[node] = new_idom
+                changed = True
+    return idom
+
+def count_reducible_cycles(arrays):
+    """
+    還元可能なCFGの単純閉路数を正確に数える
+
+    還元可能なCFGでは各単純閉路がちょうど1本のバックエッジ n -> h を含み、
+    残りは前向き辺だけの h から n へのパスになるため、
+    サイクル数 = Σ(バックエッジ n -> h) DAG上の h から n へのパス数
+
+    Args:
+        arrays (CFGArrays): CFG
+
+    Returns:
+        int or None: サイクル数（還元不可能な場合はNone）
+    """
+    n = arrays.num_nodes
+    if n == 0:
+        return 0
+
+    # 仮想ルート（インデックス n）から支配木を作る（自己ループは除く）
+    successors = arrays.successor_lists()
+    virtual_root = n
+    graph = [[v for v in targets if v != u] for u, targets in enumerate(successors)]
+    graph.append(_cycle_roots(arrays, successors))
+
+    idom = _immediate_dominators(graph, virtual_root)
+    if len(idom) < n + 1:
+        return None
+
+    # 支配木のオイラーツアー区間で「vがuを支配する」を O(1) で判定
+    children = [[] for _ in range(n + 1)]
+    for node, parent in idom.items():
+        if node != virtual_root:
+            children[parent].append(node)
+    enter = [0] * (n + 1)
+    leave = [0] * (n + 1)
+    clock = 0
+    stack = [(virtual_root, False)]
+    while stack:
+        node, done = stack.pop()
+        if done:
+            leave[node] = clock
+            continue
+        enter[node] = clock
+        clock += 1
+        stack.append((node, True))
+        for child in children[node]:
+            stack.append((child, False))
+
+    # 自己ループはそれぞれ1つの閉路
+    self_loops = sum(1 for u, targets in enumerate(successors) if u in targets)
+
+    sources_by_header = {}
+    forward = [[] for _ in range(n)]
+    forward_in = [0] * n
+    for u in range(n):
+        for v in graph[u]:
+            if enter[v] <= enter[u] and leave[u] <= leave[v]:
+                sources_by_header.setdefault(v, []).append(u)
+            else:
+                forward[u].append(v)
+                forward_in[v] += 1
+
+    # 前向き辺だけでトポロジカル順序が作れなければ還元不可能
+    order = [node for node in range(n) if forward_in[node] == 0]
+    for node in order:
+        for v in forward[node]:
+            forward_in[v] -= 1
+            if forward_in[v] == 0:
+                order.append(v)
+    if len(order) < n:
+        return None
+
+    # ヘッダごとにDAG上のパス数を数える（大きくなり得るのでPythonのintで数える）
+    position = {node: i for i, node in enumerate(order)}
+    total = self_loops
+    for header, sources in sources_by_header.items():
+        path_counts = {header: 1}
+        for node in order[position[header]:]:
+            count = path_counts.get(node, 0)
+            if count == 0:
+                continue
+            for successor in forward[node]:
+                path_counts[successor] = path_counts.get(successor, 0) + count
+        total += sum(path_counts.get(source, 0) for source in sources)
+    return total
+
+def count_simple_cycles_budgeted(cfg, max_cycles=DEFAULT_MAX_CYCLES, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    nx.simple_cycles を保存せずに数える（件数・時間の上限付き）
+
+    Args:
+        cfg (nx.DiGraph): CFG
+        max_cycles (int): 数える閉路数の上限（Noneで無制限）
+        time_budget (float): 使える秒数（Noneで無制限）
+
+    Returns:
+        tuple: (サイクル数, saturated) 上限に達した場合saturated=Trueでサイクル数は下限値
+    """
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    count = 0
+    for _ in nx.simple_cycles(cfg):
+        count += 1
+        if max_cycles is not None and count >= max_cycles:
+            return count, True
+        if deadline is not None and count % 256 == 0 and time.perf_counter() > deadline:
+            return count, True
+    return count, False
+
+def count_cycles(arrays, max_cycles=DEFAULT_MAX_CYCLES, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    CFGのサイクル数を数える（還元可能なら正確、そうでなければ上限付き）
+
+    Args:
+        arrays (CFGArrays): CFG
+        max_cycles (int): フォールバック時に数える閉路数の上限
+        time_budget (float): フォールバック時に使える秒数
+
+    Returns:
+        tuple: (サイクル数, saturated)
+    """
+    exact = count_reducible_cycles(arrays)
+    if exact is not None:
+        return exact, False
+    return count_simple_cycles_budgeted(arrays.to_networkx(), max_cycles, time_budget)
+
+def _cycle_cut_nodes(successors, members):
+    """
+    SCC内の各ノードuについて、uを通る全ての閉路が必ず通るノード集合を求める
+
+    Returns:
+        dict: {u: [w, ...]}（w を除くとuを通る閉路が無くなる）
+    """
+    cut_nodes = {u: [] for u in members}
+    member_set = set(members)
+    for w in members:
+        rest = member_set - {w}
+        on_cycle = set()
+        for component in strongly_connected_components(successors, rest):
+            if len(component) > 1:
+                on_cycle.update(component)
+        for u in rest:
+            if u not in on_cycle and u not in successors[u]:
+                cut_nodes[u].append(w)
+    return cut_nodes
+
+def count_all_paths(arrays, start_node, end_node, max_visits=2):
+    """
+    path_dfs.collect_all_paths と同じ条件のパス数をパスリストを作らずに数える（ノードはインデックスで指定）
+
+    終了ノードの出辺を除いたグラフを強連結成分（SCC）に分解すると、
+    一度出たSCCには戻れないため訪問回数の制約はSCCごとに独立する。
+    (ノード, SCC内の訪問回数) を状態としてメモ化し、パス数を合計する。
+    今後の訪問で上限に達し得ないノードの訪問回数は状態から落とす（FREE）ため、
+    ループ内に分岐が並んでも状態数はほぼノード数に比例する。
+
+    Args:
+        arrays (CFGArrays): CFG
+        start_node (int): 開始ノード
+        end_node (int): 終了ノード
+        max_visits (int): 1ノードあたりの最大訪問回数
+
+    Returns:
+        int: パス数
+    """
+    if max_visits < 1 or not 0 <= start_node < arrays.num_nodes:
+        return 0
+    if start_node == end_node:
+        return 1
+
+    # 終了ノードに到達した時点でパスは終わるので、終了ノードの出辺は不要
+    cfg_successors = arrays.successor_lists()
+    graph = {start_node: []}
+    stack = [start_node]
+    while stack:
+        node = stack.pop()
+        if node == end_node:
+            continue
+        graph[node] = cfg_successors[node]
+        for successor in cfg_successors[node]:
+            if successor not in graph:
+                graph[successor] = []
+                stack.append(successor)
+    if end_node not in graph:
+        return 0
+
+    FREE = -1  # 今後上限に達し得ない（訪問回数を覚えておく必要がない）
+
+    # SCCごとの情報（訪問回数はSCC内のノードのみ保持）
+    scc_of = {}
+    scc_info = []
+    for scc_id, members in enumerate(strongly_connected_components(graph, graph.keys())):
+        for node in members:
+            scc_of[node] = scc_id
+        if len(members) == 1 and members[0] not in graph[members[0]]:
+            scc_info.append(None)  # 閉路なし: 2回目の訪問は起こらない
+            continue
+        index = {node: i for i, node in enumerate(members)}
+        local_successors = [[index[s] for s in graph[node] if s in index] for node in members]
+        cut_nodes = _cycle_cut_nodes(graph, members)
+        cuts = [[index[w] for w in cut_nodes[node]] for node in members]
+        candidates = sorted({w for ws in cuts for w in ws})
+        scc_info.append((index, local_successors, cuts, candidates))
+
+    def reach_from(successors, start, counts, excluded=None):
+        """startの後続から到達を試みられるノード集合（上限に達したノードの先へは進まない）"""
+        seen = set()
+        stack = list(successors[start])
+        while stack:
+            u = stack.pop()
+            if u in seen or u == excluded:
+                continue
+            seen.add(u)
+            if counts[u] != FREE and counts[u] >= max_visits:
+                continue
+            stack.extend(successors[u])
+        return seen
+
+    def canonical(position, counts, info):
+        """上限に関係しなくなったノードの訪問回数をFREEにする"""
+        _, successors, cuts, candidates = info
+        reach = reach_from(successors, position, counts)
+        reach_without = {}
+        for w in candidates:
+            if counts[w] != FREE:
+                reach_without[w] = reach_from(successors, position, counts, excluded=w)
+
+        original = tuple(counts)
+        pinned = set()  # 他ノードをFREEにする根拠として使ったノード（循環した根拠を防ぐ）
+        for u, count in enumerate(original):
+            if count == FREE:
+                continue
+            if u not in reach:
+                counts[u] = FREE
+                continue
+            if u in pinned:
+                continue
+            # uへの今後の訪問回数の上限: 最初の1回（wを通らずに行ける場合）+ wの残り訪問回数
+            for w in cuts[u]:
+                if w not in reach_without or counts[w] == FREE:
+                    continue
+                upper = (1 if u in reach_without[w] else 0) + (max_visits - original[w])
+                if max_visits - count >= upper:
+                    counts[u] = FREE
+                    pinned.add(w)
+                    break
+        return tuple(counts)
+
+    def enter_state(node):
+        info = scc_info[scc_of[node]]
+        if info is None:
+            return (node, ())
+        index = info[0]
+        counts = [0] * len(index)
+        counts[index[node]] = 1
+        return (node, canonical(index[node], counts, info))
+
+    def next_states(state):
+        node, counts = state
+        if node == end_node:
+            return []
+        info = scc_info[scc_of[node]]
+        states = []
+        for successor in graph[node]:
+            if scc_of[successor] != scc_of[node]:
+                states.append(enter_state(successor))
+                continue
+            i = info[0][successor]
+            if counts[i] == FREE:
+                new_counts = list(counts)
+            elif counts[i] < max_visits:
+                new_counts = list(counts)
+                new_counts[i] += 1
+            else:
+                continue
+            states.append((successor, canonical(i, new_counts, info)))
+        return states
+
+    # 再帰を使わないメモ化DFS（深いCFGでも再帰上限に当たらない）
+    memo = {}
+    root = enter_state(start_node)
+    stack = [(root, None)]
+    while stack:
+        state, children = stack.pop()
+        if state in memo:
+            continue
+        if children is None:
+            children = next_states(state)
+            stack.append((state, children))
+            for child in children:
+                if child not in memo:
+                    stack.append((child, None))
+            continue
+        memo[state] = (1 if state[0] == end_node else 0) + sum(memo[child] for child in children)
+
+    return memo[root]
+
+def count_entry_exit_paths(arrays, max_visits=2):
+    """全エントリーノード × 全出口ノードのループ考慮パス数の合計"""
+    entries, exits = arrays.entry_exit_nodes()
+    total_paths = 0
+    for entry in entries.tolist():
+        for exit_node in exits.tolist():
+            total_paths += count_all_paths(arrays, entry, exit_node, max_visits=max_visits)
+    return total_paths
+
+def compute_structural_features(arrays):
+    """
+    CFGの構造的特徴量（ext_cfg_feature.extract_accurate_features の networkx 版と同じ値）
+
+    Args:
+        arrays (CFGArrays): CFG
+
+    Returns:
+        dict: connected_components / cycles / cycles_saturated / paths / cyclomatic_complexity
+    """
+    features = {}
+    with stage('cfg_components'):
+        features['connected_components'] = count_weakly_connected_components(arrays)
+
+    with stage('cfg_cycles'):
+        cycle_count, saturated = count_cycles(arrays)
+    features['cycles'] = cycle_count
+    features['cycles_saturated'] = saturated
+
+    with stage('cfg_paths'):
+        features['paths'] = count_entry_exit_paths(arrays, max_visits=2)
+
+    E = arrays.num_edges
+    N = arrays.num_nodes
+    P = features['connected_components']
+    features['cyclomatic_complexity'] = E - N + 2 * P
+    return features
@@ -0,0 +1,69 @@
+# CFGのサイクル数（単純閉路数）を数えるツール
+# - 還元可能なCFG: バックエッジ（支配木で判定）ごとに、ヘッダからバックエッジ元までの
+#   前向き辺（DAG）上のパス数を合計して正確に数える（閉路を列挙しない）
+# - 還元不可能なCFG: nx.simple_cycles を件数・時間の上限付きで数える（上限到達時はsaturated）
+# - 計算は cfg_arrays.py の整数インデックス版だけで行い、ここでは networkx のCFGを変換して呼び出す
+
+import networkx as nx
+
+from cfg_arrays import (
+    CFGArrays,
+    count_simple_cycles_budgeted,
+    DEFAULT_MAX_CYCLES,
+    DEFAULT_TIME_BUDGET
+)
+import cfg_arrays
+
+def count_reducible_cycles(cfg):
+    """
+    還元可能なCFGの単純閉路数を正確に数える（cfg_arrays.count_reducible_cycles をnetworkxのCFGで呼ぶ）
+
+    還元可能なCFGでは各単純閉路がちょうど1本のバックエッジ n -> h を含み、
+    残りは前向き辺だけの h から n へのパスになるため、
+    サイクル数 = Σ(バックエッジ n -> h) DAG上の h から n へのパス数
+
+    Args:
+        cfg (nx.DiGraph): CFG
+
+    Returns:
+        int or None: サイクル数（還元不可能な場合はNone）
+    """
+    return cfg_arrays.count_reducible_cycles(CFGArrays.from_cfg(cfg))
+
+def count_cycles(cfg, max_cycles=DEFAULT_MAX_CYCLES, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    CFGのサイクル数を数える（還元可能なら正確、そうでなければ上限付き）
+
+    Args:
+        cfg (nx.DiGraph): CFG
+        max_cycles (int): フォールバック時に数える閉路数の上限
+        time_budget (float): フォールバック時に使える秒数
+
+    Returns:
+        tuple: (サイクル数, saturated)
+    """
+    return cfg_arrays.count_cycles(CFGArrays.from_cfg(cfg), max_cycles, time_budget)
+
+def main():
+    # テストファイル: 正確版と nx.simple_cycles の件数を比較
+    from pyjoern import fast_cfgs_from_source
+
+    test_files = ["while.py", "whiletest.py"]
+
+    for test_file in test_files:
+        try:
+            cfgs = fast_cfgs_from_source(test_file)
+            for cfg_name, cfg in cfgs.items():
+                if cfg_name.startswith('<operator>') or cfg.number_of_nodes() == 0:
+                    continue
+                count, saturated = count_cycles(cfg)
+                expected = len(list(nx.simple_cycles(cfg)))
+                mark = "✅" if count == expected else "❌"
+                print(f"{mark} {test_file} {cfg_name}: cycles={count} (simple_cycles={expected}, saturated={saturated})")
+        except FileNotFoundError:
+            print(f"ファイルが見つかりません: {test_file}")
+        except Exception as e:
+            print(f"エラー: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 # loop_statementsとconditional_statementsの数を関数単位でカウントするコード
 
 import re
+import ast
 
 # Define `source_file` at the beginning of the script
 source_file = "whiletest.py"
@@ -107,6 +108,82 @@ def count_statements(function_body):
 
     return if_count, for_count, while_count, match_count
 
+MODULE_NAME = '<module>'
+
+class _StatementCounter(ast.NodeVisitor):
+    """関数ごとに if/elif・for・while・match を数える（1回の走査）"""
+    def __init__(self):
+        self.counts = {}
+        self.current = [0, 0, 0, 0]
+        self.counts[MODULE_NAME] = self.current
+
+    def _visit_function(self, node):
+        # ネストされた関数・メソッドは別の関数として数える（外側の関数には含めない）
+        outer = self.current
+        self.current = [0, 0, 0, 0]
+        # 同名の関数が複数ある場合は最初の定義を使う（従来の照合と同じ）
+        self.counts.setdefault(node.name, self.current)
+        self.generic_visit(node)
+        self.current = outer
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_If(self, node):
+        # elif は orelse 内の If として数えられる
+        self.current[0] += 1
+        self.generic_visit(node)
+
+    def visit_For(self, node):
+        self.current[1] += 1
+        self.generic_visit(node)
+
+    visit_AsyncFor = visit_For
+
+    def visit_While(self, node):
+        self.current[2] += 1
+        self.generic_visit(node)
+
+    def visit_Match(self, node):
+        self.current[3] += 1
+        self.generic_visit(node)
+
+def _count_statements_by_lines(source_code):
+    """行単位の検出による関数ごとの集計（構文解析できない場合のフォールバック）"""
+    functions, other_code = extract_functions_and_others(delete_comments(source_code))
+    counts = {MODULE_NAME: count_statements(other_code)}
+    for func_name, func_body in functions:
+        clean_func_name = func_name.split('(')[0].replace('def ', '').strip()
+        if clean_func_name not in counts:
+            counts[clean_func_name] = count_statements(func_body)
+    return counts
+
+def count_statements_by_function(source_code):
+    """
+    ファイル全体を1回だけ走査し、関数ごとの条件文・ループ文の数を数える
+
+    astで解析するため、文字列中の # や三重引用符に影響されない。
+    ネストされた関数・メソッドも関数名（pyjoernのCFG名と同じ）で集計し、
+    どの関数にも属さないコードは '<module>' に集計する。
+
+    Args:
+        source_code (str): ソースコード
+
+    Returns:
+        dict: {関数名: (if_count, for_count, while_count, match_count)}
+    """
+    if not source_code:
+        return {}
+    try:
+        tree = ast.parse(source_code)
+    except (SyntaxError, ValueError):
+        # Python 2 のコードなど、astで解析できない場合は従来の行単位の検出を使う
+        return _count_statements_by_lines(source_code)
+
+    counter = _StatementCounter()
+    counter.visit(tree)
+    return {name: tuple(counts) for name, counts in counter.counts.items()}
+
 def detect_nested_functions(function_body):
     """ネストされた関数を検出する"""
     nested_functions = []
@@ -1,6 +1,8 @@
 # これが現状の最も正確なCFG解析コード
-# - 関数単位でのループ・条件文検出（detect_function.py使用）
-# - ループ考慮パス検出（path_dfs.py使用、2回まで訪問）
+# - 関数単位でのループ・条件文検出（detect_function.py使用、astでファイルごとに1回だけ走査）
+# - ループ考慮パス検出（2回まで訪問）・サイクル数（還元可能なCFGは正確・それ以外は上限付き）
+# - 構造的特徴量は整数インデックスのCSRで計算（cfg_arrays.py使用、networkx版はデバッグ用）
+#   networkx版も連結成分・エントリー/出口の検出以外は cfg_arrays.py の同じ実装を使う
 # - 再帰検出をloop_statementsに統合
 # 関数単位でできた、パス数できた、あとは関数追跡出来たら完璧
 
@@ -9,12 +11,17 @@ import networkx as nx
 import os
 import sys
 
+# pipeline_profiler.py（analyze/）から段階別計測をインポート
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pipeline_profiler import stage, count
+
 # detect_function.pyから関数をインポート
 try:
     from detect_function import (
         delete_comments,
         extract_functions_and_others,
         count_statements,
+        count_statements_by_function,
         get_all_function_stats,
         get_file_totals
     )
@@ -24,70 +31,60 @@ except ImportError:
 
 # path_dfs.pyから関数をインポート
 try:
-    from path_dfs import (
-        find_entry_exit_nodes,
-        collect_all_paths
-    )
+    from path_dfs import find_entry_exit_nodes
 except ImportError:
     print("path_dfs.pyが見つかりません。同じディレクトリに配置してください。")
     sys.exit(1)
 
-def extract_function_level_features(source_code, cfg_name):
-    """関数単位でのループ・条件文検出"""
+# cfg_arrays.pyから関数をインポート（構造的特徴量の配列版、パス数・サイクル数の実装）
+try:
+    from cfg_arrays import CFGArrays, compute_structural_features, count_cycles, count_all_paths
+except ImportError:
+    print("cfg_arrays.pyが見つかりません。同じディレクトリに配置してください。")
+    sys.exit(1)
+
+def extract_function_level_features(source_code, cfg_name, statement_counts=None):
+    """
+    関数単位でのループ・条件文検出
+
+    Args:
+        source_code (str): ソースコード
+        cfg_name (str): CFG名（関数名または<module>）
+        statement_counts (dict): count_statements_by_function の結果（Noneの場合はここで計算）
+    """
     if not source_code:
         return {'loop_statements': 0, 'conditional_statements': 0}
 
-    # コメントを除去
-    filtered_code = delete_comments(source_code)
-
-    # 関数とその他のコードを分離
-    functions, other_code = extract_functions_and_others(filtered_code)
-
-    # 特定の関数名に対応する統計を取得
-    for func_name, func_body in functions:
-        # 関数名マッチング（"def example(" → "example"）
-        if func_name.startswith("def "):
-            clean_func_name = func_name.split('(')[0].replace('def ', '').strip()
-            if clean_func_name == cfg_name:
-                if_count, for_count, while_count, match_count = count_statements(func_body)
-
-                # ループ文：for + while
-                loop_statements = for_count + while_count
-
-                # 条件文：if/elif + while + for + match
-                conditional_statements = if_count + while_count + for_count + match_count
-
-                return {
-                    'loop_statements': loop_statements,
-                    'conditional_statements': conditional_statements,
-                    'detail': {
-                        'if_count': if_count,
-                        'for_count': for_count,
-                        'while_count': while_count,
-                        'match_count': match_count
-                    }
-                }
-
-    # 関数が見つからない場合（モジュールレベルなど）
-    if cfg_name == '<module>' or cfg_name == '&lt;module&gt;':
-        # モジュールレベルのコード（関数以外）から検出
-        if_count, for_count, while_count, match_count = count_statements(other_code)
-        loop_statements = for_count + while_count
-        conditional_statements = if_count + while_count + for_count + match_count
-
-        return {
-            'loop_statements': loop_statements,
-            'conditional_statements': conditional_statements,
-            'detail': {
-                'if_count': if_count,
-                'for_count': for_count,
-                'while_count': while_count,
-                'match_count': match_count
-            }
-        }
+    # ファイル単位で1回だけ数えた結果から引く
+    if statement_counts is None:
+        statement_counts = count_statements_by_function(source_code)
 
-    # 該当する関数が見つからない場合
-    return {'loop_statements': 0, 'conditional_statements': 0}
+    if cfg_name == '&lt;module&gt;':
+        cfg_name = '<module>'
+
+    counts = statement_counts.get(cfg_name)
+    if counts is None:
+        # 該当する関数が見つからない場合
+        return {'loop_statements': 0, 'conditional_statements': 0}
+
+    if_count, for_count, while_count, match_count = counts
+
+    # ループ文：for + while
+    loop_statements = for_count + while_count
+
+    # 条件文：if/elif + while + for + match
+    conditional_statements = if_count + while_count + for_count + match_count
+
+    return {
+        'loop_statements': loop_statements,
+        'conditional_statements': conditional_statements,
+        'detail': {
+            'if_count': if_count,
+            'for_count': for_count,
+            'while_count': while_count,
+            'match_count': match_count
+        }
+    }
 
 def detect_language(source_code, filename):
     """ソースコードと拡張子から言語を判定"""
@@ -116,20 +113,102 @@ def simple_remove_comments(source_code, language):
     """簡略化されたコメント除去（detect_function.pyのdelete_commentsを使用）"""
     return '\n'.join(delete_comments(source_code))
 
-def extract_accurate_features(cfg, cfg_name, source_code=None, filename=None):
-    """CFG構造分析に基づいた最適化された特徴量抽出（関数単位検出使用）"""
+def extract_networkx_structural_features(cfg):
+    """
+    networkx版の構造的特徴量（デバッグ・配列版との比較用）
+    連結成分とエントリー/出口はnetworkxで求め、サイクル数・パス数は cfg_arrays.py の実装で数える
+
+    Returns:
+        dict: connected_components / cycles / cycles_saturated / paths / cyclomatic_complexity
+    """
     features = {}
+    arrays = CFGArrays.from_cfg(cfg)
+    index = {node: i for i, node in enumerate(arrays.nodes)}
 
-    # 1. Connected Components
+    # Connected Components
     try:
-        weakly_connected = list(nx.weakly_connected_components(cfg))
+        with stage('cfg_components'):
+            weakly_connected = list(nx.weakly_connected_components(cfg))
         features['connected_components'] = len(weakly_connected)
     except Exception:
         features['connected_components'] = 0
 
+    # Cycles（還元可能なCFGは正確、それ以外は上限付き。上限到達時はcycles_saturated=True）
+    try:
+        with stage('cfg_cycles'):
+            cycle_count, saturated = count_cycles(arrays)
+        features['cycles'] = cycle_count
+        features['cycles_saturated'] = saturated
+    except Exception:
+        features['cycles'] = 0
+        features['cycles_saturated'] = False
+
+    # Paths（ループ考慮版）
+    try:
+        with stage('cfg_paths'):
+            entry_nodes, exit_nodes = find_entry_exit_nodes(cfg)
+
+            total_paths = 0
+            if entry_nodes and exit_nodes:
+                for entry in entry_nodes:
+                    for exit_node in exit_nodes:
+                        # ループ考慮パス数（2回まで訪問、パスは列挙しない）
+                        total_paths += count_all_paths(arrays, index[entry], index[exit_node], max_visits=2)
+
+        features['paths'] = total_paths
+    except Exception as e:
+        print(f"パス計算エラー: {e}")
+        features['paths'] = 0
+
+    # Cyclomatic Complexity
+    try:
+        E = cfg.number_of_edges()
+        N = cfg.number_of_nodes()
+        P = features.get('connected_components', 1)
+        features['cyclomatic_complexity'] = E - N + 2 * P
+    except Exception:
+        features['cyclomatic_complexity'] = 0
+
+    return features
+
+def extract_structural_features(cfg, use_networkx=False):
+    """
+    CFGの構造的特徴量（connected_components / cycles / paths / cyclomatic_complexity）
+
+    Args:
+        cfg (nx.DiGraph): CFG
+        use_networkx (bool): Trueの場合はnetworkx版で計算（デバッグ用）
+
+    Returns:
+        dict: 構造的特徴量
+    """
+    if not use_networkx:
+        try:
+            # 整数インデックスのCSRに1回だけ変換して計算（cfg_arrays.py）
+            with stage('cfg_to_arrays'):
+                arrays = CFGArrays.from_cfg(cfg)
+            return compute_structural_features(arrays)
+        except Exception as e:
+            print(f"⚠️ 配列版CFG特徴量エラー（networkx版で再計算）: {e}")
+    return extract_networkx_structural_features(cfg)
+
+def extract_accurate_features(cfg, cfg_name, source_code=None, filename=None, statement_counts=None,
+                              use_networkx=False):
+    """
+    CFG構造分析に基づいた最適化された特徴量抽出（関数単位検出使用）
+
+    Args:
+        use_networkx (bool): 構造的特徴量をnetworkx版で計算する（デバッグ用、既定は配列版）
+    """
+    features = {}
+    structural = extract_structural_features(cfg, use_networkx)
+
+    # 1. Connected Components
+    features['connected_components'] = structural['connected_components']
+
     # 2. ループ文と条件文検出（関数単位の正確な検出）
     if source_code:
-        function_features = extract_function_level_features(source_code, cfg_name)
+        function_features = extract_function_level_features(source_code, cfg_name, statement_counts)
         base_loop_statements = function_features.get('loop_statements', 0)
         features['conditional_statements'] = function_features.get('conditional_statements', 0)
 
@@ -154,38 +233,19 @@ def extract_accurate_features(cfg, cfg_name, source_code=None, filename=None):
     features['loop_statements'] = base_loop_statements + recursive_loops
     features['recursive_loops'] = recursive_loops  # デバッグ用（表示は控える）
 
-    # 4. Cycles
-    try:
-        cycles = list(nx.simple_cycles(cfg))
-        features['cycles'] = len(cycles)
-    except Exception:
-        features['cycles'] = 0
+    # 4. Cycles / 5. Paths / 6. Cyclomatic Complexity
+    features['cycles'] = structural['cycles']
+    features['cycles_saturated'] = structural['cycles_saturated']
+    features['paths'] = structural['paths']
+    features['cyclomatic_complexity'] = structural['cyclomatic_complexity']
 
-    # 5. Paths（ループ考慮版 - path_dfs.pyから）
-    try:
-        entry_nodes, exit_nodes = find_entry_exit_nodes(cfg)
-
-        total_paths = 0
-        if entry_nodes and exit_nodes:
-            for entry in entry_nodes:
-                for exit_node in exit_nodes:
-                    # path_dfs.pyのループ考慮パス検出を使用（2回まで訪問）
-                    paths = collect_all_paths(cfg, entry, exit_node, max_visits=2)
-                    total_paths += len(paths)
-
-        features['paths'] = total_paths
-    except Exception as e:
-        print(f"パス計算エラー: {e}")
-        features['paths'] = 0
-
-    # 6. Cyclomatic Complexity
-    try:
-        E = cfg.number_of_edges()
-        N = cfg.number_of_nodes()
-        P = features.get('connected_components', 1)
-        features['cyclomatic_complexity'] = E - N + 2 * P
-    except Exception:
-        features['cyclomatic_complexity'] = 0
+    # 段階別計測用のカウンタ（計測が無効なら何もしない）
+    count('cfgs')
+    count('cfg_nodes', cfg.number_of_nodes())
+    count('cfg_edges', cfg.number_of_edges())
+    count('paths', features['paths'])
+    count('cycles', features['cycles'])
+    count('cycles_saturated', int(features['cycles_saturated']))
 
     return features
 
@@ -256,6 +316,10 @@ def display_accurate_summary(all_features, source_code="", source_file=""):
         total_paths = sum(features.get('paths', 0) for features in all_features.values())
         total_complexity = sum(features.get('cyclomatic_complexity', 0) for features in all_features.values())
 
+        saturated = [name for name, features in all_features.items() if features.get('cycles_saturated')]
+        if saturated:
+            print(f"⚠️ サイクル数が上限に達しました（下限値）: {', '.join(saturated)}")
+
         # print(f"  total_connected_components: {total_connected}")
         # print(f"  function_level_loop_statements: {total_loops} (関数単位正確検出、再帰含む)")
         # print(f"  function_level_conditional_statements: {total_conditions} (関数単位正確検出)")
@@ -283,45 +347,65 @@ def display_accurate_summary(all_features, source_code="", source_file=""):
         #     recursive_count = features.get('recursive_loops', 0)
             # print(f"  詳細: if={detail.get('if_count', 0)}, for={detail.get('for_count', 0)}, while={detail.get('while_count', 0)}, match={detail.get('match_count', 0)}, recursive={recursive_count}")
 
-def analyze_accurate_cfg(source_file):
-    """CFG解析"""
+def analyze_accurate_cfg(source_file, program=None, strict=False):
+    """
+    CFG解析
+
+    Args:
+        source_file (str): 解析対象ファイルパス
+        program (ParsedProgram): 解析済みセッション（Noneの場合はここでフロントエンドを実行）
+        strict (bool): Trueの場合、読み込み・解析エラーを表示して続行せずに送出する
+    """
     print(f"解析中: {source_file}")
     all_features = {}
 
     # ソースコード読み込み
     source_code = ""
-    try:
-        with open(source_file, 'r', encoding='utf-8') as f:
-            source_code = f.read()
-    except Exception as e:
-        print(f"読み込みエラー: {e}")
+    if program is not None:
+        source_code = program.source_code
+    else:
+        try:
+            with open(source_file, 'r', encoding='utf-8') as f:
+                source_code = f.read()
+        except Exception as e:
+            print(f"読み込みエラー: {e}")
+            if strict:
+                raise
+
+    # 条件文・ループ文はファイル全体を1回だけ走査して関数ごとに数える
+    with stage('cfg_statement_counts'):
+        statement_counts = count_statements_by_function(source_code)
 
     # 関数レベル解析
     try:
-        functions = parse_source(source_file)
+        functions = program.functions if program is not None else parse_source(source_file)
         for func_name, func_obj in functions.items():
             metadata = analyze_function_metadata(func_obj)
             cfg = func_obj.cfg if hasattr(func_obj, 'cfg') else None
             if cfg and len(cfg.nodes()) > 0:
-                features = extract_accurate_features(cfg, func_name, source_code, source_file)
+                features = extract_accurate_features(cfg, func_name, source_code, source_file, statement_counts)
                 features.update(metadata)
                 all_features[func_name] = features
     except Exception as e:
         print(f"関数解析エラー: {e}")
+        if strict:
+            raise
 
     # モジュールレベル解析
     try:
-        cfgs = fast_cfgs_from_source(source_file)
+        cfgs = program.cfgs if program is not None else fast_cfgs_from_source(source_file)
         for cfg_name, cfg in cfgs.items():
             if (cfg_name.startswith('<operator>') or cfg_name.startswith('&lt;operator&gt;')):
                 continue
             if cfg_name in all_features:
                 continue
             if len(cfg.nodes()) > 0:
-                features = extract_accurate_features(cfg, cfg_name, source_code, source_file)
+                features = extract_accurate_features(cfg, cfg_name, source_code, source_file, statement_counts)
                 all_features[cfg_name] = features
     except Exception as e:
         print(f"モジュール解析エラー: {e}")
+        if strict:
+            raise
 
     display_accurate_summary(all_features, source_code, source_file)
     return all_features
@@ -1,10 +1,14 @@
 # CFGの深さ優先探索ツール
 # 2回まで同じノードを訪問可能（ループ考慮）
-# パス数解決
+# パス数解決（count_all_paths: パスを列挙せずに数える、計算は cfg_arrays.py の整数インデックス版）
+# pyjoernはソース解析時に遅延インポートする（CFG単位の関数は Joern なしでも検証できる）
+# 回帰テスト: analyze/tests/test_path_count.py
 
-from pyjoern import parse_source, fast_cfgs_from_source
 import networkx as nx
 
+from cfg_arrays import CFGArrays
+import cfg_arrays
+
 def find_entry_exit_nodes(cfg):
     """エントリーノードと出口ノードを特定"""
     entry_nodes = []
@@ -70,7 +74,73 @@ def collect_all_paths(cfg, start_node, end_node, visited_count=None, current_pat
 
     return all_paths
 
-
+def count_all_paths(cfg, start_node, end_node, max_visits=2):
+    """
+    collect_all_paths と同じ条件のパス数をパスリストを作らずに数える
+    （CFGを整数インデックスに変換して cfg_arrays.count_all_paths を呼ぶ）
+
+    Args:
+        cfg (nx.DiGraph): CFG
+        start_node: 開始ノード
+        end_node: 終了ノード
+        max_visits (int): 1ノードあたりの最大訪問回数
+
+    Returns:
+        int: len(collect_all_paths(cfg, start_node, end_node, max_visits=max_visits)) と同じ値
+    """
+    if max_visits < 1 or start_node not in cfg:
+        return 0
+    if start_node == end_node:
+        return 1
+    if end_node not in cfg:
+        return 0
+
+    arrays = CFGArrays.from_cfg(cfg)
+    index = {node: i for i, node in enumerate(arrays.nodes)}
+    return cfg_arrays.count_all_paths(arrays, index[start_node], index[end_node], max_visits=max_visits)
+
+def path_count_mismatches(cfg, max_visits=2):
+    """
+    1つのCFGの全エントリー/出口の組で count_all_paths と collect_all_paths の件数を比較する
+
+    Args:
+        cfg (nx.DiGraph): CFG
+        max_visits (int): 1ノードあたりの最大訪問回数
+
+    Returns:
+        list: 一致しなかった組の (エントリー, 出口, 列挙した件数, 数えた件数) のリスト
+    """
+    mismatches = []
+    entry_nodes, exit_nodes = find_entry_exit_nodes(cfg)
+    for entry in entry_nodes:
+        for exit_node in exit_nodes:
+            expected = len(collect_all_paths(cfg, entry, exit_node, max_visits=max_visits))
+            actual = count_all_paths(cfg, entry, exit_node, max_visits=max_visits)
+            if expected != actual:
+                mismatches.append((entry, exit_node, expected, actual))
+    return mismatches
+
+def verify_path_count(source_file, max_visits=2):
+    """
+    count_all_paths と collect_all_paths の件数が一致するか確認する
+
+    Returns:
+        bool: 全CFG・全エントリー/出口の組で一致した場合True
+    """
+    from pyjoern import fast_cfgs_from_source
+    cfgs = fast_cfgs_from_source(source_file)
+    all_match = True
+
+    for cfg_name, cfg in cfgs.items():
+        if cfg_name.startswith('<operator>') or cfg.number_of_nodes() == 0:
+            continue
+        for entry, exit_node, expected, actual in path_count_mismatches(cfg, max_visits=max_visits):
+            print(f"❌ パス数不一致: {cfg_name} {entry} -> {exit_node}: 列挙={expected}, 計数={actual}")
+            all_match = False
+
+    if all_match:
+        print(f"✅ パス数一致: {source_file}")
+    return all_match
 
 def dfs_cfg_analysis(source_file):
     """CFGの深さ優先探索解析"""
@@ -79,6 +149,7 @@ def dfs_cfg_analysis(source_file):
 
     # CFGを取得
     try:
+        from pyjoern import fast_cfgs_from_source
         cfgs = fast_cfgs_from_source(source_file)
 
         for cfg_name, cfg in cfgs.items():
@@ -131,11 +202,13 @@ def dfs_cfg_analysis(source_file):
 
 def main():
     # テストファイル（実際のファイル名に変更）
-    test_files = ["while.py"]
+    test_files = ["while.py", "whiletest.py"]
 
     for test_file in test_files:
         try:
             dfs_cfg_analysis(test_file)
+            # 計数版と列挙版のパス数が一致するか確認
+            verify_path_count(test_file)
         except FileNotFoundError:
             print(f"ファイルが見つかりません: {test_file}")
         except Exception as e:
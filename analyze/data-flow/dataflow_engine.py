@@ -0,0 +1,280 @@
+# データフロー特徴量の読み込み・書き込み・複合代入を1回の字句解析で数えるエンジン
+# ext_feature_data_flow.py の analyze_compound_assignments / analyze_variable_reads /
+# analyze_variable_writes と同じ結果を返す
+# - 従来: ステートメント × 変数 × パターンごとに f-string の正規表現を作って検索
+# - 本エンジン: ステートメントごとに str(stmt) を1回だけ作り（statement_index.py）、事前コンパイル済みの
+#   正規表現で識別子の出現（読み込み / 代入 / 複合代入 / ループ変数）を取り出してから、
+#   該当する変数だけを1回の走査で数える
+# 従来の関数との一致は analyze/tests/test_dataflow_engine.py で確認する
+
+import re
+
+from statement_index import statement_index
+
+# 複合代入演算子（従来の検出順）
+COMPOUND_OPERATORS = ['+=', '-=', '*=', '/=', '//=', '%=', '**=', '&=', '|=', '^=', '<<=', '>>=']
+_OPERATOR_ORDER = {op: i for i, op in enumerate(COMPOUND_OPERATORS)}
+_OPERATOR_ALTERNATION = '|'.join(re.escape(op) for op in sorted(COMPOUND_OPERATORS, key=len, reverse=True))
+
+# ステートメント単位の除外判定（従来の exclude_patterns をまとめたもの）
+_COMPOUND_EXCLUDE = re.compile(r'<UnsupportedStmt:.*(?:IDENTIFIER|LITERAL|BLOCK),|PARAM,|LOCAL,', re.IGNORECASE)
+_READ_EXCLUDE = re.compile(
+    r'PARAM,|LOCAL,|CONTROL_STRUCTURE|^\s*tmp\d+\s*=|^\s*\w+\)\s*$|__next__\(\)|<UnsupportedStmt:',
+    re.IGNORECASE
+)
+_WRITE_EXCLUDE = re.compile(
+    r'<UnsupportedStmt:.*(?:IDENTIFIER|LITERAL|BLOCK),|PARAM,|LOCAL,|CONTROL_STRUCTURE|^\s*tmp\d+\s*=|^\s*\w+\)\s*$',
+    re.IGNORECASE
+)
+
+# 識別子の出現と役割
+_TOKEN = re.compile(r'\w+')
+_COMPOUND = re.compile(rf'\b(\w+)\s*({_OPERATOR_ALTERNATION})')
+_LOOP_TARGET = re.compile(r'(?=for\s+(\w+)\s+in\s+)')
+_LOOP_TARGET_ANY_CASE = re.compile(r'(?=for\s+(\w+)\s+in\s+)', re.IGNORECASE)
+_ASSIGN_TARGET = re.compile(r'\b(\w+)(?=\s*=\s*[^=])')
+_ITERATOR_ASSIGN = re.compile(r'\b(\w+)(?=\s*=\s*tmp\d+\.__next__\(\))')
+_WRITE_TARGET = re.compile(rf'\b(\w+)(?=\s*=\s*[^=]|\s*(?:{_OPERATOR_ALTERNATION}))')
+_LOCAL_DEFINITION = re.compile(r'LOCAL,(\w+):')
+
+class StatementTokens:
+    """1つのステートメント文字列の識別子の出現（役割別）"""
+    __slots__ = ('text', 'node_addr', 'tokens', 'compound', 'loop_targets', 'loop_targets_any_case',
+                 'assign_targets', 'iterator_assigns', 'write_targets', 'local_definitions',
+                 'compound_excluded', 'read_excluded', 'write_excluded', 'has_for_structure')
+
+    def __init__(self, text, node_addr):
+        self.text = text
+        self.node_addr = node_addr
+        self.compound_excluded = _COMPOUND_EXCLUDE.search(text) is not None
+        self.read_excluded = _READ_EXCLUDE.search(text) is not None
+        self.write_excluded = _WRITE_EXCLUDE.search(text) is not None
+        self.has_for_structure = 'CONTROL_STRUCTURE,FOR' in text
+
+        # 読み込み: \bvar\b（識別子全体）
+        self.tokens = set(_TOKEN.findall(text))
+        # 複合代入: var op（変数ごとに演算子の種類を記録）
+        self.compound = {}
+        for var, op in _COMPOUND.findall(text):
+            self.compound.setdefault(var, set()).add(op)
+        # ループ変数: for var in（読み込みは大文字小文字を区別、書き込みは区別しない）
+        self.loop_targets = set(_LOOP_TARGET.findall(text))
+        self.loop_targets_any_case = {var.lower() for var in _LOOP_TARGET_ANY_CASE.findall(text)}
+        # 代入の左辺: 従来のパターンは先頭に \b がないため、識別子の末尾一致で判定する
+        self.assign_targets = set(_ASSIGN_TARGET.findall(text))
+        # tmpN.__next__() からの代入（ループ変数の実際の書き込み）
+        self.iterator_assigns = set(_ITERATOR_ASSIGN.findall(text))
+        # 代入・複合代入の左辺（大文字小文字を区別しない）
+        self.write_targets = {var.lower() for var in _WRITE_TARGET.findall(text)}
+        # LOCAL,var: の定義
+        self.local_definitions = set(_LOCAL_DEFINITION.findall(text))
+
+    def is_assign_target(self, var):
+        return any(target.endswith(var) for target in self.assign_targets)
+
+def tokenize_function(func_obj):
+    """
+    関数内の全ステートメントを1回ずつ字句解析する
+
+    Args:
+        func_obj: pyjoernの関数オブジェクト（func_obj.ast.nodes を持つ）
+
+    Returns:
+        list: StatementTokens のリスト（ノード順・ステートメント順）
+    """
+    statements = []
+    for node, entries in statement_index(func_obj.ast).items():
+        for entry in entries:
+            statements.append(StatementTokens(entry.text, node.addr))
+    return statements
+
+def _variables_by_lower(user_defined_vars):
+    by_lower = {}
+    for var in user_defined_vars:
+        by_lower.setdefault(var.lower(), []).append(var)
+    return by_lower
+
+def count_compound_assignments(statements, user_defined_vars):
+    """複合代入演算子の検出（analyze_compound_assignments と同じ結果）"""
+    compound_assignments = {var: [] for var in user_defined_vars}
+    for stmt in statements:
+        if stmt.compound_excluded or not stmt.compound:
+            continue
+        for var in user_defined_vars:
+            ops = stmt.compound.get(var)
+            if not ops:
+                continue
+            for op in sorted(ops, key=_OPERATOR_ORDER.__getitem__):
+                compound_assignments[var].append({
+                    'variable': var,
+                    'operator': op,
+                    'statement': stmt.text[:100],
+                    'node_addr': stmt.node_addr
+                })
+    return compound_assignments
+
+def count_reads(statements, user_defined_vars, compound_assignments=None):
+    """読み込み数のカウント（analyze_variable_reads と同じ結果）"""
+    read_counts = {var: 0 for var in user_defined_vars}
+    for stmt in statements:
+        if stmt.read_excluded:
+            continue
+        # 1になり得るのは識別子として現れる変数かループ変数だけ
+        for var in (stmt.tokens | stmt.loop_targets) & read_counts.keys():
+            if var in stmt.loop_targets:
+                read_counts[var] += 1
+            elif not stmt.is_assign_target(var) and var in stmt.tokens:
+                read_counts[var] += 1
+
+    # 複合代入演算子による読み込み
+    if compound_assignments:
+        for var in user_defined_vars:
+            read_counts[var] += len(compound_assignments.get(var, []))
+    return read_counts
+
+def _loop_variables(statements, user_defined_vars, by_lower):
+    """ループ変数の特定（従来と同じく、ステートメントごとに変数の走査順で最初の1つだけ）"""
+    rank = {var: i for i, var in enumerate(user_defined_vars)}
+    loop_variables = set()
+    for stmt in statements:
+        candidates = [var for lower in stmt.loop_targets_any_case for var in by_lower.get(lower, ())]
+        if stmt.has_for_structure:
+            candidates.extend(var for var in user_defined_vars if var in stmt.text)
+        if candidates:
+            loop_variables.add(min(candidates, key=rank.__getitem__))
+    return loop_variables
+
+def count_writes(statements, var_analysis, user_defined_vars):
+    """書き込み数のカウント（analyze_variable_writes と同じ結果）"""
+    by_lower = _variables_by_lower(user_defined_vars)
+    loop_variables = _loop_variables(statements, user_defined_vars, by_lower)
+
+    write_counts = {var: 0 for var in user_defined_vars}
+    detected_loop_writes = set()
+
+    for stmt in statements:
+        # 1になり得る変数だけを調べる
+        candidates = set()
+        for lower in stmt.loop_targets_any_case:
+            candidates.update(by_lower.get(lower, ()))
+        candidates.update(var for var in stmt.iterator_assigns if var in write_counts)
+        if not stmt.write_excluded:
+            for lower in stmt.write_targets:
+                candidates.update(by_lower.get(lower, ()))
+        candidates.update(var for var in stmt.local_definitions if var in loop_variables)
+
+        for var in candidates:
+            write_key = (var, stmt.node_addr)
+            if var.lower() in stmt.loop_targets_any_case:
+                write_count = 1
+            elif var in stmt.iterator_assigns:
+                if write_key not in detected_loop_writes:
+                    detected_loop_writes.add(write_key)
+                    write_count = 1
+                else:
+                    write_count = 0
+            elif not stmt.write_excluded and var.lower() in stmt.write_targets:
+                write_count = 1
+            else:
+                write_count = 0
+
+            # ループ変数のLOCAL定義は1回の書き込み
+            if write_count == 0 and var in loop_variables:
+                if var in stmt.local_definitions and write_key not in detected_loop_writes:
+                    write_count = 1
+                    detected_loop_writes.add(write_key)
+
+            write_counts[var] += write_count
+
+    # 関数の引数（パラメータ）は値を受け取るため+1
+    for param in var_analysis['parameters']:
+        write_counts[param] += 1
+    return write_counts
+
+def analyze_function_dataflow(func_obj, var_analysis):
+    """
+    1関数の複合代入・読み込み数・書き込み数をまとめて求める
+
+    Args:
+        func_obj: pyjoernの関数オブジェクト
+        var_analysis (dict): analyze_variables_from_statements の結果
+
+    Returns:
+        tuple: (compound_assignments, read_counts, write_counts)
+    """
+    user_defined_vars = var_analysis['parameters'] | var_analysis['local_vars']
+    if not user_defined_vars:
+        print("  独自定義変数が見つかりません")
+        return {}, {}, {}
+
+    statements = tokenize_function(func_obj)
+    compound_assignments = count_compound_assignments(statements, user_defined_vars)
+    read_counts = count_reads(statements, user_defined_vars, compound_assignments)
+    write_counts = count_writes(statements, var_analysis, user_defined_vars)
+    return compound_assignments, read_counts, write_counts
+
+def analyze_function_dataflow_legacy(func_obj, var_analysis):
+    """
+    従来の変数ごとの関数（ext_feature_data_flow.py）で analyze_function_dataflow と同じ値を求める
+
+    Args:
+        func_obj: pyjoernの関数オブジェクト
+        var_analysis (dict): analyze_variables_from_statements の結果
+
+    Returns:
+        tuple: (compound_assignments, read_counts, write_counts)
+    """
+    from ext_feature_data_flow import (
+        analyze_compound_assignments,
+        analyze_variable_reads,
+        analyze_variable_writes
+    )
+
+    compound_assignments = analyze_compound_assignments(func_obj, var_analysis)
+    return (
+        compound_assignments,
+        analyze_variable_reads(func_obj, var_analysis, compound_assignments),
+        analyze_variable_writes(func_obj, var_analysis, compound_assignments)
+    )
+
+def verify_engine_parity(file_path):
+    """
+    従来の変数ごとの関数とエンジンの結果を比較
+
+    Args:
+        file_path (str): 解析対象ファイルパス
+
+    Returns:
+        bool: 全関数で一致した場合True
+    """
+    from pyjoern import parse_source
+    from ext_feature_data_flow import analyze_variables_from_statements
+
+    all_match = True
+    for func_name, func_obj in parse_source(file_path).items():
+        if not (hasattr(func_obj, 'ast') and func_obj.ast):
+            continue
+        var_analysis = analyze_variables_from_statements(func_obj)
+        expected = analyze_function_dataflow_legacy(func_obj, var_analysis)
+        actual = analyze_function_dataflow(func_obj, var_analysis)
+        match = actual == expected
+        all_match = all_match and match
+        mark = "✅" if match else "❌"
+        print(f"{mark} {file_path} {func_name}: reads={actual[1]} writes={actual[2]}")
+        if not match:
+            print(f"    従来: reads={expected[1]} writes={expected[2]}")
+    return all_match
+
+def main():
+    test_files = ["whiletest.py", "../control-flow/while.py", "../control-flow/whiletest.py"]
+
+    for test_file in test_files:
+        try:
+            verify_engine_parity(test_file)
+        except FileNotFoundError:
+            print(f"ファイルが見つかりません: {test_file}")
+        except Exception as e:
+            print(f"エラー: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
 #これがデータフローから特徴量抽出するコード
+# pyjoernは解析時に遅延インポートする（ステートメント単位の関数は Joern なしでも検証できる）
 
-from pyjoern import parse_source, fast_cfgs_from_source
 import networkx as nx
+import os
+import sys
+# pipeline_profiler.py（analyze/）から段階別計測をインポート
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pipeline_profiler import stage, count
+from dataflow_engine import analyze_function_dataflow
+from statement_index import statement_index, KIND_PARAM, KIND_LOCAL, KIND_CONTROL_STRUCTURE
 
 
 def analyze_ast_node_types(file_path):
 
     try:
+        from pyjoern import parse_source
         functions = parse_source(file_path)
 
         for func_name, func_obj in functions.items():
@@ -30,21 +38,20 @@ def get_function_parameters(func_obj):
     parameters = []
 
     if hasattr(func_obj, 'ast') and func_obj.ast:
-        for node in func_obj.ast.nodes:
-            if hasattr(node, 'statements') and node.statements:
-                for stmt in node.statements:
-                    stmt_str = str(stmt)
-
-                    # PARAMステートメントからパラメータを抽出
-                    if stmt_str.startswith('<UnsupportedStmt: PARAM,'):
-                        try:
-                            # PARAM,parameter_name:type の形式
-                            param_part = stmt_str.split('PARAM,')[1]
-                            param_name = param_part.split(':')[0] if ':' in param_part else param_part.split('>')[0]
-                            if param_name and param_name not in parameters:
-                                parameters.append(param_name)
-                        except:
-                            pass
+        for node, entries in statement_index(func_obj.ast).items():
+            for entry in entries:
+                stmt_str = entry.text
+
+                # PARAMステートメントからパラメータを抽出
+                if stmt_str.startswith('<UnsupportedStmt: PARAM,'):
+                    try:
+                        # PARAM,parameter_name:type の形式
+                        param_part = stmt_str.split('PARAM,')[1]
+                        param_name = param_part.split(':')[0] if ':' in param_part else param_part.split('>')[0]
+                        if param_name and param_name not in parameters:
+                            parameters.append(param_name)
+                    except:
+                        pass
 
     return parameters
 
@@ -55,25 +62,24 @@ def analyze_top_level_variables(module_cfg):
     variable_reads = {}
     variable_writes = {}
 
-    for node in module_cfg.nodes():
-        if hasattr(node, 'statements') and node.statements:
-            for stmt in node.statements:
-                stmt_str = str(stmt)
+    for node, entries in statement_index(module_cfg).items():
+        for entry in entries:
+            stmt_str = entry.text
 
-                # 代入文を検出
-                if '=' in stmt_str and not stmt_str.startswith('<UnsupportedStmt:') and not 'def' in stmt_str:
-                    # 単純な代入文 (var = value)
-                    import re
-                    assignment_pattern = r'(\w+)\s*=\s*(.+)'
-                    match = re.search(assignment_pattern, stmt_str)
+            # 代入文を検出
+            if '=' in stmt_str and not stmt_str.startswith('<UnsupportedStmt:') and not 'def' in stmt_str:
+                # 単純な代入文 (var = value)
+                import re
+                assignment_pattern = r'(\w+)\s*=\s*(.+)'
+                match = re.search(assignment_pattern, stmt_str)
 
-                    if match:
-                        var_name = match.group(1).strip()
-                        value = match.group(2).strip()
+                if match:
+                    var_name = match.group(1).strip()
+                    value = match.group(2).strip()
 
-                        # 組み込み変数や関数定義を除外
-                        if var_name not in ['print', 'range', '__name__'] and not value.startswith('def'):
-                            variable_writes[var_name] = variable_writes.get(var_name, 0) + 1
+                    # 組み込み変数や関数定義を除外
+                    if var_name not in ['print', 'range', '__name__'] and not value.startswith('def'):
+                        variable_writes[var_name] = variable_writes.get(var_name, 0) + 1
 
     return {
         'variable_reads': variable_reads,
@@ -83,10 +89,14 @@ def analyze_top_level_variables(module_cfg):
     }
 
 
-def analyze_top_level_code(file_path):
+def analyze_top_level_code(file_path, program=None, strict=False):
     try:
-        # fast_cfgs_from_sourceでモジュール全体のCFGを取得
-        all_cfgs = fast_cfgs_from_source(file_path)
+        # fast_cfgs_from_sourceでモジュール全体のCFGを取得（解析済みセッションがあれば再利用）
+        if program is not None:
+            all_cfgs = program.cfgs
+        else:
+            from pyjoern import fast_cfgs_from_source
+            all_cfgs = fast_cfgs_from_source(file_path)
 
         # <module> CFGを検索（エスケープされた形式も考慮）
         module_cfg = None
@@ -100,12 +110,8 @@ def analyze_top_level_code(file_path):
         if not module_cfg:
             return {}
 
-        # モジュール内のステートメントを表示
-
-        for i, node in enumerate(module_cfg.nodes()):
-            if hasattr(node, 'statements') and node.statements:
-                for j, stmt in enumerate(node.statements):
-                    stmt_str = str(stmt)
+        # モジュール内のステートメントを1回だけ文字列化・分類（以降の解析で共有）
+        statement_index(module_cfg)
 
         top_level_vars = analyze_top_level_variables(module_cfg)
 
@@ -138,6 +144,8 @@ def analyze_top_level_code(file_path):
 
     except Exception as e:
         print(f"トップレベル解析エラー: {e}")
+        if strict:
+            raise
         import traceback
         traceback.print_exc()
         return {
@@ -168,51 +176,50 @@ def extract_top_level_variables(module_cfg):
 
     variables = set()
 
-    for node in module_cfg.nodes():
-        if hasattr(node, 'statements') and node.statements:
-            for stmt in node.statements:
-                stmt_str = str(stmt)
+    for node, entries in statement_index(module_cfg).items():
+        for entry in entries:
+            stmt_str = entry.text
 
-                # pyjoernのメタデータステートメントを除外
-                if any(keyword in stmt_str for keyword in ['<UnsupportedStmt:', 'FUNCTION_', 'TYPE_REF', '__builtins__']):
-                    continue
+            # pyjoernのメタデータステートメントを除外
+            if entry.is_metadata:
+                continue
 
-                # 関数呼び出しの引数は変数として扱う（例: example(x) の x）
-                # しかし、関数名（example）自体は変数ではない
-                func_call_pattern = r'^([a-zA-Z_][a-zA-Z0-9_]*)\s*\(([^)]*)\)'
-                func_call_match = re.match(func_call_pattern, stmt_str)
-                if func_call_match:
-                    # 引数部分から変数を抽出
-                    args_part = func_call_match.group(2)
-                    if args_part:
-                        # 引数から変数を抽出（数値リテラルは除外）
-                        var_pattern = r'\b([a-zA-Z_][a-zA-Z0-9_]*)\b'
-                        arg_matches = re.findall(var_pattern, args_part)
-                        for var in arg_matches:
-                            if (var.isidentifier() and
-                                var not in builtin_names and
-                                var not in exclude_keywords and
-                                not var.startswith('__') and
-                                len(var) > 1):
-                                variables.add(var)
-                    continue
+            # 関数呼び出しの引数は変数として扱う（例: example(x) の x）
+            # しかし、関数名（example）自体は変数ではない
+            func_call_pattern = r'^([a-zA-Z_][a-zA-Z0-9_]*)\s*\(([^)]*)\)'
+            func_call_match = re.match(func_call_pattern, stmt_str)
+            if func_call_match:
+                # 引数部分から変数を抽出
+                args_part = func_call_match.group(2)
+                if args_part:
+                    # 引数から変数を抽出（数値リテラルは除外）
+                    var_pattern = r'\b([a-zA-Z_][a-zA-Z0-9_]*)\b'
+                    arg_matches = re.findall(var_pattern, args_part)
+                    for var in arg_matches:
+                        if (var.isidentifier() and
+                            var not in builtin_names and
+                            var not in exclude_keywords and
+                            not var.startswith('__') and
+                            len(var) > 1):
+                            variables.add(var)
+                continue
 
-                # 関数定義と条件式は変数として扱わない
-                if ('def' in stmt_str or '==' in stmt_str):
-                    continue
+            # 関数定義と条件式は変数として扱わない
+            if ('def' in stmt_str or '==' in stmt_str):
+                continue
 
-                # その他の変数使用（慎重に）
-                var_pattern = r'\b([a-zA-Z_][a-zA-Z0-9_]*)\b'
-                matches = re.findall(var_pattern, stmt_str)
-                for match in matches:
-                    if (match.isidentifier() and
-                        match not in builtin_names and
-                        match not in exclude_keywords and
-                        not match.startswith('__') and
-                        len(match) > 1):  # 一文字変数は除外
-                        # さらに厳格なフィルタリング
-                        if not any(x in match.lower() for x in ['tmp', 'stmt', 'ref', 'start', 'end']):
-                            variables.add(match)
+            # その他の変数使用（慎重に）
+            var_pattern = r'\b([a-zA-Z_][a-zA-Z0-9_]*)\b'
+            matches = re.findall(var_pattern, stmt_str)
+            for match in matches:
+                if (match.isidentifier() and
+                    match not in builtin_names and
+                    match not in exclude_keywords and
+                    not match.startswith('__') and
+                    len(match) > 1):  # 一文字変数は除外
+                    # さらに厳格なフィルタリング
+                    if not any(x in match.lower() for x in ['tmp', 'stmt', 'ref', 'start', 'end']):
+                        variables.add(match)
 
     return variables
 
@@ -222,38 +229,37 @@ def count_top_level_reads(module_cfg, top_level_vars):
 
     read_counts = {var: 0 for var in top_level_vars}
 
-    for node in module_cfg.nodes():
-        if hasattr(node, 'statements') and node.statements:
-            for stmt in node.statements:
-                stmt_str = str(stmt)
+    for node, entries in statement_index(module_cfg).items():
+        for entry in entries:
+            stmt_str = entry.text
+
+            # pyjoernのメタデータステートメントを除外
+            if entry.is_metadata:
+                continue
+
+            for var in top_level_vars:
+                # 関数呼び出しでの引数としての読み込み
+                func_call_pattern = rf'{var}\s*\('
+                if re.search(func_call_pattern, stmt_str):
+                    read_counts[var] += 1
+                    continue
+
+                # 関数の引数としての読み込み
+                arg_pattern = rf'\w+\s*\(\s*[^)]*{var}[^)]*\)'
+                if re.search(arg_pattern, stmt_str):
+                    read_counts[var] += 1
+                    continue
 
-                # pyjoernのメタデータステートメントを除外
-                if any(keyword in stmt_str for keyword in ['<UnsupportedStmt:', 'FUNCTION_', 'TYPE_REF', '__builtins__']):
+                # 条件文での読み込み
+                if var in stmt_str and '==' in stmt_str:
+                    read_counts[var] += 1
                     continue
 
-                for var in top_level_vars:
-                    # 関数呼び出しでの引数としての読み込み
-                    func_call_pattern = rf'{var}\s*\('
-                    if re.search(func_call_pattern, stmt_str):
-                        read_counts[var] += 1
-                        continue
-
-                    # 関数の引数としての読み込み
-                    arg_pattern = rf'\w+\s*\(\s*[^)]*{var}[^)]*\)'
-                    if re.search(arg_pattern, stmt_str):
-                        read_counts[var] += 1
-                        continue
-
-                    # 条件文での読み込み
-                    if var in stmt_str and '==' in stmt_str:
-                        read_counts[var] += 1
-                        continue
-
-                    # その他の読み込み（代入の右辺など）
-                    # 代入の左辺でない場合
-                    assignment_pattern = rf'^[^=]*{var}\s*='
-                    if not re.search(assignment_pattern, stmt_str) and var in stmt_str:
-                        read_counts[var] += 1
+                # その他の読み込み（代入の右辺など）
+                # 代入の左辺でない場合
+                assignment_pattern = rf'^[^=]*{var}\s*='
+                if not re.search(assignment_pattern, stmt_str) and var in stmt_str:
+                    read_counts[var] += 1
 
     return read_counts
 
@@ -263,26 +269,25 @@ def count_top_level_writes(module_cfg, top_level_vars):
 
     write_counts = {var: 0 for var in top_level_vars}
 
-    for node in module_cfg.nodes():
-        if hasattr(node, 'statements') and node.statements:
-            for stmt in node.statements:
-                stmt_str = str(stmt)
+    for node, entries in statement_index(module_cfg).items():
+        for entry in entries:
+            stmt_str = entry.text
 
-                # pyjoernのメタデータステートメントを除外
-                if any(keyword in stmt_str for keyword in ['<UnsupportedStmt:', 'FUNCTION_', 'TYPE_REF', '__builtins__']):
-                    continue
+            # pyjoernのメタデータステートメントを除外
+            if entry.is_metadata:
+                continue
 
-                for var in top_level_vars:
-                    # 関数定義での書き込み: example = defexample(...)
-                    func_def_pattern = rf'{var}\s*=\s*def{var}'
-                    if re.search(func_def_pattern, stmt_str):
-                        write_counts[var] += 1
-                        continue
+            for var in top_level_vars:
+                # 関数定義での書き込み: example = defexample(...)
+                func_def_pattern = rf'{var}\s*=\s*def{var}'
+                if re.search(func_def_pattern, stmt_str):
+                    write_counts[var] += 1
+                    continue
 
-                    # 通常の代入での書き込み
-                    assignment_pattern = rf'{var}\s*=\s*[^=]'
-                    if re.search(assignment_pattern, stmt_str) and f'def{var}' not in stmt_str:
-                        write_counts[var] += 1
+                # 通常の代入での書き込み
+                assignment_pattern = rf'{var}\s*=\s*[^=]'
+                if re.search(assignment_pattern, stmt_str) and f'def{var}' not in stmt_str:
+                    write_counts[var] += 1
 
     return write_counts
 
@@ -303,44 +308,43 @@ def analyze_compound_assignments(func_obj, var_analysis):
     compound_assignments = {var: [] for var in user_defined_vars}
     all_compound_refs = []  # デバッグ用
 
-    for node in func_obj.ast.nodes:
-        if hasattr(node, 'statements') and node.statements:
-            for stmt in node.statements:
-                stmt_str = str(stmt)
-
-                # pyjoernの内部表現を除外
-                exclude_patterns = [
-                    r'<UnsupportedStmt:.*IDENTIFIER,',     # 低レベル識別子表現
-                    r'<UnsupportedStmt:.*LITERAL,',        # リテラル表現
-                    r'<UnsupportedStmt:.*BLOCK,',          # ブロック表現
-                    r'PARAM,',                             # パラメータ定義
-                    r'LOCAL,',                             # ローカル変数定義
-                ]
-
-                # 除外パターンに一致する場合はスキップ
-                should_exclude = False
-                for pattern in exclude_patterns:
-                    if re.search(pattern, stmt_str, re.IGNORECASE):
-                        should_exclude = True
-                        break
-
-                if should_exclude:
-                    continue
+    for node, entries in statement_index(func_obj.ast).items():
+        for entry in entries:
+            stmt_str = entry.text
+
+            # pyjoernの内部表現を除外
+            exclude_patterns = [
+                r'<UnsupportedStmt:.*IDENTIFIER,',     # 低レベル識別子表現
+                r'<UnsupportedStmt:.*LITERAL,',        # リテラル表現
+                r'<UnsupportedStmt:.*BLOCK,',          # ブロック表現
+                r'PARAM,',                             # パラメータ定義
+                r'LOCAL,',                             # ローカル変数定義
+            ]
+
+            # 除外パターンに一致する場合はスキップ
+            should_exclude = False
+            for pattern in exclude_patterns:
+                if re.search(pattern, stmt_str, re.IGNORECASE):
+                    should_exclude = True
+                    break
+
+            if should_exclude:
+                continue
 
-                # 各変数について複合代入演算子をチェック
-                for var in user_defined_vars:
-                    for op in compound_operators:
-                        # var += ... の形式を検出
-                        pattern = rf'\b{re.escape(var)}\s*{re.escape(op)}\s*'
-                        if re.search(pattern, stmt_str):
-                            compound_info = {
-                                'variable': var,
-                                'operator': op,
-                                'statement': stmt_str[:100],
-                                'node_addr': node.addr
-                            }
-                            compound_assignments[var].append(compound_info)
-                            all_compound_refs.append(compound_info)
+            # 各変数について複合代入演算子をチェック
+            for var in user_defined_vars:
+                for op in compound_operators:
+                    # var += ... の形式を検出
+                    pattern = rf'\b{re.escape(var)}\s*{re.escape(op)}\s*'
+                    if re.search(pattern, stmt_str):
+                        compound_info = {
+                            'variable': var,
+                            'operator': op,
+                            'statement': stmt_str[:100],
+                            'node_addr': node.addr
+                        }
+                        compound_assignments[var].append(compound_info)
+                        all_compound_refs.append(compound_info)
 
     # 結果表示
     total_compound_ops = sum(len(ops) for ops in compound_assignments.values())
@@ -359,16 +363,15 @@ def analyze_variable_reads(func_obj, var_analysis, compound_assignments=None):
     # 各変数の読み込み数をカウント
     read_counts = {var: 0 for var in user_defined_vars}
 
-    for node in func_obj.ast.nodes:
-        if hasattr(node, 'statements') and node.statements:
-            for stmt in node.statements:
-                stmt_str = str(stmt)
+    for node, entries in statement_index(func_obj.ast).items():
+        for entry in entries:
+            stmt_str = entry.text
 
-                # 変数の参照を検出
-                for var in user_defined_vars:
-                    var_refs = count_variable_references(stmt_str, var, node.addr)
-                    if var_refs > 0:  # カウントされた場合のみ記録
-                        read_counts[var] += var_refs
+            # 変数の参照を検出
+            for var in user_defined_vars:
+                var_refs = count_variable_references(stmt_str, var, node.addr)
+                if var_refs > 0:  # カウントされた場合のみ記録
+                    read_counts[var] += var_refs
 
     # 🔄 複合代入演算子による読み込み数を加算（引数で渡された結果を使用）
     if compound_assignments:
@@ -397,26 +400,25 @@ def analyze_variable_writes(func_obj, var_analysis, compound_assignments=None):
     iterator_variables = set()
     range_loop_candidates = set()
 
-    for node in func_obj.ast.nodes:
-        if hasattr(node, 'statements') and node.statements:
-            for stmt in node.statements:
-                stmt_str = str(stmt)
-                # for文のパターンを直接検出
-                import re
-
-                for var in user_defined_vars:
-                    # "for var in" パターンをチェック（UnsupportedStmtも含む）
-                    for_pattern = rf'for\s+{re.escape(var)}\s+in\s+'
-                    if re.search(for_pattern, stmt_str, re.IGNORECASE):
-                        if var not in loop_variables:
-                            loop_variables.add(var)
-                        break
-
-                    # CONTROL_STRUCTURE内のfor文も検出
-                    if 'CONTROL_STRUCTURE,FOR' in stmt_str and var in stmt_str:
-                        if var not in loop_variables:
-                            loop_variables.add(var)
-                        break
+    for node, entries in statement_index(func_obj.ast).items():
+        for entry in entries:
+            stmt_str = entry.text
+            # for文のパターンを直接検出
+            import re
+
+            for var in user_defined_vars:
+                # "for var in" パターンをチェック（UnsupportedStmtも含む）
+                for_pattern = rf'for\s+{re.escape(var)}\s+in\s+'
+                if re.search(for_pattern, stmt_str, re.IGNORECASE):
+                    if var not in loop_variables:
+                        loop_variables.add(var)
+                    break
+
+                # CONTROL_STRUCTURE内のfor文も検出
+                if 'CONTROL_STRUCTURE,FOR' in stmt_str and var in stmt_str:
+                    if var not in loop_variables:
+                        loop_variables.add(var)
+                    break
 
     # 各変数の書き込み数をカウント
     write_counts = {var: 0 for var in user_defined_vars}
@@ -424,34 +426,33 @@ def analyze_variable_writes(func_obj, var_analysis, compound_assignments=None):
     # 重複を防ぐため、既に検出したループ変数の書き込みを追跡
     detected_loop_writes = set()
 
-    for node in func_obj.ast.nodes:
-        if hasattr(node, 'statements') and node.statements:
-            for stmt in node.statements:
-                stmt_str = str(stmt)
+    for node, entries in statement_index(func_obj.ast).items():
+        for entry in entries:
+            stmt_str = entry.text
 
-                # 変数の書き込みを検出
-                for var in user_defined_vars:
-                    write_count = count_variable_writes(stmt_str, var, node.addr, detected_loop_writes)
+            # 変数の書き込みを検出
+            for var in user_defined_vars:
+                write_count = count_variable_writes(stmt_str, var, node.addr, detected_loop_writes)
 
-                    # ループ変数の場合は追加で書き込みとしてカウント
-                    if write_count == 0 and var in loop_variables:
-                        # 重複チェック：同じ変数の同じノードでの書き込みは1回だけカウント
-                        write_key = (var, node.addr)
+                # ループ変数の場合は追加で書き込みとしてカウント
+                if write_count == 0 and var in loop_variables:
+                    # 重複チェック：同じ変数の同じノードでの書き込みは1回だけカウント
+                    write_key = (var, node.addr)
 
-                        # LOCAL定義でループ変数と判定された場合は1回の書き込みとしてカウント
-                        if f'LOCAL,{var}:' in stmt_str and write_key not in detected_loop_writes:
-                            write_count = 1
-                            detected_loop_writes.add(write_key)
+                    # LOCAL定義でループ変数と判定された場合は1回の書き込みとしてカウント
+                    if f'LOCAL,{var}:' in stmt_str and write_key not in detected_loop_writes:
+                        write_count = 1
+                        detected_loop_writes.add(write_key)
 
-                        # for文パターンでも検出
-                        import re
-                        for_pattern = rf'for\s+{re.escape(var)}\s+in\s+'
-                        if re.search(for_pattern, stmt_str, re.IGNORECASE) and write_key not in detected_loop_writes:
-                            write_count = 1
-                            detected_loop_writes.add(write_key)
+                    # for文パターンでも検出
+                    import re
+                    for_pattern = rf'for\s+{re.escape(var)}\s+in\s+'
+                    if re.search(for_pattern, stmt_str, re.IGNORECASE) and write_key not in detected_loop_writes:
+                        write_count = 1
+                        detected_loop_writes.add(write_key)
 
-                    if write_count > 0:  # カウントされた場合のみ記録
-                        write_counts[var] += write_count
+                if write_count > 0:  # カウントされた場合のみ記録
+                    write_counts[var] += write_count
 
     # 🆕 関数の引数（パラメータ）への自動書き込み加算
     parameters = var_analysis['parameters']
@@ -602,65 +603,64 @@ def analyze_variables_from_statements(func_obj):
     # 🆕 引数検出の詳細デバッグ情報
     param_detection_details = []
 
-    for node in func_obj.ast.nodes:
-        if hasattr(node, 'statements') and node.statements:
-            for stmt in node.statements:
-                stmt_str = str(stmt)
-
-                # 🆕 改良された引数検出ロジック
-                if 'PARAM,' in stmt_str:
-                    # デバッグ情報を記録
-                    param_detection_details.append({
-                        'statement': stmt_str,
-                        'node_addr': getattr(node, 'addr', 'unknown')
-                    })
-
-                    try:
-                        # パターン1: <UnsupportedStmt: (PARAM,name)<SUB>1</SUB>>
-                        pattern1 = r'PARAM,([a-zA-Z_][a-zA-Z0-9_]*)\)'
-                        match1 = re.search(pattern1, stmt_str)
-                        if match1:
-                            param_name = match1.group(1)
-                            if param_name.isidentifier():
-                                parameters.add(param_name)
-                                continue
-
-                        # パターン2: PARAM,name:type>
-                        pattern2 = r'PARAM,([a-zA-Z_][a-zA-Z0-9_]*):.*?>'
-                        match2 = re.search(pattern2, stmt_str)
-                        if match2:
-                            param_name = match2.group(1)
-                            if param_name.isidentifier():
-                                parameters.add(param_name)
-                                continue
-
-                        # パターン3: 従来の分割方式（フォールバック）
-                        param_part = stmt_str.split('PARAM,')[1]
-                        param_name = param_part.split(')')[0] if ')' in param_part else param_part.split('<')[0]
-                        if param_name and param_name.isidentifier():
+    for node, entries in statement_index(func_obj.ast).items():
+        for entry in entries:
+            stmt_str = entry.text
+
+            # 🆕 改良された引数検出ロジック
+            if entry.kind == KIND_PARAM:
+                # デバッグ情報を記録
+                param_detection_details.append({
+                    'statement': stmt_str,
+                    'node_addr': getattr(node, 'addr', 'unknown')
+                })
+
+                try:
+                    # パターン1: <UnsupportedStmt: (PARAM,name)<SUB>1</SUB>>
+                    pattern1 = r'PARAM,([a-zA-Z_][a-zA-Z0-9_]*)\)'
+                    match1 = re.search(pattern1, stmt_str)
+                    if match1:
+                        param_name = match1.group(1)
+                        if param_name.isidentifier():
                             parameters.add(param_name)
-
-                    except Exception as e:
-                        pass
-
-                # ローカル変数の抽出: <UnsupportedStmt: LOCAL,i:ANY>
-                elif 'LOCAL,' in stmt_str:
-                    try:
-                        # LOCAL,の後ろから:までを抽出
-                        local_part = stmt_str.split('LOCAL,')[1]
-                        var_name = local_part.split(':')[0] if ':' in local_part else local_part.split('>')[0]
-
-                        if var_name and var_name.isidentifier():
-                            if var_name in builtin_names:
-                                builtin_funcs.add(var_name)
-                            else:
-                                local_vars.add(var_name)
-                    except:
-                        pass
-
-                # 制御構造の抽出
-                elif 'CONTROL_STRUCTURE' in stmt_str:
-                    control_structures.append(stmt_str)
+                            continue
+
+                    # パターン2: PARAM,name:type>
+                    pattern2 = r'PARAM,([a-zA-Z_][a-zA-Z0-9_]*):.*?>'
+                    match2 = re.search(pattern2, stmt_str)
+                    if match2:
+                        param_name = match2.group(1)
+                        if param_name.isidentifier():
+                            parameters.add(param_name)
+                            continue
+
+                    # パターン3: 従来の分割方式（フォールバック）
+                    param_part = stmt_str.split('PARAM,')[1]
+                    param_name = param_part.split(')')[0] if ')' in param_part else param_part.split('<')[0]
+                    if param_name and param_name.isidentifier():
+                        parameters.add(param_name)
+
+                except Exception as e:
+                    pass
+
+            # ローカル変数の抽出: <UnsupportedStmt: LOCAL,i:ANY>
+            elif entry.kind == KIND_LOCAL:
+                try:
+                    # LOCAL,の後ろから:までを抽出
+                    local_part = stmt_str.split('LOCAL,')[1]
+                    var_name = local_part.split(':')[0] if ':' in local_part else local_part.split('>')[0]
+
+                    if var_name and var_name.isidentifier():
+                        if var_name in builtin_names:
+                            builtin_funcs.add(var_name)
+                        else:
+                            local_vars.add(var_name)
+                except:
+                    pass
+
+            # 制御構造の抽出
+            elif entry.kind == KIND_CONTROL_STRUCTURE:
+                control_structures.append(stmt_str)
 
     # tmpで始まる一時変数を除外した本当のユーザー定義変数
     real_local_vars = {var for var in local_vars if not var.startswith('tmp')}
@@ -725,11 +725,16 @@ def main():
         return
 
 
-def extract_dataflow_features_as_list(file_path):
+def extract_dataflow_features_as_list(file_path, program=None, strict=False):
     """
     データフロー特徴量をリスト形式で返すメイン関数（5つの特徴量）
     他のモジュールからインポートしやすい形式
 
+    Args:
+        file_path (str): 解析対象ファイルパス
+        program (ParsedProgram): 解析済みセッション（Noneの場合はここでフロントエンドを実行）
+        strict (bool): Trueの場合、解析エラーをゼロで埋めずに送出する
+
     Returns:
         list: [var_count, total_reads, total_writes, max_reads, max_writes]
               - var_count: 変数の種類数（関数+トップレベル
@@ -740,7 +745,7 @@ def extract_dataflow_features_as_list(file_path):
     """
     try:
         # 解析を実行
-        all_results, top_level_results = analyze_dataflow_features(file_path)
+        all_results, top_level_results = analyze_dataflow_features(file_path, program=program, strict=strict)
 
         # 結果を集計
         total_reads = 0
@@ -805,13 +810,20 @@ def extract_dataflow_features_as_list(file_path):
 
     except Exception as e:
         print(f"データフロー特徴量抽出エラー: {e}")
+        if strict:
+            raise
         # エラー時はゼロで埋めたリストを返す
         return [0, 0, 0, 0, 0]
 
-def analyze_dataflow_features(file_path):
+def analyze_dataflow_features(file_path, program=None, strict=False):
     """
     データフロー特徴量を詳細に解析する内部関数
 
+    Args:
+        file_path (str): 解析対象ファイルパス
+        program (ParsedProgram): 解析済みセッション（Noneの場合はここでフロントエンドを実行）
+        strict (bool): Trueの場合、解析エラーを空の結果にせずに送出する
+
     Returns:
         tuple: (all_results, top_level_results)
     """
@@ -820,27 +832,30 @@ def analyze_dataflow_features(file_path):
 
     try:
         # トップレベルコード解析
-        top_level_analysis = analyze_top_level_code(file_path)
+        with stage('dataflow_top_level'):
+            top_level_analysis = analyze_top_level_code(file_path, program=program, strict=strict)
         if top_level_analysis:
             top_level_results[file_path] = top_level_analysis
 
         # 関数レベル解析
-        functions = parse_source(file_path)
+        if program is not None:
+            functions = program.functions
+        else:
+            from pyjoern import parse_source
+            functions = parse_source(file_path)
         file_results = {}
 
         for func_name, func_obj in functions.items():
             if hasattr(func_obj, 'ast') and func_obj.ast:
                 # 変数解析結果を取得
-                var_analysis = analyze_variables_from_statements(func_obj)
-
-                # 複合代入演算子解析を取得
-                compound_assignments = analyze_compound_assignments(func_obj, var_analysis)
-
-                # 読み込み数解析を取得（複合代入演算子結果を渡す）
-                read_counts = analyze_variable_reads(func_obj, var_analysis, compound_assignments)
+                with stage('dataflow_variables'):
+                    var_analysis = analyze_variables_from_statements(func_obj)
 
-                # 書き込み数解析を取得（複合代入演算子結果を渡す）
-                write_counts = analyze_variable_writes(func_obj, var_analysis, compound_assignments)
+                # 複合代入・読み込み数・書き込み数を取得（dataflow_engine.py: 各ステートメントを1回だけ字句解析）
+                # 結果は analyze_compound_assignments / analyze_variable_reads / analyze_variable_writes と同じ
+                with stage('dataflow_counting'):
+                    compound_assignments, read_counts, write_counts = analyze_function_dataflow(func_obj, var_analysis)
+                count('dataflow_functions')
 
                 # 結果を結合
                 var_analysis['read_counts'] = read_counts
@@ -858,9 +873,11 @@ def analyze_dataflow_features(file_path):
 
     except Exception as e:
         print(f"データフロー解析エラー: {e}")
+        if strict:
+            raise
         return {}, {}
 
-def get_dataflow_feature_vector(file_path, include_top_level=True):
+def get_dataflow_feature_vector(file_path, include_top_level=True, program=None, strict=False):
     """
     データフロー特徴量ベクトルを取得（クラスタリング用）
     新しい5つの特徴量に対応
@@ -868,12 +885,14 @@ def get_dataflow_feature_vector(file_path, include_top_level=True):
     Args:
         file_path (str): 解析対象ファイルパス
         include_top_level (bool): トップレベル変数を含めるかどうか
+        program (ParsedProgram): 解析済みセッション（Noneの場合はここでフロントエンドを実行）
+        strict (bool): Trueの場合、解析エラーをゼロで埋めずに送出する
 
     Returns:
         list: [total_reads, total_writes, max_reads, max_writes, var_count]
     """
     # 新しい5つの特徴量を取得
-    features = extract_dataflow_features_as_list(file_path)
+    features = extract_dataflow_features_as_list(file_path, program=program, strict=strict)
 
     # include_top_levelに関係なく、全体の5つの特徴量を返す
     # （関数レベルとトップレベルは既に統合されているため）
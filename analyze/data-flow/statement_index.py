@@ -0,0 +1,95 @@
+# pyjoernのグラフ1つ分のステートメント文字列インデックス
+# str(stmt) をステートメントごとに1回だけ計算し、種類（PARAM / LOCAL / CONTROL_STRUCTURE /
+# UnsupportedStmt など）も分類しておく
+# インデックスはグラフ（graph.graph）に保存されるため、同じグラフを使う
+# データフロー解析・可視化（create_node_labels）のすべてで共有される
+
+# ステートメントの種類（analyze_variables_from_statements の判定順）
+KIND_PARAM = 'PARAM'
+KIND_LOCAL = 'LOCAL'
+KIND_CONTROL_STRUCTURE = 'CONTROL_STRUCTURE'
+KIND_UNSUPPORTED = 'UNSUPPORTED'
+KIND_OTHER = 'OTHER'
+
+# トップレベル解析で除外するpyjoernのメタデータステートメント
+METADATA_MARKERS = ('<UnsupportedStmt:', 'FUNCTION_', 'TYPE_REF', '__builtins__')
+
+_GRAPH_KEY = '_statement_index'
+
+class IndexedStatement:
+    """文字列化・分類済みのステートメント"""
+    __slots__ = ('stmt', 'text', 'kind', 'is_metadata')
+
+    def __init__(self, stmt):
+        self.stmt = stmt
+        self.text = str(stmt)
+        text = self.text
+        if 'PARAM,' in text:
+            self.kind = KIND_PARAM
+        elif 'LOCAL,' in text:
+            self.kind = KIND_LOCAL
+        elif 'CONTROL_STRUCTURE' in text:
+            self.kind = KIND_CONTROL_STRUCTURE
+        elif '<UnsupportedStmt:' in text:
+            self.kind = KIND_UNSUPPORTED
+        else:
+            self.kind = KIND_OTHER
+        self.is_metadata = any(marker in text for marker in METADATA_MARKERS)
+
+class StatementIndex:
+    """
+    グラフのノード → 文字列化済みステートメントのリスト
+
+    使用例:
+        index = statement_index(func_obj.ast)
+        for node, entries in index.items():
+            for entry in entries:
+                print(node.addr, entry.kind, entry.text)
+    """
+    def __init__(self, graph):
+        self.graph = graph
+        self._by_node = {}
+        self.by_addr = {}
+        for node in graph.nodes():
+            statements = getattr(node, 'statements', None)
+            if not statements:
+                continue
+            entries = [IndexedStatement(stmt) for stmt in statements]
+            self._by_node[node] = entries
+            addr = getattr(node, 'addr', None)
+            if addr is not None:
+                self.by_addr.setdefault(addr, []).extend(entries)
+
+    def items(self):
+        """(ノード, ステートメントのリスト) をグラフのノード順に返す"""
+        return self._by_node.items()
+
+    def statements(self, node):
+        """ノードのステートメントのリスト（なければ空リスト）"""
+        return self._by_node.get(node, [])
+
+    def texts(self, node):
+        """ノードのステートメント文字列のリスト（node.statements と同じ順）"""
+        return [entry.text for entry in self._by_node.get(node, [])]
+
+def statement_index(graph):
+    """
+    グラフのステートメントインデックスを返す（初回のみ作成し、graph.graph に保存）
+
+    graph.copy() やサブグラフは graph.graph を共有・複製するため、
+    インデックスを作ったグラフと同じオブジェクトの場合だけ再利用する
+
+    Args:
+        graph (nx.DiGraph): pyjoernのCFG / AST
+
+    Returns:
+        StatementIndex: インデックス
+    """
+    attributes = getattr(graph, 'graph', None)
+    if isinstance(attributes, dict):
+        index = attributes.get(_GRAPH_KEY)
+        if index is None or index.graph is not graph:
+            index = StatementIndex(graph)
+            attributes[_GRAPH_KEY] = index
+        return index
+    return StatementIndex(graph)
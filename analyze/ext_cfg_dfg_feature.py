@@ -5,12 +5,10 @@
 import sys
 import os
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.decomposition import PCA
-import matplotlib.colors as mcolors
 import json
-import pickle
 from datetime import datetime
+# matplotlib・sklearn（PCA）・pickleは使う関数の中で読み込む
+# （ワーカープロセスでの特徴量抽出時に可視化ライブラリを読み込まないため）
 
 # ext-cfg-feature.pyから必要な関数をインポート
 try:
@@ -36,23 +34,42 @@ except ImportError as e:
     print("ext_feature_data_flow.pyが data-flow/ ディレクトリにあることを確認してください。")
     sys.exit(1)
 
-def extract_dataflow_features_vector(source_file):
+# フロントエンド解析結果を両抽出器で共有するセッション
+from parsed_program import ParsedProgram
+from graph_snapshot import snapshot_path, save_snapshot, load_snapshot
+from feature_store import FeatureStore, extractor_version, file_sha256
+from feature_cache_db import (
+    is_sqlite_cache, save_cache_db, load_cache_db, open_cache_db, upsert_results, delete_files, begin_extraction
+)
+from file_scanner import scan_files, latest_mtime, diff_file_metadata, save_metadata_index, load_metadata_index
+from pipeline_profiler import (
+    PROFILE_DIR_ENV, stage, count, profile_file, enable_profiling, disable_profiling,
+    load_profile_records, save_report, print_summary
+)
+
+def extract_dataflow_features_vector(source_file, program=None, strict=False):
     """
     ソースコードからデータフロー特徴量ベクトルを抽出
 
     Args:
         source_file (str): 解析対象ファイルパス
+        program (ParsedProgram): 解析済みセッション（Noneの場合は単独で解析）
+        strict (bool): Trueの場合、抽出エラーをゼロベクトルにせずに送出する
 
     Returns:
         list: [total_reads, total_writes, max_reads, max_writes, var_count]
     """
     try:
         # ext_feature_data_flow.pyの関数を呼び出し
-        dataflow_vector = get_dataflow_feature_vector(source_file)
+        dataflow_vector = get_dataflow_feature_vector(source_file, program=program, strict=strict)
         return dataflow_vector
 
+    except MemoryError:
+        raise
     except Exception as e:
         print(f"❌ データフロー特徴量抽出エラー: {e}")
+        if strict:
+            raise
         return [0, 0, 0, 0, 0]
 
 def get_dataflow_feature_names():
@@ -65,38 +82,109 @@ def get_dataflow_feature_names():
         'var_count'           # 変数種類数
     ]
 
-def extract_integrated_features_vector(source_file):
+def open_program(source_file, snapshot_dir=None):
     """
-    CFG特徴量とデータフロー特徴量を統合したベクトルを抽出
+    解析セッションを開く（スナップショットがあればJoernを実行せずに復元）
 
     Args:
         source_file (str): 解析対象ファイルパス
+        snapshot_dir (str): スナップショットのディレクトリ（Noneの場合は環境変数 PYJOERN_SNAPSHOT_DIR、未設定なら使わない）
 
     Returns:
-        list: 統合された特徴量ベクトル [CFG(6次元) + データフロー(5次元)]
+        tuple: (ParsedProgram または SnapshotProgram, 保存先スナップショットパス（保存不要ならNone）)
     """
+    snapshot_dir = snapshot_dir or os.environ.get('PYJOERN_SNAPSHOT_DIR')
+    if not snapshot_dir:
+        return ParsedProgram(source_file), None
+
     try:
-        # CFG特徴量を取得
-        cfg_vector = extract_cfg_features_vector(source_file)
+        snapshot_file = snapshot_path(snapshot_dir, source_file)
+    except OSError:
+        return ParsedProgram(source_file), None
 
-        # データフロー特徴量を取得
-        dataflow_vector = extract_dataflow_features_vector(source_file)
+    if os.path.exists(snapshot_file):
+        try:
+            with stage('snapshot_load'):
+                program = load_snapshot(snapshot_file, source_file)
+            count('snapshot_hits')
+            return program, None
+        except Exception as e:
+            print(f"⚠️ スナップショット読み込みエラー {source_file}: {e}")
+    return ParsedProgram(source_file), snapshot_file
 
-        # 統合ベクトルを作成
-        integrated_vector = cfg_vector + dataflow_vector
+def extract_integrated_features_vector(source_file, program=None, snapshot_dir=None, on_partial=None):
+    """
+    CFG特徴量とデータフロー特徴量を統合したベクトルを抽出
+    Joernフロントエンドはファイルごとに1回だけ実行し、両抽出器で共有する
 
-        return integrated_vector
+    Args:
+        source_file (str): 解析対象ファイルパス
+        program (ParsedProgram): 解析済みセッション（Noneの場合はここで作成）
+        snapshot_dir (str): グラフスナップショットのディレクトリ（環境変数 PYJOERN_SNAPSHOT_DIR でも指定可）
+                            スナップショットがあればJoernを実行せずに特徴量を計算し、なければ抽出後に保存する
+        on_partial (callable): 特徴量の一部が計算できるたびに on_partial(名前, 値リスト) を呼ぶ
+                               （'dataflow' → 'cfg' の順、ワーカーが打ち切られても部分特徴量を残すため）
 
-    except Exception as e:
-        print(f"❌ 統合特徴量抽出エラー: {e}")
-        return [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+    Returns:
+        list: 統合された特徴量ベクトル [CFG(6次元) + データフロー(5次元)]
+
+    Raises:
+        Exception: 抽出に失敗した場合（ゼロベクトルを返すと正常な結果としてキャッシュ・モデルに残るため送出する。
+                   バッチ抽出・ワーカーでは 'error' / 'status' 付きの結果として記録される）
+    """
+    # 段階別計測（enable_profiling() または環境変数 PYJOERN_PROFILE_DIR で有効、無効なら何もしない）
+    with profile_file(source_file):
+        try:
+            snapshot_file = None
+            if program is None:
+                program, snapshot_file = open_program(source_file, snapshot_dir)
+
+            # 部分特徴量を報告する場合は、重いCFG（パス数・サイクル数）より先に軽いデータフロー特徴量を計算
+            dataflow_vector = None
+            if on_partial is not None:
+                with stage('dataflow_features'):
+                    dataflow_vector = extract_dataflow_features_vector(source_file, program=program, strict=True)
+                on_partial('dataflow', dataflow_vector)
+
+            # CFG特徴量を取得
+            with stage('cfg_features'):
+                cfg_vector = extract_cfg_features_vector(source_file, program=program, strict=True)
+            if on_partial is not None:
+                on_partial('cfg', cfg_vector)
+
+            # データフロー特徴量を取得
+            if dataflow_vector is None:
+                with stage('dataflow_features'):
+                    dataflow_vector = extract_dataflow_features_vector(source_file, program=program, strict=True)
+
+            # 統合ベクトルを作成
+            integrated_vector = cfg_vector + dataflow_vector
+
+            # 解析済みのグラフをスナップショットとして保存（次回以降はJoernなしで再計算できる）
+            if snapshot_file is not None:
+                try:
+                    with stage('snapshot_save'):
+                        save_snapshot(program, snapshot_file)
+                except Exception as e:
+                    print(f"⚠️ スナップショット保存エラー {source_file}: {e}")
 
-def extract_cfg_features_vector(source_file):
+            return integrated_vector
+
+        except MemoryError:
+            raise
+        except Exception as e:
+            print(f"❌ 統合特徴量抽出エラー: {e}")
+            count('errors')
+            raise
+
+def extract_cfg_features_vector(source_file, program=None, strict=False):
     """
     ソースコードからCFG特徴量ベクトルを抽出
 
     Args:
         source_file (str): 解析対象ファイルパス
+        program (ParsedProgram): 解析済みセッション（Noneの場合は単独で解析）
+        strict (bool): Trueの場合、抽出エラー・CFGなしをゼロベクトルにせずに送出する
 
     Returns:
         list: [connected_components, loop_statements, conditional_statements, cycles, paths, cyclomatic_complexity]
@@ -105,10 +193,12 @@ def extract_cfg_features_vector(source_file):
         # print(f"🔄 CFG特徴量抽出中: {source_file}")
 
         # ext-cfg-feature.pyのanalyze_accurate_cfg関数を呼び出し
-        all_features = analyze_accurate_cfg(source_file)
+        all_features = analyze_accurate_cfg(source_file, program=program, strict=strict)
 
         if not all_features:
             print("⚠️  CFG特徴量が抽出できませんでした")
+            if strict:
+                raise ValueError(f"CFG特徴量が抽出できませんでした: {source_file}")
             return [0, 0, 0, 0, 0, 0]
 
         # 関数レベルの特徴量のみ使用（モジュールレベルは除外）
@@ -150,8 +240,12 @@ def extract_cfg_features_vector(source_file):
         # print(f"✅ CFG特徴量抽出完了: {clustering_vector}")
         return clustering_vector
 
+    except MemoryError:
+        raise
     except Exception as e:
         print(f"❌ CFG特徴量抽出エラー: {e}")
+        if strict:
+            raise
         return [0, 0, 0, 0, 0, 0]
 
 def get_cfg_feature_names():
@@ -165,21 +259,128 @@ def get_cfg_feature_names():
         'cyclomatic_complexity'    # サイクロマティック複雑度
     ]
 
-def batch_extract_integrated_features(file_list):
+def get_cache_feature_names():
+    """キャッシュのメタ情報に保存する特徴量名"""
+    return {
+        'cfg_features': get_cfg_feature_names(),
+        'dataflow_features': get_dataflow_feature_names()
+    }
+
+def get_integrated_feature_names():
+    """統合特徴量の名前リスト（integrated_vectorの並び順）"""
+    return get_cfg_feature_names() + get_dataflow_feature_names()
+
+def open_feature_store(store_dir=None):
+    """
+    統合特徴量用の特徴量ストアを開く
+
+    Args:
+        store_dir (str): 保存先ディレクトリ（Noneの場合は環境変数 PYJOERN_FEATURE_STORE または既定値）
+
+    Returns:
+        FeatureStore: 特徴量ストア
+    """
+    return FeatureStore(store_dir, feature_names=get_integrated_feature_names())
+
+def batch_extract_integrated_features(file_list, pool=None, workers=None, timeout=None, chunk_size=None, store=None, on_result=None,
+                                      memory_limit_mb=None):
     """
     複数ファイルの統合特徴量を一括抽出
 
     Args:
         file_list (list): 解析対象ファイルリスト
+        pool (JoernWorkerPool): 常駐ワーカープール（Noneの場合はこのプロセスで抽出）
+        workers (int): 並列ワーカー数（2以上でプロセスプールを作成して並列抽出）
+        timeout (float): 1ファイルあたりのタイムアウト秒数（pool未指定で指定した場合は1ワーカーでも別プロセスで抽出）
+        chunk_size (int): 同時に投入しておくファイル数（プール使用時のみ有効）
+        store (FeatureStore): 特徴量ストア（指定時は同一内容のファイルを1回だけ抽出し、結果を再利用）
+        on_result (callable): 1ファイル完了するごとに on_result(result) を呼ぶ（キャッシュへの逐次コミット用）
+        memory_limit_mb (float): 1ファイルあたりのメモリ上限MB（pool未指定時、timeoutと同様に別プロセスで抽出）
+                                 タイムアウト・メモリ超過したファイルは status 'timeout' / 'oom' と部分特徴量で記録
 
     Returns:
-        list: 各ファイルの統合特徴量ベクトルリスト
+        list: 各ファイルの統合特徴量ベクトルリスト（file_listと同じ順序）
     """
+    print(f"📂 統合特徴量抽出開始: {len(file_list)}ファイル")
+
+    if store is None:
+        callback = None if on_result is None else (lambda index, result: on_result(result))
+        return _extract_integrated_features(file_list, pool, workers, timeout, chunk_size, callback, memory_limit_mb)
+
+    # ストアに登録済みのファイルは抽出しない（同一内容のファイルは代表1つだけ抽出）
+    results = [None] * len(file_list)
+    hits = 0
+    representatives = {}  # コンテンツハッシュ -> 抽出するファイル
+    indices_by_hash = {}
+    for i, source_file in enumerate(file_list):
+        try:
+            content_hash = file_sha256(source_file)
+        except OSError:
+            content_hash = None
+
+        if content_hash is not None:
+            if content_hash in indices_by_hash:
+                indices_by_hash[content_hash].append(i)
+                continue
+            vector = store.get(source_file, content_hash)
+            if vector is not None:
+                results[i] = {'source_file': source_file, 'integrated_vector': vector}
+                indices_by_hash[content_hash] = [i]
+                hits += 1
+                if on_result is not None:
+                    on_result(results[i])
+                continue
+            indices_by_hash[content_hash] = [i]
+            representatives[content_hash] = source_file
+        else:
+            representatives[('path', i)] = source_file
+            indices_by_hash[('path', i)] = [i]
+
+    to_extract = list(representatives.items())
+    print(f"💾 特徴量ストア: ヒット{hits} 抽出{len(to_extract)} 重複{len(file_list) - len(indices_by_hash)}")
+
+    def fan_out(index, result):
+        """抽出結果をストアに保存し、同一内容の全ファイルに割り当てる"""
+        content_hash = to_extract[index][0]
+        if 'error' not in result and isinstance(content_hash, str):
+            store.put(result['source_file'], result['integrated_vector'], content_hash)
+        for i in indices_by_hash[content_hash]:
+            results[i] = dict(result, source_file=file_list[i])
+            if on_result is not None:
+                on_result(results[i])
+
+    _extract_integrated_features([f for _, f in to_extract], pool, workers, timeout, chunk_size, fan_out, memory_limit_mb)
+
+    # ストアにヒットしたハッシュと同一内容のファイル
+    for content_hash, indices in indices_by_hash.items():
+        first = results[indices[0]]
+        for i in indices[1:]:
+            if results[i] is None:
+                results[i] = dict(first, source_file=file_list[i])
+                if on_result is not None:
+                    on_result(results[i])
+
+    return results
+
+def _extract_integrated_features(file_list, pool=None, workers=None, timeout=None, chunk_size=None, callback=None,
+                                 memory_limit_mb=None):
+    """batch_extract_integrated_features の抽出部分（ストアを使わない、callback(index, result)）"""
     results = []
 
-    print(f"📂 統合特徴量抽出開始: {len(file_list)}ファイル")
+    if pool is not None:
+        # 常駐ワーカーに投入（タイムアウト・クラッシュはエラーとして記録）
+        return pool.map(file_list, timeout=timeout, chunk_size=chunk_size, callback=callback)
 
-    for i, source_file in enumerate(file_list, 1):
+    # 並列時、またはタイムアウト・メモリ上限の指定時はワーカープロセスで抽出（1ファイルが止まってもバッチは止まらない）
+    if (workers is not None and workers > 1) or timeout is not None or memory_limit_mb is not None:
+        from joern_worker_pool import JoernWorkerPool
+
+        workers = max(1, workers or 1)
+        print(f"⚡ ワーカー抽出: {workers}ワーカー (タイムアウト: {timeout}秒, メモリ上限: {memory_limit_mb}MB)")
+        with JoernWorkerPool(n_workers=workers, job_timeout=timeout, memory_limit_mb=memory_limit_mb) as worker_pool:
+            return worker_pool.map(file_list, timeout=timeout, chunk_size=chunk_size, callback=callback)
+
+    for i, source_file in enumerate(file_list):
         try:
             result = extract_integrated_features_vector(source_file)
             results.append({
@@ -192,9 +393,46 @@ def batch_extract_integrated_features(file_list):
             results.append({
                 'source_file': source_file,
                 'integrated_vector': [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-                'error': str(e)
+                'error': str(e),
+                'status': 'error'
+            })
+
+        if callback is not None:
+            callback(i, results[-1])
+
+    return results
+
+def rebuild_features_from_snapshots(snapshot_dir):
+    """
+    スナップショットだけから統合特徴量を再計算（Joern・元のソースファイルは不要）
+    特徴量の定義を変更したときの再計算用
+
+    Args:
+        snapshot_dir (str): スナップショットのディレクトリ
+
+    Returns:
+        list: {'source_file', 'integrated_vector'(, 'error', 'status')} のリスト（source_file順）
+    """
+    import glob
+
+    snapshot_files = sorted(glob.glob(os.path.join(snapshot_dir, '*', '*.npz')))
+    print(f"📂 スナップショットから再計算: {len(snapshot_files)}ファイル")
+
+    results = []
+    for snapshot_file in snapshot_files:
+        try:
+            program = load_snapshot(snapshot_file)
+            vector = extract_integrated_features_vector(program.source_file, program=program)
+            results.append({'source_file': program.source_file, 'integrated_vector': vector})
+        except Exception as e:
+            results.append({
+                'source_file': snapshot_file,
+                'integrated_vector': [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+                'error': str(e),
+                'status': 'error'
             })
 
+    results.sort(key=lambda r: r['source_file'])
     return results
 
 def batch_extract_cfg_features(file_list):
@@ -241,35 +479,8 @@ def find_files_in_directory(directory, file_extensions=['.py', '.c', '.cpp', '.j
     Returns:
         list: 発見されたファイルパスのリスト
     """
-    found_files = []
-
-    def explore_directory(current_dir):
-        try:
-            # lsコマンド相当: ディレクトリの内容を取得
-            contents = os.listdir(current_dir)
-
-            # .から始まるファイル・ディレクトリを除外
-            filtered_contents = [item for item in contents if not item.startswith('.')]
-
-            for item in filtered_contents:
-                item_path = os.path.join(current_dir, item)
-
-                if os.path.isfile(item_path):
-                    # ファイルの場合: 拡張子チェック
-                    _, ext = os.path.splitext(item)
-                    if ext.lower() in file_extensions:
-                        found_files.append(item_path)
-
-                elif os.path.isdir(item_path):
-                    # ディレクトリの場合: 再帰的に探索
-                    explore_directory(item_path)
-
-        except (FileNotFoundError, PermissionError) as e:
-            print(f"❌ エラー: {current_dir} - {e}")
-
-    explore_directory(directory)
-
-    return found_files
+    # os.scandir で1回だけ走査（ファイル種別の判定に追加の stat を使わない）
+    return list(scan_files(directory, file_extensions))
 
 def analyze_file_groups(file_list, base_directory):
     """
@@ -371,19 +582,21 @@ def save_feature_vectors(batch_results, groups=None, base_directory=None, output
         groups (dict): グループ分析結果（セントロイド計算用）
         base_directory (str): ベースディレクトリパス（セントロイド計算用）
         output_file (str): 出力ファイル名（Noneの場合は自動生成）
-        format (str): 保存形式 ('json' または 'pickle')
+        format (str): 保存形式 ('json', 'pickle' または 'sqlite')
     """
     if output_file is None:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         if format == 'json':
             output_file = f"feature_vectors_{timestamp}.json"
+        elif format == 'sqlite':
+            output_file = f"feature_vectors_{timestamp}.sqlite"
         else:
             output_file = f"feature_vectors_{timestamp}.pkl"
 
     try:
-        # ファイルメタデータを収集（差分検出用）
+        # ファイルメタデータを収集（差分検出用、SQLiteでは行ごとに保存）
         file_metadata = {}
-        for result in batch_results:
+        for result in (batch_results if format != 'sqlite' else []):
             if 'source_file' in result:
                 file_path = result['source_file']
                 try:
@@ -393,6 +606,7 @@ def save_feature_vectors(batch_results, groups=None, base_directory=None, output
                         file_metadata[file_path] = {
                             'mtime': mtime,
                             'size': size,
+                            'sha256': file_sha256(file_path),
                             'timestamp': datetime.fromtimestamp(mtime).isoformat()
                         }
                 except Exception as e:
@@ -401,12 +615,10 @@ def save_feature_vectors(batch_results, groups=None, base_directory=None, output
         # メタデータを追加
         save_data = {
             'timestamp': datetime.now().isoformat(),
+            'extractor_version': extractor_version(),  # 抽出器が変わったらキャッシュを無効化
             'total_files': len(batch_results),
             'successful_extractions': len([r for r in batch_results if 'error' not in r]),
-            'feature_names': {
-                'cfg_features': get_cfg_feature_names(),
-                'dataflow_features': get_dataflow_feature_names()
-            },
+            'feature_names': get_cache_feature_names(),
             'file_metadata': file_metadata,  # 差分検出用メタデータ
             'data': batch_results
         }
@@ -430,14 +642,26 @@ def save_feature_vectors(batch_results, groups=None, base_directory=None, output
             print("ℹ️ グループまたはベースディレクトリが未指定のため、セントロイドをスキップ")
             save_data['pattern_centroids'] = None
 
-        if format == 'json':
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(save_data, f, indent=2, ensure_ascii=False)
-        elif format == 'pickle':
-            with open(output_file, 'wb') as f:
-                pickle.dump(save_data, f)
-        else:
-            raise ValueError("format は 'json' または 'pickle' を指定してください")
+        with stage('cache_save'):
+            if format == 'json':
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    json.dump(save_data, f, indent=2, ensure_ascii=False)
+            elif format == 'pickle':
+                import pickle
+                with open(output_file, 'wb') as f:
+                    pickle.dump(save_data, f)
+            elif format == 'sqlite':
+                # 変更のあった行だけ書き込み、結果にないファイルの行は削除
+                meta = {k: v for k, v in save_data.items()
+                        if k not in ('data', 'file_metadata', 'total_files', 'successful_extractions')}
+                written, deleted = save_cache_db(output_file, batch_results, meta)
+                print(f"   書き込み: {written}行, 削除: {deleted}行")
+            else:
+                raise ValueError("format は 'json', 'pickle' または 'sqlite' を指定してください")
+
+        if format != 'sqlite':
+            # 差分検出でキャッシュ全体を読まずに済むよう、ファイル情報だけのインデックスも保存
+            save_metadata_index(output_file, file_metadata, save_data['extractor_version'])
 
         print(f"💾 特徴量ベクトル保存: '{output_file}' ({format.upper()})")
         print(f"   総ファイル: {save_data['total_files']}, 成功: {save_data['successful_extractions']}")
@@ -461,14 +685,18 @@ def load_feature_vectors(input_file):
         dict: 読み込まれた特徴量データ
     """
     try:
-        if input_file.endswith('.json'):
-            with open(input_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        elif input_file.endswith('.pkl'):
-            with open(input_file, 'rb') as f:
-                data = pickle.load(f)
-        else:
-            raise ValueError("ファイル形式が不正です（.json または .pkl のみサポート）")
+        with stage('cache_load'):
+            if input_file.endswith('.json'):
+                with open(input_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            elif input_file.endswith('.pkl'):
+                import pickle
+                with open(input_file, 'rb') as f:
+                    data = pickle.load(f)
+            elif is_sqlite_cache(input_file):
+                data = load_cache_db(input_file)
+            else:
+                raise ValueError("ファイル形式が不正です（.json, .pkl, .sqlite のみサポート）")
 
         print(f"📂 特徴量読み込み: '{input_file}'")
         print(f"   ファイル数: {data['total_files']}, 成功: {data['successful_extractions']}")
@@ -644,14 +872,8 @@ def check_cache_validity(target_directory, cache_file):
         # キャッシュファイルの更新時刻を取得
         cache_mtime = os.path.getmtime(cache_file)
 
-        # 対象ディレクトリ内のファイルの最新更新時刻をチェック
-        latest_file_mtime = 0
-        for root, dirs, files in os.walk(target_directory):
-            for file in files:
-                if file.endswith(('.py', '.c', '.cpp', '.java')):
-                    file_path = os.path.join(root, file)
-                    file_mtime = os.path.getmtime(file_path)
-                    latest_file_mtime = max(latest_file_mtime, file_mtime)
+        # 対象ディレクトリ内のファイルの最新更新時刻をチェック（1回の走査で stat も取得）
+        latest_file_mtime = latest_mtime(scan_files(target_directory, skip_hidden=False))
 
         # キャッシュが対象ファイルより新しければ有効
         return cache_mtime > latest_file_mtime
@@ -660,13 +882,65 @@ def check_cache_validity(target_directory, cache_file):
         print(f"⚠️ キャッシュ有効性チェックエラー: {e}")
         return False
 
-def detect_file_changes(target_directory, cache_file):
+def load_cached_file_metadata(cache_file):
+    """
+    差分検出用のファイル情報だけをキャッシュから読み込む
+
+    SQLiteはベクトルを読まずにファイル情報の列だけ、JSON / pickle はメタデータインデックス
+    （file_scanner.save_metadata_index）があればそれだけを読む。インデックスがない古いキャッシュは全体を読む
+
+    Args:
+        cache_file (str): キャッシュファイル
+
+    Returns:
+        dict: {ファイルパス: {'mtime', 'size', 'sha256'(任意)}}
+    """
+    cached_file_info = {}
+    if not os.path.exists(cache_file):
+        return cached_file_info
+
+    try:
+        if is_sqlite_cache(cache_file):
+            # SQLiteはファイル情報だけ読む（ベクトルは読まない）
+            cached_data = load_cache_db(cache_file, include_data=False)
+        else:
+            cached_data = load_metadata_index(cache_file)
+            if cached_data is None:
+                cached_data = load_feature_vectors(cache_file)
+        if cached_data and cached_data.get('extractor_version') != extractor_version():
+            # 抽出器が変わった（またはバージョン記録のない古いキャッシュ）: 全ファイル再抽出
+            print(f"⚠️ 抽出器バージョン不一致: {cached_data.get('extractor_version')} -> {extractor_version()}")
+            cached_data = {'file_metadata': {}}
+        if cached_data and 'file_metadata' in cached_data:
+            cached_file_info = cached_data['file_metadata']
+        elif cached_data and 'data' in cached_data:
+            # 既存のキャッシュから情報を再構築
+            for item in cached_data['data']:
+                if 'source_file' in item:
+                    file_path = item['source_file']
+                    if os.path.exists(file_path):
+                        try:
+                            mtime = os.path.getmtime(file_path)
+                            size = os.path.getsize(file_path)
+                            cached_file_info[file_path] = {
+                                'mtime': mtime,
+                                'size': size
+                            }
+                        except:
+                            pass
+    except Exception as e:
+        print(f"⚠️ キャッシュ読み込みエラー: {e}")
+
+    return cached_file_info
+
+def detect_file_changes(target_directory, cache_file, scan=None):
     """
     対象ディレクトリとキャッシュファイル間の差分を検出
 
     Args:
         target_directory (str): 対象ディレクトリ
         cache_file (str): キャッシュファイル
+        scan (dict): scan_files の結果（Noneの場合はここで走査）
 
     Returns:
         dict: {
@@ -678,85 +952,24 @@ def detect_file_changes(target_directory, cache_file):
     """
     print("🔍 ファイル差分検出中...")
 
-    # 現在のディレクトリ内のファイルを取得
-    current_files = find_files_in_directory(target_directory)
-    current_file_info = {}
+    # 現在のディレクトリ内のファイルと mtime / size を1回の走査で取得
+    if scan is None:
+        scan = scan_files(target_directory)
 
-    for file_path in current_files:
-        try:
-            mtime = os.path.getmtime(file_path)
-            size = os.path.getsize(file_path)
-            current_file_info[file_path] = {
-                'mtime': mtime,
-                'size': size
-            }
-        except Exception as e:
-            print(f"⚠️ ファイル情報取得エラー {file_path}: {e}")
-            continue
-
-    # キャッシュファイルから既存情報を読み込み
-    cached_file_info = {}
-    if os.path.exists(cache_file):
-        try:
-            cached_data = load_feature_vectors(cache_file)
-            if cached_data and 'file_metadata' in cached_data:
-                cached_file_info = cached_data['file_metadata']
-            elif cached_data and 'data' in cached_data:
-                # 既存のキャッシュから情報を再構築
-                for item in cached_data['data']:
-                    if 'source_file' in item:
-                        file_path = item['source_file']
-                        if os.path.exists(file_path):
-                            try:
-                                mtime = os.path.getmtime(file_path)
-                                size = os.path.getsize(file_path)
-                                cached_file_info[file_path] = {
-                                    'mtime': mtime,
-                                    'size': size
-                                }
-                            except:
-                                pass
-        except Exception as e:
-            print(f"⚠️ キャッシュ読み込みエラー: {e}")
+    # キャッシュファイルから既存情報を読み込み（ベクトルは読まない）
+    cached_file_info = load_cached_file_metadata(cache_file)
 
     # 差分を計算
-    current_files_set = set(current_files)
-    cached_files_set = set(cached_file_info.keys())
-
-    # 新規ファイル
-    new_files = list(current_files_set - cached_files_set)
-
-    # 削除されたファイル
-    deleted_files = list(cached_files_set - current_files_set)
-
-    # 変更されたファイルと変更なしファイル
-    modified_files = []
-    unchanged_files = []
-
-    for file_path in current_files_set & cached_files_set:
-        current_info = current_file_info.get(file_path, {})
-        cached_info = cached_file_info.get(file_path, {})
-
-        # ファイルサイズまたは更新時刻が異なる場合は変更あり
-        if (current_info.get('mtime', 0) != cached_info.get('mtime', 0) or
-            current_info.get('size', 0) != cached_info.get('size', 0)):
-            modified_files.append(file_path)
-        else:
-            unchanged_files.append(file_path)
-
-    changes = {
-        'new_files': new_files,
-        'modified_files': modified_files,
-        'deleted_files': deleted_files,
-        'unchanged_files': unchanged_files
-    }
+    changes = diff_file_metadata(scan, cached_file_info)
 
     # 差分情報を表示
-    print(f"📊 ファイル差分: 新規{len(new_files)} 変更{len(modified_files)} 削除{len(deleted_files)} 変更なし{len(unchanged_files)}")
+    print(f"📊 ファイル差分: 新規{len(changes['new_files'])} 変更{len(changes['modified_files'])} "
+          f"削除{len(changes['deleted_files'])} 変更なし{len(changes['unchanged_files'])}")
 
     return changes
 
-def update_cache_incrementally(target_directory, cache_file, file_changes):
+def update_cache_incrementally(target_directory, cache_file, file_changes, pool=None, workers=None, store=None,
+                               timeout=None, memory_limit_mb=None):
     """
     ファイル差分に基づいてキャッシュを増分更新
 
@@ -764,12 +977,36 @@ def update_cache_incrementally(target_directory, cache_file, file_changes):
         target_directory (str): 対象ディレクトリ
         cache_file (str): キャッシュファイル
         file_changes (dict): detect_file_changes()の戻り値
+        pool (JoernWorkerPool): 常駐ワーカープール（Noneの場合はこのプロセスで抽出）
+        workers (int): 並列ワーカー数（pool未指定時に2以上で並列抽出）
+        store (FeatureStore): 特徴量ストア（Noneの場合は使用しない）
+        timeout (float): 1ファイルあたりのタイムアウト秒数（pool未指定時）
+        memory_limit_mb (float): 1ファイルあたりのメモリ上限MB（pool未指定時）
 
     Returns:
         list: 更新後の特徴量データ
     """
     print("🔄 キャッシュ増分更新中...")
 
+    files_to_process = file_changes['new_files'] + file_changes['modified_files']
+
+    if is_sqlite_cache(cache_file):
+        # SQLite: 削除ファイルの行を消し、抽出結果は1件ずつコミット（途中で落ちても完了分は残る）
+        conn = open_cache_db(cache_file)
+        try:
+            delete_files(conn, file_changes['deleted_files'])
+            new_data = []
+            if files_to_process:
+                new_data = batch_extract_integrated_features(
+                    files_to_process, pool=pool, workers=workers, timeout=timeout, store=store,
+                    on_result=lambda result: upsert_results(conn, [result]), memory_limit_mb=memory_limit_mb)
+            updated_data = load_cache_db(cache_file)['data']
+        finally:
+            conn.close()
+
+        print(f"📦 保持: {len(updated_data) - len(new_data)}, 新規処理: {len(new_data)}, 総計: {len(updated_data)}")
+        return updated_data
+
     # 既存キャッシュを読み込み
     existing_data = []
     existing_metadata = {}
@@ -785,16 +1022,17 @@ def update_cache_incrementally(target_directory, cache_file, file_changes):
 
     # 変更なしファイルのデータを保持
     preserved_data = []
+    unchanged_files = set(file_changes['unchanged_files'])
     for item in existing_data:
-        if 'source_file' in item and item['source_file'] in file_changes['unchanged_files']:
+        if 'source_file' in item and item['source_file'] in unchanged_files:
             preserved_data.append(item)
 
     # 新規・変更ファイルを処理
-    files_to_process = file_changes['new_files'] + file_changes['modified_files']
     new_data = []
 
     if files_to_process:
-        new_data = batch_extract_integrated_features(files_to_process)
+        new_data = batch_extract_integrated_features(files_to_process, pool=pool, workers=workers, timeout=timeout,
+                                                     store=store, memory_limit_mb=memory_limit_mb)
 
     # データを統合
     updated_data = preserved_data + new_data
@@ -812,6 +1050,9 @@ def visualize_feature_distribution(batch_results, groups, base_directory):
         groups (dict): グループ分析結果
         base_directory (str): ベースディレクトリパス
     """
+    import matplotlib.pyplot as plt
+    from sklearn.decomposition import PCA
+
     # 成功した結果のみを使用
     successful_results = [r for r in batch_results if 'error' not in r]
 
@@ -886,32 +1127,61 @@ def visualize_feature_distribution(batch_results, groups, base_directory):
         group_count = len([f for f in group_files if f['file_path'] in file_paths])
         print(f"  {group_name}: {group_count}ファイル")
 
-def main():
-    """メイン関数 - テスト実行"""
+def main(jobs=1, timeout=None, store_dir=None, cache_format='json', snapshot_dir=None, profile=False, memory_limit_mb=None):
+    """
+    メイン関数 - テスト実行
+
+    Args:
+        jobs (int): 並列ワーカー数（--jobs）
+        timeout (float): 1ファイルあたりのタイムアウト秒数（--timeout、指定時はワーカープロセスで抽出）
+        store_dir (str): 特徴量ストアのディレクトリ（--store-dir）
+        cache_format (str): キャッシュ形式 'json' または 'sqlite'（--cache-format）
+        snapshot_dir (str): グラフスナップショットのディレクトリ（--snapshot-dir）
+        profile (bool): 段階別の計測レポートをキャッシュと同じ場所に保存する（--profile）
+        memory_limit_mb (float): 1ファイルあたりのメモリ上限MB（--memory-limit、指定時はワーカープロセスで抽出）
+    """
     print("🎯 統合特徴量抽出システム（CFG + データフロー）")
 
+    # ワーカープロセスにも引き継ぐため環境変数で渡す
+    if snapshot_dir:
+        os.environ['PYJOERN_SNAPSHOT_DIR'] = snapshot_dir
+
     target_directory = "submissions_typical90_d_15_AC_TLE"
-    cache_file = f"feature_cache_{os.path.basename(target_directory)}.json"
+    cache_extension = 'sqlite' if cache_format == 'sqlite' else 'json'
+    cache_file = f"feature_cache_{os.path.basename(target_directory)}.{cache_extension}"
 
     if not os.path.exists(target_directory):
         print(f"❌ ディレクトリが存在しません: {target_directory}")
         return
 
-    target_files = find_files_in_directory(target_directory)
+    # ファイル一覧と mtime / size を1回の走査で取得（差分検出でも再利用）
+    scan = scan_files(target_directory)
+    target_files = list(scan)
     if not target_files:
         print("⚠️  処理対象ファイルが見つかりません")
         return
 
     print(f"📁 発見ファイル: {len(target_files)}個")
 
+    # 段階別計測（ワーカープロセスの分も集めるため、記録先ディレクトリを環境変数で渡す）
+    profile_dir = None
+    if profile:
+        import tempfile
+        profile_dir = tempfile.mkdtemp(prefix='pyjoern_profile_')
+        os.environ[PROFILE_DIR_ENV] = profile_dir
+        enable_profiling()
+
     # ファイルをグループ分析
     groups = analyze_file_groups(target_files, target_directory)
     print(f"📂 グループ: {', '.join([f'{k}({len(v)})' for k, v in groups.items()])}")
 
+    # 特徴量ストア（内容ハッシュ単位でディレクトリ・マシン間共有）
+    store = open_feature_store(store_dir)
+
     # キャッシュ処理
     batch_results = None
     if os.path.exists(cache_file):
-        file_changes = detect_file_changes(target_directory, cache_file)
+        file_changes = detect_file_changes(target_directory, cache_file, scan=scan)
 
         if all(len(file_changes[key]) == 0 for key in ['new_files', 'modified_files', 'deleted_files']):
             print(f"📦 キャッシュ使用: {cache_file}")
@@ -920,19 +1190,51 @@ def main():
                 batch_results = cached_data['data']
         elif len(file_changes['unchanged_files']) > 0:
             print("🔄 増分更新実行")
-            batch_results = update_cache_incrementally(target_directory, cache_file, file_changes)
-            save_feature_vectors(batch_results, groups, target_directory, cache_file, format='json')
+            batch_results = update_cache_incrementally(target_directory, cache_file, file_changes, workers=jobs, store=store,
+                                                       timeout=timeout, memory_limit_mb=memory_limit_mb)
+            save_feature_vectors(batch_results, groups, target_directory, cache_file, format=cache_format)
         else:
             print("🆕 完全再実行")
 
     if batch_results is None:
         print("🔄 新規特徴量抽出")
-        batch_results = batch_extract_integrated_features(target_files)
-        save_feature_vectors(batch_results, groups, target_directory, cache_file, format='json')
+        if cache_format == 'sqlite':
+            # SQLite: 抽出結果を1件ずつコミット（途中で落ちても完了分は残る）
+            # メタ情報は最初に書き込む（最後だけだと、途中で落ちた場合に次回バージョン不一致で全件再抽出になる）
+            conn = open_cache_db(cache_file)
+            try:
+                begin_extraction(conn, {'extractor_version': extractor_version(),
+                                        'feature_names': get_cache_feature_names()})
+                batch_results = batch_extract_integrated_features(
+                    target_files, workers=jobs, timeout=timeout, store=store,
+                    on_result=lambda result: upsert_results(conn, [result]), memory_limit_mb=memory_limit_mb)
+            finally:
+                conn.close()
+        else:
+            batch_results = batch_extract_integrated_features(target_files, workers=jobs, timeout=timeout, store=store,
+                                                              memory_limit_mb=memory_limit_mb)
+        save_feature_vectors(batch_results, groups, target_directory, cache_file, format=cache_format)
 
     # 結果表示
     successful = len([r for r in batch_results if 'error' not in r])
     print(f"📊 結果: {successful}/{len(batch_results)} 成功")
+    aborted = [r for r in batch_results if r.get('status') in ('timeout', 'oom')]
+    if aborted:
+        print(f"⚠️ 打ち切り: タイムアウト{sum(1 for r in aborted if r['status'] == 'timeout')} "
+              f"メモリ超過{sum(1 for r in aborted if r['status'] == 'oom')}（部分特徴量で記録）")
+
+    if profile_dir is not None:
+        import shutil
+        collector = disable_profiling()
+        del os.environ[PROFILE_DIR_ENV]
+        report_file = f"{os.path.splitext(cache_file)[0]}_profile.json"
+        try:
+            summary = save_report(load_profile_records(profile_dir), report_file,
+                                  run_stages=collector.run_profile.stages)
+            print_summary(summary)
+        except Exception as e:
+            print(f"❌ 計測レポート保存エラー: {e}")
+        shutil.rmtree(profile_dir, ignore_errors=True)
 
     # 可視化
     try:
@@ -941,7 +1243,20 @@ def main():
         print(f"❌ 可視化エラー: {e}")
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="統合特徴量抽出（CFG + データフロー）")
+    parser.add_argument('--jobs', '-j', type=int, default=1, help="並列ワーカー数（デフォルト: 1）")
+    parser.add_argument('--timeout', type=float, default=None, help="1ファイルあたりのタイムアウト秒数（指定時はワーカープロセスで抽出）")
+    parser.add_argument('--memory-limit', type=float, default=None, help="1ファイルあたりのメモリ上限MB（Joernを含む常駐メモリ、指定時はワーカープロセスで抽出）")
+    parser.add_argument('--store-dir', default=None, help="特徴量ストアのディレクトリ（既定: $PYJOERN_FEATURE_STORE または ~/.cache/pyjoern/feature_store）")
+    parser.add_argument('--cache-format', choices=['json', 'sqlite'], default='json', help="キャッシュ形式（sqliteは変更行のみ書き込み）")
+    parser.add_argument('--snapshot-dir', default=None, help="グラフスナップショットのディレクトリ（あればJoernを実行せずに特徴量を計算）")
+    parser.add_argument('--profile', action='store_true', help="段階別の計測レポート（feature_cache_*_profile.json）を保存")
+    args = parser.parse_args()
+
+    main(jobs=args.jobs, timeout=args.timeout, store_dir=args.store_dir, cache_format=args.cache_format,
+         snapshot_dir=args.snapshot_dir, profile=args.profile, memory_limit_mb=args.memory_limit)
 
 # 使用例（キャッシュ機能付き + セントロイド計算）:
 #
@@ -950,6 +1265,8 @@ if __name__ == "__main__":
 #     extract_dataflow_features_vector,
 #     extract_integrated_features_vector,
 #     batch_extract_integrated_features,
+#     rebuild_features_from_snapshots,
+#     open_feature_store,
 #     save_feature_vectors,
 #     load_feature_vectors,
 #     calculate_pattern_centroids,
@@ -971,10 +1288,33 @@ if __name__ == "__main__":
 # submission_files = [f"submission_{i}.py" for i in range(1, 6)]  # submission_1.py to submission_5.py
 # batch_results = batch_extract_integrated_features(submission_files)
 #
+# # 大量ファイルは常駐ワーカープールを再利用（タイムアウト・クラッシュ時は自動再起動）
+# from joern_worker_pool import JoernWorkerPool
+# with JoernWorkerPool(n_workers=1, job_timeout=120) as pool:
+#     batch_results = batch_extract_integrated_features(submission_files, pool=pool)
+#
+# # 特徴量ストア: 内容が同じファイルは抽出済みベクトルを再利用（抽出器が変わると自動で無効）
+# store = open_feature_store()  # 既定: $PYJOERN_FEATURE_STORE または ~/.cache/pyjoern/feature_store
+# batch_results = batch_extract_integrated_features(submission_files, store=store)
+#
+# # グラフスナップショット: 1回目はJoernの解析結果を保存、2回目以降はJoernを実行せずに特徴量を計算
+# batch_results = batch_extract_integrated_features(submission_files)  # 環境変数 PYJOERN_SNAPSHOT_DIR を設定して実行
+# integrated_vector = extract_integrated_features_vector("submission_1.py", snapshot_dir="graph_snapshots")
+# # 特徴量の定義を変えた後はスナップショットだけから再計算（ソースファイル・Joernは不要）
+# batch_results = rebuild_features_from_snapshots("graph_snapshots")
+#
+# # 段階別計測: ファイルごとの段階の所要時間・CFGのノード数/パス数などを記録して集計
+# from pipeline_profiler import enable_profiling, summarize, print_summary
+# collector = enable_profiling()
+# batch_results = batch_extract_integrated_features(submission_files)
+# print_summary(summarize(collector.records))  # 段階ごとの p50/p95/max と最も遅いファイル
+#
 # # 結果をファイルに保存（セントロイド付き）
 # save_feature_vectors(batch_results, groups, base_directory, "my_features.json", format='json')
 # # または
 # save_feature_vectors(batch_results, groups, base_directory, "my_features.pkl", format='pickle')
+# # または（SQLite: 変更行のみ書き込み、増分更新時は1件ずつコミット）
+# save_feature_vectors(batch_results, groups, base_directory, "my_features.sqlite", format='sqlite')
 #
 # # 保存した結果を読み込み
 # cached_data = load_feature_vectors("my_features.json")
@@ -0,0 +1,249 @@
+# SQLite版の特徴量キャッシュ
+# feature_cache_*.json と同じ内容を1ファイル1行で保存する
+# - 増分更新では変更のあった行だけを書き込む（JSON全体の書き直しが不要）
+# - WALモードのため、抽出中に結果を1件ずつコミットでき、途中で落ちても完了分は残る
+# - 複数プロセスから同時に書き込み可能（busy_timeoutで待機）
+
+import os
+import json
+import sqlite3
+from datetime import datetime
+
+SQLITE_EXTENSIONS = ('.sqlite', '.sqlite3', '.db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS features (
+    source_file TEXT PRIMARY KEY,
+    integrated_vector TEXT NOT NULL,
+    error TEXT,
+    extra TEXT,
+    mtime REAL,
+    size INTEGER,
+    sha256 TEXT,
+    updated_at TEXT
+);
+"""
+
+# features テーブルの列として保存するキー（それ以外は extra にJSONで保存）
+_ROW_KEYS = ('source_file', 'integrated_vector', 'error')
+
+def is_sqlite_cache(cache_file):
+    """キャッシュファイルがSQLite形式かどうか（拡張子で判定）"""
+    return str(cache_file).endswith(SQLITE_EXTENSIONS)
+
+def open_cache_db(cache_file):
+    """
+    SQLiteキャッシュを開く（なければ作成）
+
+    Args:
+        cache_file (str): キャッシュファイルパス
+
+    Returns:
+        sqlite3.Connection: 接続
+    """
+    conn = sqlite3.connect(cache_file, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _file_metadata(file_path, previous=None):
+    """ファイルのmtime/size/sha256（mtime/sizeが前回と同じならsha256は再計算しない）"""
+    from feature_store import file_sha256
+
+    try:
+        mtime = os.path.getmtime(file_path)
+        size = os.path.getsize(file_path)
+    except OSError:
+        return None, None, None
+
+    if previous is not None and previous[0] == mtime and previous[1] == size and previous[2]:
+        return mtime, size, previous[2]
+    try:
+        return mtime, size, file_sha256(file_path)
+    except OSError:
+        return mtime, size, None
+
+def _encode_row(result, metadata):
+    extra = {k: v for k, v in result.items() if k not in _ROW_KEYS}
+    return (
+        result['source_file'],
+        json.dumps(list(result.get('integrated_vector', []))),
+        result.get('error'),
+        json.dumps(extra, ensure_ascii=False) if extra else None,
+        metadata[0],
+        metadata[1],
+        metadata[2],
+    )
+
+def upsert_results(conn, results, commit=True):
+    """
+    抽出結果を書き込む（内容・ファイル情報が変わらない行は書き込まない）
+
+    Args:
+        conn (sqlite3.Connection): 接続
+        results (list): {'source_file', 'integrated_vector'(, 'error')} のリスト
+        commit (bool): 書き込み後にコミットするか
+
+    Returns:
+        int: 書き込んだ行数
+    """
+    written = 0
+    now = datetime.now().isoformat()
+    for result in results:
+        if 'source_file' not in result:
+            continue
+        previous = conn.execute(
+            "SELECT mtime, size, sha256, integrated_vector, error, extra FROM features WHERE source_file = ?",
+            (result['source_file'],)
+        ).fetchone()
+        metadata = _file_metadata(result['source_file'], previous)
+        row = _encode_row(result, metadata)
+        if previous is not None and (previous[3], previous[4], previous[5], previous[0], previous[1], previous[2]) == row[1:]:
+            continue
+        conn.execute(
+            "INSERT INTO features (source_file, integrated_vector, error, extra, mtime, size, sha256, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(source_file) DO UPDATE SET "
+            "integrated_vector = excluded.integrated_vector, error = excluded.error, extra = excluded.extra, "
+            "mtime = excluded.mtime, size = excluded.size, sha256 = excluded.sha256, updated_at = excluded.updated_at",
+            row + (now,)
+        )
+        written += 1
+    if commit:
+        conn.commit()
+    return written
+
+def delete_files(conn, file_paths, commit=True):
+    """指定ファイルの行を削除"""
+    conn.executemany("DELETE FROM features WHERE source_file = ?", [(path,) for path in file_paths])
+    if commit:
+        conn.commit()
+
+def set_meta(conn, values, commit=True):
+    """メタ情報（JSONで保存）を書き込む"""
+    conn.executemany(
+        "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        [(key, json.dumps(value, ensure_ascii=False)) for key, value in values.items()]
+    )
+    if commit:
+        conn.commit()
+
+def begin_extraction(conn, meta):
+    """
+    抽出結果を1件ずつコミットする前にメタ情報（extractor_version, feature_names）を書き込む
+
+    途中で落ちても次回はコミット済みの行を同じ抽出器の結果として差分検出に使える。
+    抽出器バージョンが違う既存の行は、新しい結果と混ざらないように削除する
+
+    Args:
+        conn (sqlite3.Connection): 接続
+        meta (dict): メタ情報（extractor_version は必須）
+    """
+    previous = get_meta(conn).get('extractor_version')
+    with conn:
+        if previous != meta['extractor_version']:
+            conn.execute("DELETE FROM features")
+        set_meta(conn, meta, commit=False)
+
+def get_meta(conn):
+    """メタ情報を辞書で返す"""
+    return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM meta")}
+
+def load_file_metadata(conn):
+    """差分検出用のファイル情報 {source_file: {'mtime', 'size', 'sha256'}}（ベクトルは読まない）"""
+    file_metadata = {}
+    for source_file, mtime, size, sha256 in conn.execute("SELECT source_file, mtime, size, sha256 FROM features"):
+        if mtime is None:
+            continue
+        file_metadata[source_file] = {'mtime': mtime, 'size': size}
+        if sha256:
+            file_metadata[source_file]['sha256'] = sha256
+    return file_metadata
+
+def _decode_row(row):
+    source_file, vector, error, extra = row
+    result = {'source_file': source_file, 'integrated_vector': json.loads(vector)}
+    if extra:
+        result.update(json.loads(extra))
+    if error is not None:
+        result['error'] = error
+    return result
+
+def load_results(conn):
+    """全行を抽出結果のリストとして返す（source_file順）"""
+    return [_decode_row(row) for row in conn.execute(
+        "SELECT source_file, integrated_vector, error, extra FROM features ORDER BY source_file")]
+
+def iter_results(conn, batch_size=1000, successful_only=False):
+    """
+    行を batch_size 件ずつ抽出結果のリストとして返すジェネレータ（全行をメモリに載せない、source_file順）
+
+    Args:
+        conn (sqlite3.Connection): 接続
+        batch_size (int): 1回に返す行数
+        successful_only (bool): エラーのない行だけ返す
+    """
+    query = "SELECT source_file, integrated_vector, error, extra FROM features"
+    if successful_only:
+        query += " WHERE error IS NULL"
+    cursor = conn.execute(query + " ORDER BY source_file")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield [_decode_row(row) for row in rows]
+
+def save_cache_db(cache_file, batch_results, meta):
+    """
+    バッチ結果をSQLiteキャッシュに保存（変更行のみ書き込み、結果にないファイルの行は削除）
+
+    Args:
+        cache_file (str): キャッシュファイルパス
+        batch_results (list): 抽出結果
+        meta (dict): メタ情報（timestamp, extractor_version, feature_names, pattern_centroids など）
+    """
+    conn = open_cache_db(cache_file)
+    try:
+        with conn:
+            keep = {r['source_file'] for r in batch_results if 'source_file' in r}
+            stale = [path for (path,) in conn.execute("SELECT source_file FROM features") if path not in keep]
+            delete_files(conn, stale, commit=False)
+            written = upsert_results(conn, batch_results, commit=False)
+            set_meta(conn, meta, commit=False)
+        return written, len(stale)
+    finally:
+        conn.close()
+
+def load_cache_db(cache_file, include_data=True):
+    """
+    SQLiteキャッシュをJSONキャッシュと同じ形式の辞書で読み込む
+
+    Args:
+        cache_file (str): キャッシュファイルパス
+        include_data (bool): Falseの場合は特徴量ベクトル（data）を読まない
+
+    Returns:
+        dict: {'timestamp', 'extractor_version', 'total_files', 'successful_extractions',
+               'feature_names', 'file_metadata', 'data', 'pattern_centroids'}
+    """
+    if not os.path.exists(cache_file):
+        raise FileNotFoundError(cache_file)
+
+    conn = open_cache_db(cache_file)
+    try:
+        data = get_meta(conn)
+        total, failed = conn.execute("SELECT COUNT(*), COUNT(error) FROM features").fetchone()
+        data['total_files'] = total
+        data['successful_extractions'] = total - failed
+        data['file_metadata'] = load_file_metadata(conn)
+        if include_data:
+            data['data'] = load_results(conn)
+        data.setdefault('pattern_centroids', None)
+        return data
+    finally:
+        conn.close()
@@ -0,0 +1,166 @@
+# コンテンツハッシュをキーにした特徴量ストア
+# キー = (ソースのSHA-256, 抽出器バージョン, 特徴量スキーマ)
+# - パスやmtimeに依存しないため、コーパスのコピー・移動・再チェックアウト後も再利用できる
+# - 同一内容の提出（AtCoderでよくある）は1回だけ抽出される
+# - 抽出器のコードが変わるとバージョンが変わり、古いベクトルは使われない
+
+import os
+import json
+import hashlib
+from datetime import datetime
+
+# 抽出器バージョンの計算対象（analyze/ からの相対パス）
+# 特徴量の計算に使うモジュールだけを列挙する（デバッグ用スクリプトやサンプルの編集でストアを無効にしない）
+EXTRACTOR_SOURCES = [
+    'ext_cfg_dfg_feature.py',
+    'parsed_program.py',
+    'graph_snapshot.py',
+    os.path.join('control-flow', 'ext_cfg_feature.py'),
+    os.path.join('control-flow', 'detect_function.py'),
+    os.path.join('control-flow', 'path_dfs.py'),
+    os.path.join('control-flow', 'cycle_count.py'),
+    os.path.join('control-flow', 'cfg_arrays.py'),
+    os.path.join('data-flow', 'ext_feature_data_flow.py'),
+    os.path.join('data-flow', 'dataflow_engine.py'),
+    os.path.join('data-flow', 'statement_index.py'),
+]
+
+# ストアの既定ディレクトリ（環境変数 PYJOERN_FEATURE_STORE で変更可能）
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pyjoern', 'feature_store')
+
+_extractor_version = None
+
+def file_sha256(file_path):
+    """ファイル内容のSHA-256（16進文字列）"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def extractor_version():
+    """
+    抽出器バージョン（抽出に関わるソースファイルとpyjoernのバージョンのハッシュ）
+
+    Returns:
+        str: 16進文字列（先頭16文字）
+    """
+    global _extractor_version
+    if _extractor_version is not None:
+        return _extractor_version
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    paths = [os.path.join(base_dir, source) for source in EXTRACTOR_SOURCES]
+    for path in sorted(p for p in paths if os.path.exists(p)):
+        digest.update(os.path.relpath(path, base_dir).replace(os.sep, '/').encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+
+    try:
+        from importlib.metadata import version
+        digest.update(f"pyjoern=={version('pyjoern')}".encode('utf-8'))
+    except Exception:
+        pass
+
+    _extractor_version = digest.hexdigest()[:16]
+    return _extractor_version
+
+def feature_schema(feature_names):
+    """
+    特徴量スキーマ（特徴量名の並びのハッシュ）
+
+    Args:
+        feature_names (list): 特徴量名リスト（ベクトルの並び順）
+
+    Returns:
+        str: 16進文字列（先頭16文字）
+    """
+    payload = json.dumps(list(feature_names), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+class FeatureStore:
+    """
+    (SHA-256, 抽出器バージョン, スキーマ) をキーにした特徴量ストア
+
+    1キー1ファイル（<store_dir>/<キー先頭2文字>/<キー>.json）で保存するため、
+    複数プロセス・複数マシン（共有ディレクトリ）から同時に使える
+
+    使用例:
+        store = FeatureStore(feature_names=names)
+        vector = store.get(source_file)
+        if vector is None:
+            vector = extract(source_file)
+            store.put(source_file, vector)
+    """
+    def __init__(self, store_dir=None, feature_names=None, version=None):
+        """
+        Args:
+            store_dir (str): 保存先ディレクトリ（Noneの場合は環境変数または既定値）
+            feature_names (list): 特徴量名リスト（スキーマ計算用）
+            version (str): 抽出器バージョン（Noneの場合はソースから計算）
+        """
+        self.store_dir = store_dir or os.environ.get('PYJOERN_FEATURE_STORE') or DEFAULT_STORE_DIR
+        self.version = version or extractor_version()
+        self.schema = feature_schema(feature_names or [])
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, content_hash):
+        """コンテンツハッシュからストアのキーを作る"""
+        raw = f"{content_hash}:{self.version}:{self.schema}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.store_dir, key[:2], f"{key}.json")
+
+    def get(self, source_file, content_hash=None):
+        """
+        保存済みの特徴量ベクトルを取得
+
+        Args:
+            source_file (str): ソースファイルパス
+            content_hash (str): 計算済みのSHA-256（Noneの場合はここで計算）
+
+        Returns:
+            list or None: 特徴量ベクトル（未登録の場合None）
+        """
+        try:
+            if content_hash is None:
+                content_hash = file_sha256(source_file)
+            with open(self._entry_path(self.key(content_hash)), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            self.hits += 1
+            return entry['integrated_vector']
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+
+    def put(self, source_file, vector, content_hash=None):
+        """
+        特徴量ベクトルを保存（一時ファイル経由で置き換えるため途中で落ちても壊れない）
+
+        Args:
+            source_file (str): ソースファイルパス
+            vector (list): 特徴量ベクトル
+            content_hash (str): 計算済みのSHA-256（Noneの場合はここで計算）
+        """
+        try:
+            if content_hash is None:
+                content_hash = file_sha256(source_file)
+            path = self._entry_path(self.key(content_hash))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            entry = {
+                'content_sha256': content_hash,
+                'extractor_version': self.version,
+                'feature_schema': self.schema,
+                'integrated_vector': list(vector),
+                'source_file': source_file,
+                'timestamp': datetime.now().isoformat()
+            }
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ 特徴量ストア書き込みエラー {source_file}: {e}")
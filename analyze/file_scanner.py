@@ -0,0 +1,198 @@
+# os.scandir を使った1回走査のファイルスキャナと差分検出
+# - ディレクトリを1回だけ走査し、拡張子で絞り込んだファイルの mtime / size を同時に取得する
+#   （ファイル種別は scandir のエントリ情報から判定するため、isfile / isdir の追加 stat が不要）
+# - JSON / pickle キャッシュには差分検出用の軽量なメタデータインデックス（*.index.json）を併せて保存し、
+#   差分検出時に特徴量ベクトルを含むキャッシュ全体を読み込まない
+# - 新規 / 変更 / 削除 / 変更なし を1回の呼び出しで返す
+
+import os
+import sys
+import json
+import time
+
+DEFAULT_EXTENSIONS = ('.py', '.c', '.cpp', '.java')
+
+INDEX_FORMAT_VERSION = 1
+INDEX_SUFFIX = '.index.json'
+
+def scan_files(directory, file_extensions=DEFAULT_EXTENSIONS, skip_hidden=True):
+    """
+    ディレクトリを再帰的に1回だけ走査してファイルと stat 情報を集める
+
+    Args:
+        directory (str): 検索対象ディレクトリ
+        file_extensions (iterable): 対象ファイル拡張子（小文字で比較）
+        skip_hidden (bool): .から始まるファイル・ディレクトリを除外する
+
+    Returns:
+        dict: {ファイルパス: (mtime, size)}（find_files_in_directory と同じパス・同じ順）
+    """
+    extensions = tuple(ext.lower() for ext in file_extensions)
+    found = {}
+
+    def explore_directory(current_dir):
+        try:
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if skip_hidden and name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_file():
+                            # ファイルの場合: 拡張子が対象のものだけ stat する
+                            if os.path.splitext(name)[1].lower() in extensions:
+                                stat = entry.stat()
+                                found[entry.path] = (stat.st_mtime, stat.st_size)
+                        elif entry.is_dir():
+                            # ディレクトリの場合: 見つけた位置で再帰的に探索（find_files_in_directory と同じ順）
+                            explore_directory(entry.path)
+                    except OSError as e:
+                        print(f"⚠️ ファイル情報取得エラー {entry.path}: {e}")
+        except (FileNotFoundError, PermissionError, NotADirectoryError) as e:
+            print(f"❌ エラー: {current_dir} - {e}")
+
+    explore_directory(directory)
+    return found
+
+def latest_mtime(scan):
+    """scan_files の結果の最新更新時刻（ファイルがなければ0）"""
+    return max((mtime for mtime, _ in scan.values()), default=0)
+
+def diff_file_metadata(scan, cached_file_info):
+    """
+    現在のファイルとキャッシュのメタデータの差分
+
+    mtime / size のどちらかが異なるファイルは変更ありとするが、
+    サイズが同じでキャッシュに sha256 がある場合は内容のハッシュで判定する（再チェックアウト等）
+
+    Args:
+        scan (dict): scan_files の結果
+        cached_file_info (dict): {ファイルパス: {'mtime', 'size', 'sha256'(任意)}}
+
+    Returns:
+        dict: {'new_files', 'modified_files', 'deleted_files', 'unchanged_files'}
+    """
+    from feature_store import file_sha256
+
+    new_files = []
+    modified_files = []
+    unchanged_files = []
+    for file_path, (mtime, size) in scan.items():
+        cached_info = cached_file_info.get(file_path)
+        if cached_info is None:
+            new_files.append(file_path)
+            continue
+        if mtime == cached_info.get('mtime', 0) and size == cached_info.get('size', 0):
+            unchanged_files.append(file_path)
+            continue
+        if 'sha256' in cached_info and size == cached_info.get('size'):
+            try:
+                if file_sha256(file_path) == cached_info['sha256']:
+                    unchanged_files.append(file_path)
+                    continue
+            except OSError:
+                pass
+        modified_files.append(file_path)
+
+    deleted_files = [file_path for file_path in cached_file_info if file_path not in scan]
+
+    return {
+        'new_files': new_files,
+        'modified_files': modified_files,
+        'deleted_files': deleted_files,
+        'unchanged_files': unchanged_files
+    }
+
+def metadata_index_path(cache_file):
+    """キャッシュファイルに対応するメタデータインデックスのパス"""
+    return f"{cache_file}{INDEX_SUFFIX}"
+
+def save_metadata_index(cache_file, file_metadata, extractor_version):
+    """
+    差分検出用のメタデータインデックスを保存（キャッシュ本体の保存後に呼ぶ）
+
+    列ごとのリストで保存するため、20万ファイルでも読み込みが速い
+    キャッシュ本体の mtime / size も記録し、本体だけが書き換えられた場合はインデックスを使わない
+
+    Args:
+        cache_file (str): キャッシュファイルパス
+        file_metadata (dict): {ファイルパス: {'mtime', 'size', 'sha256'}}
+        extractor_version (str): 抽出器バージョン
+
+    Returns:
+        str: インデックスファイルパス（保存に失敗した場合はNone）
+    """
+    index_file = metadata_index_path(cache_file)
+    try:
+        cache_stat = os.stat(cache_file)
+        paths = list(file_metadata)
+        index = {
+            'format': INDEX_FORMAT_VERSION,
+            'extractor_version': extractor_version,
+            'cache_mtime': cache_stat.st_mtime,
+            'cache_size': cache_stat.st_size,
+            'paths': paths,
+            'mtime': [file_metadata[path].get('mtime') for path in paths],
+            'size': [file_metadata[path].get('size') for path in paths],
+            'sha256': [file_metadata[path].get('sha256') for path in paths],
+        }
+        tmp_file = f"{index_file}.tmp{os.getpid()}"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_file, index_file)
+        return index_file
+    except Exception as e:
+        print(f"⚠️ メタデータインデックス保存エラー: {e}")
+        return None
+
+def load_metadata_index(cache_file):
+    """
+    メタデータインデックスを読み込む
+
+    Args:
+        cache_file (str): キャッシュファイルパス
+
+    Returns:
+        dict or None: {'extractor_version', 'file_metadata'}（インデックスがない・古い場合はNone）
+    """
+    index_file = metadata_index_path(cache_file)
+    try:
+        with open(index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        cache_stat = os.stat(cache_file)
+    except (OSError, ValueError):
+        return None
+
+    if (index.get('format') != INDEX_FORMAT_VERSION or
+            index.get('cache_mtime') != cache_stat.st_mtime or
+            index.get('cache_size') != cache_stat.st_size):
+        return None
+
+    file_metadata = {}
+    for path, mtime, size, sha256 in zip(index['paths'], index['mtime'], index['size'], index['sha256']):
+        info = {'mtime': mtime, 'size': size}
+        if sha256:
+            info['sha256'] = sha256
+        file_metadata[path] = info
+    return {'extractor_version': index.get('extractor_version'), 'file_metadata': file_metadata}
+
+def main():
+    # ディレクトリの走査時間を計測
+    directory = sys.argv[1] if len(sys.argv) > 1 else '.'
+    start = time.perf_counter()
+    scan = scan_files(directory)
+    elapsed = time.perf_counter() - start
+    print(f"📁 {directory}: {len(scan)}ファイル ({elapsed * 1000:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
+
+# 使用例:
+#
+# from file_scanner import scan_files, diff_file_metadata, load_metadata_index
+#
+# scan = scan_files("submissions_typical90_d_15_AC_TLE")   # {path: (mtime, size)}
+# cached = load_metadata_index("feature_cache_submissions_typical90_d_15_AC_TLE.json")
+# if cached is not None:
+#     changes = diff_file_metadata(scan, cached['file_metadata'])
+#     print(len(changes['new_files']), len(changes['modified_files']), len(changes['deleted_files']))
@@ -0,0 +1,436 @@
+# Joernフロントエンドの解析結果（CFG / AST / DDG）のスナップショット
+# ParsedProgram の内容を numpy の npz 1ファイルに保存し、Joernなしで復元する
+# - ノード配列（addr / idx / entry・exit・mergedフラグ）
+# - CSR形式の辺配列（edge_ptr / edge_dst）
+# - ステートメントは文字列表に重複なく格納（str(stmt)・クラス名・Callの関数名）
+# 特徴量の定義を変えたときは、スナップショットから特徴量だけを再計算できる（Joernの再実行が不要）
+#
+# 保存先: <snapshot_dir>/<キー先頭2文字>/<キー>.npz
+# キー = (ソースのSHA-256, pyjoernのバージョン, スナップショット形式のバージョン)
+
+import os
+import io
+import json
+import hashlib
+from datetime import datetime
+
+import numpy as np
+import networkx as nx
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+# フラグ（node_flags）
+FLAG_ENTRYPOINT = 1
+FLAG_EXITPOINT = 2
+FLAG_MERGED = 4
+
+# 関数オブジェクトから保存する属性（JSONで保存できるもののみ）
+_FUNCTION_ATTRS = ('return_type', 'fullname', 'filename', 'start_line', 'end_line', 'signature', 'macro_count')
+_FUNCTION_GRAPHS = ('cfg', 'ast', 'ddg')
+
+_pyjoern_version = None
+
+def pyjoern_version():
+    """インストールされているpyjoernのバージョン（pyjoern自体はインポートしない）"""
+    global _pyjoern_version
+    if _pyjoern_version is None:
+        try:
+            from importlib.metadata import version
+            _pyjoern_version = version('pyjoern')
+        except Exception:
+            _pyjoern_version = 'unknown'
+    return _pyjoern_version
+
+def snapshot_path(snapshot_dir, source_file, content_hash=None):
+    """
+    ソースファイルのスナップショットのパス
+
+    Args:
+        snapshot_dir (str): スナップショットのディレクトリ
+        source_file (str): ソースファイルパス
+        content_hash (str): 計算済みのSHA-256（Noneの場合はここで計算）
+
+    Returns:
+        str: スナップショットファイルのパス
+    """
+    if content_hash is None:
+        from feature_store import file_sha256
+        content_hash = file_sha256(source_file)
+    raw = f"{content_hash}:{pyjoern_version()}:{SNAPSHOT_FORMAT_VERSION}"
+    key = hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    return os.path.join(snapshot_dir, key[:2], f"{key}.npz")
+
+# --- 復元用のオブジェクト ---
+
+class SnapshotStatement:
+    """スナップショットから復元したステートメント（str() は元のステートメントと同じ）"""
+    __slots__ = ('raw_text', 'source_line_number', 'func')
+
+    def __init__(self, raw_text, source_line_number=None, func=None):
+        self.raw_text = raw_text
+        self.source_line_number = source_line_number
+        self.func = func
+
+    def __str__(self):
+        return self.raw_text
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}: {self.raw_text}>"
+
+_statement_classes = {}
+
+def _statement_class(type_name):
+    """元のクラス名（Call / Compare / UnsupportedStmt など）を持つステートメントクラス"""
+    cls = _statement_classes.get(type_name)
+    if cls is None:
+        cls = type(type_name, (SnapshotStatement,), {'__slots__': ()})
+        _statement_classes[type_name] = cls
+    return cls
+
+class SnapshotBlock:
+    """スナップショットから復元したCFG/ASTノード（pyjoernのBlockと同じ属性・文字列表現）"""
+    __slots__ = ('addr', 'idx', 'statements', '_is_entrypoint', '_is_exitpoint', '_is_merged_node')
+
+    def __init__(self, addr, idx=None, statements=None, is_entrypoint=False, is_exitpoint=False, is_merged_node=False):
+        self.addr = addr
+        self.idx = idx
+        self.statements = statements or []
+        self._is_entrypoint = is_entrypoint
+        self._is_exitpoint = is_exitpoint
+        self._is_merged_node = is_merged_node
+
+    @property
+    def is_entrypoint(self):
+        return self._is_entrypoint
+
+    @property
+    def is_exitpoint(self):
+        return self._is_exitpoint
+
+    @property
+    def is_merged_node(self):
+        return self._is_merged_node
+
+    @property
+    def _idx_str(self):
+        return "" if self.idx is None else f".{self.idx}"
+
+    def __repr__(self):
+        return f"<Block: {self.addr}{self._idx_str}, {len(self.statements)} statements>"
+
+    def __str__(self):
+        output = f"{self.addr}{self._idx_str}:\n"
+        for line in self.statements:
+            output += f"{line}\n"
+        return output
+
+class SnapshotFunction:
+    """スナップショットから復元した関数（name / cfg / ast / ddg / control_structures など）"""
+    def __init__(self, name, attrs=None, control_structures=None, cfg=None, ast=None, ddg=None):
+        self.name = name
+        for key, value in (attrs or {}).items():
+            setattr(self, key, value)
+        self.control_structures = control_structures or []
+        self.cfg = cfg
+        self.ast = ast
+        self.ddg = ddg
+
+    def __repr__(self):
+        return f"<Function {self.name} (snapshot)>"
+
+class SnapshotProgram:
+    """
+    スナップショットから復元した解析セッション（ParsedProgram と同じインターフェース）
+
+    analyze_accurate_cfg(source_file, program=...) や
+    analyze_dataflow_features(file_path, program=...) にそのまま渡せる
+    """
+    def __init__(self, source_file, source_code, functions=None, cfgs=None, functions_error=None, cfgs_error=None):
+        self.source_file = source_file
+        self.source_code = source_code
+        self._functions = functions
+        self._functions_error = functions_error
+        self._cfgs = cfgs
+        self._cfgs_error = cfgs_error
+
+    @property
+    def functions(self):
+        """parse_source() の結果（保存時に失敗していた場合は同じメッセージで例外）"""
+        if self._functions_error is not None:
+            raise RuntimeError(self._functions_error)
+        return self._functions
+
+    @property
+    def cfgs(self):
+        """fast_cfgs_from_source() の結果（保存時に失敗していた場合は同じメッセージで例外）"""
+        if self._cfgs_error is not None:
+            raise RuntimeError(self._cfgs_error)
+        return self._cfgs
+
+    def module_cfg(self):
+        """<module> CFGを返す（エスケープされた形式も考慮、見つからなければNone）"""
+        cfgs = self.cfgs or {}
+        for cfg_name in ['<module>', '&lt;module&gt;']:
+            if cfg_name in cfgs:
+                return cfgs[cfg_name]
+        return None
+
+# --- 保存 ---
+
+class _SnapshotWriter:
+    """グラフをノード・辺・ステートメントの配列に詰める"""
+    def __init__(self):
+        self.strings = {}
+        self.graph_node_ptr = [0]
+        self.node_addr = []
+        self.node_idx = []
+        self.node_flags = []
+        self.node_stmt_ptr = [0]
+        self.stmt_text = []
+        self.stmt_type = []
+        self.stmt_func = []
+        self.stmt_line = []
+        self.edge_ptr = [0]
+        self.edge_dst = []
+
+    def intern(self, text):
+        index = self.strings.get(text)
+        if index is None:
+            index = len(self.strings)
+            self.strings[text] = index
+        return index
+
+    def add_graph(self, graph):
+        """グラフを追加してグラフ番号を返す"""
+        base = len(self.node_addr)
+        nodes = list(graph.nodes())
+        position = {node: base + i for i, node in enumerate(nodes)}
+
+        for node in nodes:
+            addr = getattr(node, 'addr', None)
+            idx = getattr(node, 'idx', None)
+            self.node_addr.append(-1 if addr is None else int(addr))
+            self.node_idx.append(-1 if idx is None else int(idx))
+            flags = 0
+            if getattr(node, '_is_entrypoint', False) or getattr(node, 'is_entrypoint', False):
+                flags |= FLAG_ENTRYPOINT
+            if getattr(node, '_is_exitpoint', False) or getattr(node, 'is_exitpoint', False):
+                flags |= FLAG_EXITPOINT
+            if getattr(node, 'is_merged_node', False):
+                flags |= FLAG_MERGED
+            self.node_flags.append(flags)
+
+            for stmt in getattr(node, 'statements', None) or []:
+                self.stmt_text.append(self.intern(str(stmt)))
+                self.stmt_type.append(self.intern(type(stmt).__name__))
+                func = getattr(stmt, 'func', None) if type(stmt).__name__ == 'Call' else None
+                self.stmt_func.append(-1 if func is None else self.intern(str(func)))
+                line = getattr(stmt, 'source_line_number', None)
+                self.stmt_line.append(-1 if not isinstance(line, int) else line)
+            self.node_stmt_ptr.append(len(self.stmt_text))
+
+            for successor in graph.successors(node):
+                self.edge_dst.append(position[successor])
+            self.edge_ptr.append(len(self.edge_dst))
+
+        self.graph_node_ptr.append(len(self.node_addr))
+        return len(self.graph_node_ptr) - 2
+
+    def arrays(self):
+        encoded = [text.encode('utf-8') for text in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        if encoded:
+            offsets[1:] = np.cumsum([len(data) for data in encoded])
+        return {
+            'string_data': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            'string_offsets': offsets,
+            'graph_node_ptr': np.asarray(self.graph_node_ptr, dtype=np.int64),
+            'node_addr': np.asarray(self.node_addr, dtype=np.int64),
+            'node_idx': np.asarray(self.node_idx, dtype=np.int64),
+            'node_flags': np.asarray(self.node_flags, dtype=np.uint8),
+            'node_stmt_ptr': np.asarray(self.node_stmt_ptr, dtype=np.int64),
+            'stmt_text': np.asarray(self.stmt_text, dtype=np.int32),
+            'stmt_type': np.asarray(self.stmt_type, dtype=np.int32),
+            'stmt_func': np.asarray(self.stmt_func, dtype=np.int32),
+            'stmt_line': np.asarray(self.stmt_line, dtype=np.int64),
+            'edge_ptr': np.asarray(self.edge_ptr, dtype=np.int64),
+            'edge_dst': np.asarray(self.edge_dst, dtype=np.int32),
+        }
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+def save_snapshot(program, snapshot_file):
+    """
+    解析セッションのグラフをスナップショットとして保存
+
+    Args:
+        program (ParsedProgram): 解析セッション（未解析の場合はここでJoernフロントエンドを実行）
+        snapshot_file (str): 保存先（.npz）
+
+    Returns:
+        str: 保存したファイルパス
+    """
+    writer = _SnapshotWriter()
+    meta = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'pyjoern_version': pyjoern_version(),
+        'source_file': program.source_file,
+        'source_code': program.source_code,
+        'timestamp': datetime.now().isoformat(),
+        'functions': [],
+        'functions_error': None,
+        'cfgs': [],
+        'cfgs_error': None,
+    }
+
+    try:
+        functions = program.functions or {}
+        for func_name, func_obj in functions.items():
+            entry = {
+                'key': func_name,
+                'name': getattr(func_obj, 'name', func_name),
+                'attrs': {attr: _json_value(getattr(func_obj, attr)) for attr in _FUNCTION_ATTRS if hasattr(func_obj, attr)},
+                'control_structures': [str(cs) for cs in getattr(func_obj, 'control_structures', None) or []],
+            }
+            for attr in _FUNCTION_GRAPHS:
+                graph = getattr(func_obj, attr, None)
+                entry[attr] = writer.add_graph(graph) if isinstance(graph, nx.Graph) else None
+            meta['functions'].append(entry)
+    except Exception as e:
+        meta['functions_error'] = str(e)
+
+    try:
+        cfgs = program.cfgs or {}
+        for cfg_name, cfg in cfgs.items():
+            meta['cfgs'].append([cfg_name, writer.add_graph(cfg)])
+    except Exception as e:
+        meta['cfgs_error'] = str(e)
+
+    arrays = writer.arrays()
+    arrays['meta'] = np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+
+    # 一時ファイル経由で置き換え（途中で落ちても壊れたスナップショットを残さない）
+    os.makedirs(os.path.dirname(os.path.abspath(snapshot_file)), exist_ok=True)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    tmp_path = f"{snapshot_file}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, snapshot_file)
+    return snapshot_file
+
+# --- 読み込み ---
+
+def _build_graphs(arrays):
+    """配列から全グラフ（nx.DiGraph）を復元"""
+    data = arrays['string_data'].tobytes()
+    offsets = arrays['string_offsets'].tolist()
+    strings = [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+    node_addr = arrays['node_addr'].tolist()
+    node_idx = arrays['node_idx'].tolist()
+    node_flags = arrays['node_flags'].tolist()
+    node_stmt_ptr = arrays['node_stmt_ptr'].tolist()
+    stmt_text = arrays['stmt_text'].tolist()
+    stmt_type = arrays['stmt_type'].tolist()
+    stmt_func = arrays['stmt_func'].tolist()
+    stmt_line = arrays['stmt_line'].tolist()
+    edge_ptr = arrays['edge_ptr'].tolist()
+    edge_dst = arrays['edge_dst'].tolist()
+    graph_node_ptr = arrays['graph_node_ptr'].tolist()
+
+    nodes = []
+    for n in range(len(node_addr)):
+        statements = []
+        for s in range(node_stmt_ptr[n], node_stmt_ptr[n + 1]):
+            statements.append(_statement_class(strings[stmt_type[s]])(
+                strings[stmt_text[s]],
+                None if stmt_line[s] < 0 else stmt_line[s],
+                None if stmt_func[s] < 0 else strings[stmt_func[s]]
+            ))
+        flags = node_flags[n]
+        nodes.append(SnapshotBlock(
+            None if node_addr[n] < 0 else node_addr[n],
+            None if node_idx[n] < 0 else node_idx[n],
+            statements,
+            is_entrypoint=bool(flags & FLAG_ENTRYPOINT),
+            is_exitpoint=bool(flags & FLAG_EXITPOINT),
+            is_merged_node=bool(flags & FLAG_MERGED)
+        ))
+
+    graphs = []
+    for g in range(len(graph_node_ptr) - 1):
+        graph = nx.DiGraph()
+        start, end = graph_node_ptr[g], graph_node_ptr[g + 1]
+        graph.add_nodes_from(nodes[start:end])
+        for n in range(start, end):
+            graph.add_edges_from((nodes[n], nodes[d]) for d in edge_dst[edge_ptr[n]:edge_ptr[n + 1]])
+        graphs.append(graph)
+    return graphs
+
+def load_snapshot(snapshot_file, source_file=None):
+    """
+    スナップショットから解析セッションを復元（Joernは実行しない）
+
+    Args:
+        snapshot_file (str): スナップショットファイル（.npz）
+        source_file (str): 解析対象として扱うファイルパス（Noneの場合は保存時のパス）
+
+    Returns:
+        SnapshotProgram: 解析セッション
+    """
+    with np.load(snapshot_file, allow_pickle=False) as arrays:
+        meta = json.loads(arrays['meta'].tobytes().decode('utf-8'))
+        if meta.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"スナップショット形式のバージョンが異なります: {meta.get('format_version')}")
+        graphs = _build_graphs(arrays)
+
+    functions = None
+    if meta['functions_error'] is None:
+        functions = {}
+        for entry in meta['functions']:
+            graph_of = {attr: None if entry[attr] is None else graphs[entry[attr]] for attr in _FUNCTION_GRAPHS}
+            functions[entry['key']] = SnapshotFunction(
+                entry['name'], entry['attrs'], entry['control_structures'], **graph_of
+            )
+
+    cfgs = None
+    if meta['cfgs_error'] is None:
+        cfgs = {cfg_name: graphs[g] for cfg_name, g in meta['cfgs']}
+
+    return SnapshotProgram(
+        source_file or meta['source_file'],
+        meta['source_code'],
+        functions=functions,
+        cfgs=cfgs,
+        functions_error=meta['functions_error'],
+        cfgs_error=meta['cfgs_error']
+    )
+
+def main():
+    # スナップショットの内容を表示
+    import argparse
+
+    parser = argparse.ArgumentParser(description="グラフスナップショットの内容を表示")
+    parser.add_argument('snapshot_file', help="スナップショットファイル（.npz）")
+    args = parser.parse_args()
+
+    program = load_snapshot(args.snapshot_file)
+    print(f"📂 {program.source_file}")
+    try:
+        for func_name, func_obj in program.functions.items():
+            cfg = func_obj.cfg
+            print(f"  関数 {func_name}: CFG {cfg.number_of_nodes() if cfg is not None else 0}ノード")
+    except RuntimeError as e:
+        print(f"  ⚠️ parse_source 失敗: {e}")
+    try:
+        for cfg_name, cfg in program.cfgs.items():
+            print(f"  CFG {cfg_name}: {cfg.number_of_nodes()}ノード {cfg.number_of_edges()}辺")
+    except RuntimeError as e:
+        print(f"  ⚠️ fast_cfgs_from_source 失敗: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,490 @@
+# 常駐ワーカープール
+# pyjoern / networkx などの重い依存を読み込んだワーカープロセスを起動しておき、
+# パイプ経由でファイルパスを渡して統合特徴量を抽出させる
+# - ヘルスチェック（ping/pong）
+# - ジョブ単位のタイムアウト（超過したワーカーは強制終了して再起動）
+# - ジョブ単位のメモリ上限（ワーカーとその子プロセスの常駐メモリを監視、超過したら強制終了して再起動）
+# - タイムアウト・メモリ超過時は status 'timeout' / 'oom' とそれまでに計算できた部分特徴量を記録
+# - クラッシュしたワーカーの自動再起動
+# - ワーカーは独立したプロセスグループで動かし、停止時はJoern（joern-parse / joern-export のJVM）も含めて終了させる
+
+import os
+import time
+import signal
+import itertools
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# 統合特徴量の次元数（エラー時のゼロベクトル用）
+INTEGRATED_VECTOR_SIZE = 11
+
+# 部分特徴量の名前と次元数（integrated_vectorでの並び順）
+PARTIAL_FEATURE_GROUPS = (('cfg', 6), ('dataflow', 5))
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def _child_pids(pid):
+    """プロセスの子のPID（全スレッド分、/proc が使えない環境では空）"""
+    children = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return children
+    for task in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{task}/children", 'r') as f:
+                children.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            pass
+    return children
+
+
+def _child_tree(pid):
+    """プロセスの子孫のPID（親子関係のみ、メモリ監視用に /proc 全体は走査しない）"""
+    found = []
+    pending = [pid]
+    while pending:
+        children = _child_pids(pending.pop())
+        found.extend(children)
+        pending.extend(children)
+    return found
+
+
+def _read_stat(pid):
+    """/proc/<pid>/stat の (状態, プロセスグループID)（読めない場合はNone）"""
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return fields[0], int(fields[2])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def descendant_pids(pid):
+    """
+    プロセスの子孫とプロセスグループのメンバー（Joernなど、親が終了して再親付けされたものも含む）
+
+    Args:
+        pid (int): プロセスID（ワーカーはプロセスグループのリーダー）
+
+    Returns:
+        list: PIDのリスト（pid自身は含まない）
+    """
+    found = set(_child_tree(pid))
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        entries = []
+    for entry in entries:
+        if entry.isdigit() and int(entry) != pid:
+            stat = _read_stat(entry)
+            if stat is not None and stat[1] == pid:
+                found.add(int(entry))
+    return sorted(found)
+
+
+def _is_alive(pid):
+    """プロセスが生きているか（ゾンビは終了済みとみなす）"""
+    stat = _read_stat(pid)
+    if stat is not None:
+        return stat[0] != 'Z'
+    if os.path.isdir('/proc'):
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def _signal_tree(pid, pids, sig):
+    """プロセスグループ（リーダーpid）と指定したPIDにシグナルを送る"""
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(pid, sig)
+        except OSError:
+            pass
+    for target in pids:
+        try:
+            os.kill(target, sig)
+        except OSError:
+            pass
+
+
+def process_tree_rss(pid):
+    """
+    プロセスとその子孫（Joernなど）の常駐メモリの合計
+
+    Args:
+        pid (int): プロセスID
+
+    Returns:
+        int: バイト数（/proc が使えない環境ではNone）
+    """
+    total = 0
+    found = False
+    for current in [pid] + _child_tree(pid):
+        try:
+            with open(f"/proc/{current}/statm", 'r') as f:
+                total += int(f.read().split()[1]) * _PAGE_SIZE
+            found = True
+        except (OSError, ValueError, IndexError):
+            continue
+    return total if found else None
+
+
+def _worker_main(conn):
+    """ワーカープロセスのメインループ（パイプからジョブを受け取り結果を返す）"""
+    # 独立したプロセスグループのリーダーになる（pyjoernが起動するJoernのJVMもこのグループに入り、
+    # タイムアウト・メモリ超過でワーカーを止めるときにまとめて終了できる）
+    if hasattr(os, 'setsid'):
+        try:
+            os.setsid()
+        except OSError:
+            pass
+
+    # 重い依存はワーカー起動時に1回だけ読み込む
+    from ext_cfg_dfg_feature import extract_integrated_features_vector
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        kind = message[0]
+        if kind == 'ping':
+            conn.send(('pong', os.getpid()))
+        elif kind == 'job':
+            _, job_id, source_file = message
+
+            def report_partial(name, values, job_id=job_id):
+                # 計算済みの部分特徴量を先に送る（打ち切られても親プロセスに残る）
+                conn.send(('partial', job_id, name, values))
+
+            try:
+                vector = extract_integrated_features_vector(source_file, on_partial=report_partial)
+                conn.send(('result', job_id, vector, None, None))
+            except MemoryError:
+                conn.send(('result', job_id, None, "MemoryError", 'oom'))
+            except Exception as e:
+                conn.send(('result', job_id, None, str(e), 'error'))
+        elif kind == 'stop':
+            break
+
+    conn.close()
+
+
+class JoernWorkerPool:
+    """
+    特徴量抽出ワーカーの常駐プール
+
+    使用例:
+        with JoernWorkerPool(n_workers=4, job_timeout=120, memory_limit_mb=2048) as pool:
+            results = batch_extract_integrated_features(file_list, pool=pool)
+    """
+    def __init__(self, n_workers=1, job_timeout=120, ping_timeout=10, max_jobs_per_worker=None, mp_context=None,
+                 memory_limit_mb=None, memory_check_interval=0.5):
+        """
+        Args:
+            n_workers (int): ワーカー数
+            job_timeout (float): 1ファイルあたりのタイムアウト秒数（Noneで無制限）
+            ping_timeout (float): ヘルスチェックの応答待ち秒数
+            max_jobs_per_worker (int): この件数を処理したワーカーを再起動（Noneで無制限）
+            mp_context: multiprocessingのコンテキスト（Noneでデフォルト）
+            memory_limit_mb (float): 1ファイルあたりのメモリ上限MB（ワーカーとその子プロセスの常駐メモリ、Noneで無制限）
+            memory_check_interval (float): メモリ使用量を確認する間隔（秒）
+        """
+        self.n_workers = max(1, int(n_workers))
+        self.job_timeout = job_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.memory_check_interval = memory_check_interval
+        self.ping_timeout = ping_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self._ctx = mp_context or multiprocessing.get_context()
+        self._workers = [None] * self.n_workers  # slot -> (process, conn)
+        self._job_counts = [0] * self.n_workers
+        self._idle = queue.Queue()
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._started = False
+        self.respawn_count = 0
+
+    # --- ライフサイクル ---
+    def start(self):
+        """全ワーカーを起動"""
+        if self._started:
+            return self
+        for slot in range(self.n_workers):
+            self._spawn(slot)
+            self._idle.put(slot)
+        self._started = True
+        return self
+
+    def close(self):
+        """全ワーカーを停止"""
+        if not self._started:
+            return
+        for slot in range(self.n_workers):
+            self._stop(slot)
+        self._started = False
+        self._idle = queue.Queue()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _spawn(self, slot):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        self._workers[slot] = (process, parent_conn)
+        self._job_counts[slot] = 0
+
+    def _stop(self, slot, force=False):
+        """
+        ワーカーを停止（Joernなどの子孫プロセスもまとめて終了）
+
+        Returns:
+            list: 終了できなかった子孫プロセスのPID
+        """
+        worker = self._workers[slot]
+        if worker is None:
+            return []
+        process, conn = worker
+        # ワーカーが終了すると子孫は再親付けされて親子関係からは辿れなくなるため、先に集めておく
+        descendants = descendant_pids(process.pid) if process.pid is not None else []
+        if not force and process.is_alive():
+            try:
+                conn.send(('stop',))
+                process.join(timeout=5)
+            except (BrokenPipeError, OSError):
+                pass
+        if process.is_alive():
+            _signal_tree(process.pid, descendants, signal.SIGTERM)
+            process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        conn.close()
+        self._workers[slot] = None
+
+        # ワーカーが先に終了していても（クラッシュ・OOM killer）、残った子孫をグループごと終了
+        if process.pid is not None:
+            _signal_tree(process.pid, [pid for pid in descendants if _is_alive(pid)],
+                         getattr(signal, 'SIGKILL', signal.SIGTERM))
+            deadline = time.monotonic() + 5
+            remaining = [pid for pid in descendant_pids(process.pid) + descendants if _is_alive(pid)]
+            while remaining and time.monotonic() < deadline:
+                time.sleep(0.05)
+                remaining = [pid for pid in remaining if _is_alive(pid)]
+            return sorted(set(remaining))
+        return []
+
+    def _respawn(self, slot):
+        remaining = self._stop(slot, force=True)
+        if remaining:
+            print(f"⚠️ ワーカー{slot}の子プロセスが終了していません: {remaining}")
+        self._spawn(slot)
+        with self._lock:
+            self.respawn_count += 1
+
+    # --- ヘルスチェック ---
+    def _ping(self, slot):
+        process, conn = self._workers[slot]
+        if not process.is_alive():
+            return False
+        try:
+            conn.send(('ping',))
+            if not conn.poll(self.ping_timeout):
+                return False
+            reply = conn.recv()
+            return reply[0] == 'pong'
+        except (EOFError, BrokenPipeError, OSError):
+            return False
+
+    def health_check(self):
+        """
+        待機中の全ワーカーにpingを送り、応答しないワーカーを再起動
+
+        Returns:
+            int: 再起動したワーカー数
+        """
+        slots = []
+        while True:
+            try:
+                slots.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+        restarted = 0
+        for slot in slots:
+            if not self._ping(slot):
+                print(f"⚠️ ワーカー{slot}が応答しないため再起動します")
+                self._respawn(slot)
+                restarted += 1
+            self._idle.put(slot)
+        return restarted
+
+    # --- ジョブ実行 ---
+    def run(self, source_file, timeout=None):
+        """
+        1ファイルの統合特徴量をワーカーで抽出
+
+        Args:
+            source_file (str): 解析対象ファイルパス
+            timeout (float): タイムアウト秒数（Noneの場合はjob_timeout）
+
+        Returns:
+            dict: {'source_file', 'integrated_vector'}
+                  （失敗時は 'error' と 'status'（'timeout' / 'oom' / 'crashed' / 'error'）、
+                  部分的に計算できた場合は 'partial_features' も含む）
+        """
+        if not self._started:
+            self.start()
+
+        slot = self._idle.get()
+        try:
+            return self._run_on_slot(slot, source_file, self.job_timeout if timeout is None else timeout)
+        finally:
+            self._idle.put(slot)
+
+    def _run_on_slot(self, slot, source_file, timeout):
+        process, conn = self._workers[slot]
+        if not process.is_alive():
+            self._respawn(slot)
+            process, conn = self._workers[slot]
+
+        job_id = next(self._job_ids)
+        partial = {}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        memory_limit = None if self.memory_limit_mb is None else self.memory_limit_mb * 1024 * 1024
+        try:
+            conn.send(('job', job_id, source_file))
+            while True:
+                wait_time = self.memory_check_interval if memory_limit is not None else None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        # タイムアウト: ワーカーを強制終了して再起動
+                        self._respawn(slot)
+                        return self._error_record(source_file, f"timeout ({timeout}s)", 'timeout', partial)
+                    wait_time = remaining if wait_time is None else min(wait_time, remaining)
+                if not conn.poll(wait_time):
+                    if memory_limit is not None:
+                        rss = process_tree_rss(process.pid)
+                        if rss is not None and rss > memory_limit:
+                            # メモリ超過: ワーカーを強制終了して再起動
+                            self._respawn(slot)
+                            return self._error_record(
+                                source_file, f"memory limit exceeded ({rss / 1024 / 1024:.0f}MB > {self.memory_limit_mb}MB)",
+                                'oom', partial)
+                    continue
+                reply = conn.recv()
+                if reply[0] == 'partial' and reply[1] == job_id:
+                    partial[reply[2]] = reply[3]
+                elif reply[0] == 'result' and reply[1] == job_id:
+                    break
+        except (EOFError, BrokenPipeError, OSError):
+            # ワーカーがクラッシュした場合は再起動（SIGKILLはOSのOOM killerによる強制終了とみなす）
+            process.join(timeout=1)
+            killed = process.exitcode == -getattr(signal, 'SIGKILL', 9)
+            self._respawn(slot)
+            if killed:
+                return self._error_record(source_file, "worker killed (out of memory)", 'oom', partial)
+            return self._error_record(source_file, "worker crashed", 'crashed', partial)
+
+        _, _, vector, error, status = reply
+        self._job_counts[slot] += 1
+        if status == 'oom' or (self.max_jobs_per_worker and self._job_counts[slot] >= self.max_jobs_per_worker):
+            # MemoryError後のワーカーは状態が信用できないので再起動
+            self._respawn(slot)
+
+        if error is not None:
+            return self._error_record(source_file, error, status, partial)
+        return {
+            'source_file': source_file,
+            'integrated_vector': vector
+        }
+
+    def map(self, file_list, timeout=None, chunk_size=None, callback=None):
+        """
+        複数ファイルを全ワーカーに並列投入し、入力順に結果を返す
+
+        Args:
+            file_list (list): 解析対象ファイルリスト
+            timeout (float): 1ファイルあたりのタイムアウト秒数（Noneの場合はjob_timeout）
+            chunk_size (int): 同時に投入しておくファイル数（Noneの場合はワーカー数の4倍）
+            callback (callable): 1件完了するごとに callback(index, result) を呼ぶ（呼び出し元スレッドで実行）
+
+        Returns:
+            list: 各ファイルの結果（file_listと同じ順序）
+        """
+        if not self._started:
+            self.start()
+
+        if chunk_size is None:
+            chunk_size = self.n_workers * 4
+        chunk_size = max(chunk_size, self.n_workers)
+
+        results = [None] * len(file_list)
+        pending = {}
+        jobs = iter(enumerate(file_list))
+        completed = 0
+        next_report = max(1, len(file_list) // 10)
+
+        # 各ワーカーをスレッドから駆動し、投入中のジョブ数をchunk_sizeに制限する
+        with ThreadPoolExecutor(max_workers=self.n_workers) as executor:
+            def submit_next():
+                try:
+                    index, source_file = next(jobs)
+                except StopIteration:
+                    return False
+                pending[executor.submit(self.run, source_file, timeout)] = index
+                return True
+
+            while len(pending) < chunk_size and submit_next():
+                pass
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    try:
+                        results[index] = future.result()
+                    except Exception as e:
+                        results[index] = self._error_record(file_list[index], str(e))
+                    if callback is not None:
+                        callback(index, results[index])
+                    completed += 1
+                    if completed % next_report == 0 or completed == len(file_list):
+                        print(f"   ⏳ {completed}/{len(file_list)} ファイル完了")
+                    submit_next()
+
+        return results
+
+    @staticmethod
+    def _error_record(source_file, error, status='error', partial=None):
+        """エラー時の結果（計算済みの部分特徴量があればベクトルに埋め、なければゼロ）"""
+        vector = []
+        for name, size in PARTIAL_FEATURE_GROUPS:
+            values = (partial or {}).get(name)
+            vector.extend(values if values is not None and len(values) == size else [0] * size)
+        record = {
+            'source_file': source_file,
+            'integrated_vector': vector,
+            'error': error,
+            'status': status
+        }
+        if partial:
+            record['partial_features'] = sorted(partial)
+        return record
@@ -2,22 +2,11 @@
 # 11次元でクラスタリングできます
 
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.metrics.pairwise import cosine_distances
-from sklearn.datasets import make_blobs, make_circles, make_moons, load_iris, load_wine
-from sklearn.decomposition import PCA
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
 import os
 from datetime import datetime
 
-# オプショナルライブラリのインポート
-try:
-    import seaborn as sns
-    import pandas as pd
-    ADVANCED_VIZ_AVAILABLE = True
-except ImportError:
-    ADVANCED_VIZ_AVAILABLE = False
+# sklearn（PCA・t-SNE）・matplotlib・UMAPは使う関数の中で読み込む
+# （特徴量抽出やオンライン割り当てだけの場合に重い依存を読み込まないため）
 
 # ハンガリアンアルゴリズム用のインポート
 try:
@@ -30,19 +19,6 @@ except ImportError:
 # JSONファイル操作のインポート
 import json
 
-# 次元削減手法のインポート
-try:
-    from sklearn.manifold import TSNE
-    TSNE_AVAILABLE = True
-except ImportError:
-    TSNE_AVAILABLE = False
-
-try:
-    import umap
-    UMAP_AVAILABLE = True
-except ImportError:
-    UMAP_AVAILABLE = False
-
 # ext_cfg_dfg_feature.pyから特徴量抽出関数をインポート
 try:
     from ext_cfg_dfg_feature import (
@@ -88,22 +64,61 @@ class OnlineStandardScaler:
         self.M2 = np.zeros(n_features)  # 二乗和の累積
         self.std = np.ones(n_features)  # 初期値は1（ゼロ除算回避）
 
+    @classmethod
+    def from_stats(cls, n_samples, mean, M2):
+        """保存しておいた統計量（件数・平均・M2）からスケーラーを復元"""
+        scaler = cls(len(mean))
+        scaler._merge_stats(int(n_samples), np.asarray(mean, dtype=float), np.asarray(M2, dtype=float))
+        return scaler
+
     def partial_fit(self, X):
         """
-        オンラインでデータを追加し、平均と分散を更新（Welfordアルゴリズム）
+        オンラインでデータを追加し、平均と分散を更新
+        バッチの統計量（件数・平均・偏差の二乗和）をまとめて計算し、Chanの並列アルゴリズムで結合する
+        （1行ずつのWelfordアルゴリズムと同じ結果）
 
         Args:
             X: 新しいデータ（shape: (n_samples, n_features) または (n_features,)）
         """
+        X = np.asarray(X, dtype=float)
         if X.ndim == 1:
             X = X.reshape(1, -1)
+        if len(X) == 0:
+            return
 
-        for x in X:
-            self.n_samples += 1
-            delta = x - self.mean
-            self.mean += delta / self.n_samples
-            delta2 = x - self.mean
-            self.M2 += delta * delta2
+        batch_mean = X.mean(axis=0)
+        # 定数の列は平均をその値に厳密に合わせる（丸め誤差で分散が0でなくならないように）
+        constant = np.all(X == X[0], axis=0)
+        batch_mean[constant] = X[0, constant]
+        centered = X - batch_mean
+        self._merge_stats(len(X), batch_mean, np.einsum('ij,ij->j', centered, centered))
+
+    def merge(self, other):
+        """
+        別のスケーラー（別プロセス・別マシンで集計した分）の統計量を結合
+        全データを1つのスケーラーで partial_fit したのと同じ平均・分散になる
+
+        Args:
+            other (OnlineStandardScaler): 結合するスケーラー
+
+        Returns:
+            OnlineStandardScaler: self
+        """
+        if other.n_features != self.n_features:
+            raise ValueError(f"特徴量の次元数が異なります: {self.n_features} != {other.n_features}")
+        self._merge_stats(other.n_samples, np.asarray(other.mean, dtype=float), np.asarray(other.M2, dtype=float))
+        return self
+
+    def _merge_stats(self, n_b, mean_b, M2_b):
+        """(件数, 平均, 偏差の二乗和) を結合（Chanの並列アルゴリズム）"""
+        if n_b == 0:
+            return
+        n_a = self.n_samples
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.M2 += M2_b + delta * delta * (n_a * n_b / n)
+        self.mean += delta * (n_b / n)
+        self.n_samples = n
 
         # 分散と標準偏差を更新
         if self.n_samples > 1:
@@ -168,6 +183,7 @@ def dist(c, s, metric='euclidean', weights=None):
             # 重み付きマンハッタン距離: sum(w_i * |c_i - s_i|)
             return np.sum(weights * np.abs(c - s))
     elif metric == 'cosine':
+        from sklearn.metrics.pairwise import cosine_distances
         if weights is None:
             return cosine_distances([c], [s])[0][0]
         else:
@@ -178,34 +194,255 @@ def dist(c, s, metric='euclidean', weights=None):
     else:
         raise ValueError(f"未知の距離関数です: {metric}")
 
-# --- K-means++ 初期化 ---
-def initialize_centroids(X_data, k):
-    kmeans = KMeans(n_clusters=k, init='k-means++', n_init='auto', random_state=42)
-    kmeans.fit(X_data)
-    return kmeans.cluster_centers_
+# --- 距離行列（全データ×全セントロイドを一括計算） ---
+def pairwise_dist(X_data, C, metric='euclidean', weights=None):
+    """
+    dist() と同じ距離を全データ点×全セントロイドについて一括計算
+
+    Args:
+        X_data: データ (n, d)
+        C: セントロイド (k, d)
+        metric: 距離計算方法 ('euclidean', 'manhattan', 'cosine')
+        weights: 特徴量の重み (d,)
+
+    Returns:
+        np.ndarray: 距離行列 (n, k)
+    """
+    X_data = np.asarray(X_data, dtype=float)
+    C = np.asarray(C, dtype=float)
+    n, d = X_data.shape
+    k = C.shape[0]
+
+    if metric == 'cosine':
+        # 重みをsqrt(w_i)で適用してから正規化（ノルム0のベクトルとの距離は1）
+        if weights is not None:
+            sqrt_w = np.sqrt(weights)
+            X_data = X_data * sqrt_w
+            C = C * sqrt_w
+        X_norm = np.linalg.norm(X_data, axis=1, keepdims=True)
+        C_norm = np.linalg.norm(C, axis=1, keepdims=True)
+        X_unit = np.divide(X_data, X_norm, out=np.zeros_like(X_data), where=X_norm > 0)
+        C_unit = np.divide(C, C_norm, out=np.zeros_like(C), where=C_norm > 0)
+        return np.clip(1.0 - X_unit @ C_unit.T, 0.0, 2.0)
+
+    w = np.ones(d) if weights is None else np.asarray(weights, dtype=float)
+
+    if metric == 'euclidean':
+        # sum(w(x-c)^2) = sum(w x^2) + sum(w c^2) - 2 (w x)・c をBLASの行列積で計算
+        Xw = X_data * w
+        sq = np.einsum('ij,ij->i', Xw, X_data)[:, None] + np.einsum('ij,ij->i', C * w, C)[None, :] - 2.0 * (Xw @ C.T)
+        return np.sqrt(np.maximum(sq, 0.0))
+
+    if metric == 'manhattan':
+        # セントロイドごとに |x-c| を作り、重みとの内積（BLAS）で和を取る
+        D = np.empty((n, k))
+        diff = np.empty_like(X_data)
+        for j in range(k):
+            np.subtract(X_data, C[j], out=diff)
+            np.abs(diff, out=diff)
+            D[:, j] = diff @ w
+        return D
+
+    raise ValueError(f"未知の距離関数です: {metric}")
+
+def assign_labels(X_data, C, metric='euclidean', weights=None):
+    """各データ点を最も近いセントロイドに割り当てる（ラベル配列を返す）"""
+    return np.argmin(pairwise_dist(X_data, C, metric, weights), axis=1)
+
+# --- K-means++ / k-means|| 初期化 ---
+def _sample_by_potential(potential, size, rng):
+    """potential に比例する確率でインデックスを size 個選ぶ（累積和の二分探索、O(n)）"""
+    cumulative = np.cumsum(potential)
+    picks = np.searchsorted(cumulative, rng.random(size) * cumulative[-1], side='right')
+    return np.minimum(picks, len(potential) - 1)
+
+def _kmeans_plusplus(X_data, k, metric, weights, rng, sample_weight=None, n_local_trials=None):
+    """
+    重み付き（グリーディ）k-means++
+
+    各ステップで最寄りセントロイドまでの距離の2乗 × サンプル重み に比例して候補を n_local_trials 個選び、
+    全体のポテンシャルを最も下げる候補を採用する（計算量 O(n・k・n_local_trials)）
+    """
+    n, d = X_data.shape
+    sample_weight = np.ones(n) if sample_weight is None else np.asarray(sample_weight, dtype=float)
+    if n_local_trials is None:
+        n_local_trials = 2 + int(np.log(k))
+
+    centers = np.empty((k, d))
+    first = _sample_by_potential(sample_weight, 1, rng)[0]
+    centers[0] = X_data[first]
+    closest = pairwise_dist(X_data, centers[:1], metric, weights)[:, 0] ** 2
+
+    for c in range(1, k):
+        potential = closest * sample_weight
+        if potential.sum() > 0:
+            candidates = _sample_by_potential(potential, n_local_trials, rng)
+        else:
+            # 全点が既存のセントロイドと一致（重複データ）: サンプル重みだけで選ぶ
+            candidates = _sample_by_potential(sample_weight, n_local_trials, rng)
+
+        candidate_closest = np.minimum(closest[:, None], pairwise_dist(X_data, X_data[candidates], metric, weights) ** 2)
+        best = np.argmin(sample_weight @ candidate_closest)
+        centers[c] = X_data[candidates[best]]
+        closest = candidate_closest[:, best]
+
+    return centers
+
+def _kmeans_parallel(X_data, k, metric, weights, rng, oversampling=None, n_rounds=5):
+    """
+    k-means||（Bahmani et al.）
+
+    各ラウンドで距離の2乗に比例した確率で約 oversampling 個の候補を独立に追加し、
+    候補に最寄りのデータ点数を重みとして付け、重み付きk-means++でk個に絞る（計算量 O(n・k・n_rounds)）
+    """
+    n = X_data.shape[0]
+    if oversampling is None:
+        oversampling = 2 * k
+
+    chosen = [int(rng.integers(n))]
+    closest = pairwise_dist(X_data, X_data[chosen], metric, weights)[:, 0] ** 2
+    for _ in range(n_rounds):
+        total = closest.sum()
+        if total <= 0:
+            break
+        new = np.flatnonzero(rng.random(n) < np.minimum(1.0, oversampling * closest / total))
+        if len(new) == 0:
+            continue
+        chosen.extend(new.tolist())
+        closest = np.minimum(closest, pairwise_dist(X_data, X_data[new], metric, weights).min(axis=1) ** 2)
+
+    candidates = X_data[np.unique(chosen)]
+    if len(candidates) <= k:
+        # 候補が足りない（重複データが多い）場合はデータ全体でk-means++
+        return _kmeans_plusplus(X_data, k, metric, weights, rng)
+
+    counts = np.bincount(assign_labels(X_data, candidates, metric, weights), minlength=len(candidates))
+    return _kmeans_plusplus(candidates, k, metric, weights, rng, sample_weight=counts)
+
+def initialize_centroids(X_data, k, metric='euclidean', weights=None, method='k-means++', random_state=42):
+    """
+    K-meansの初期セントロイドを選ぶ（クラスタリング本体と同じ距離・特徴量の重みを使用）
+
+    Args:
+        X_data: 特徴量データ (n, d)
+        k: クラスター数
+        metric: 距離計算方法 ('euclidean', 'manhattan', 'cosine')
+        weights: 特徴量の重み（FEATURE_WEIGHTSなど）
+        method: 'k-means++'（グリーディ版） または 'k-means||'（大規模データ向け、ラウンド数だけデータを走査）
+        random_state: 乱数シード（Noneで毎回異なる初期値）
+
+    Returns:
+        np.ndarray: 初期セントロイド (k, d)
+    """
+    X_data = np.asarray(X_data, dtype=float)
+    rng = np.random.default_rng(random_state)
+    if method == 'k-means++':
+        return _kmeans_plusplus(X_data, k, metric, weights, rng)
+    if method == 'k-means||':
+        return _kmeans_parallel(X_data, k, metric, weights, rng)
+    raise ValueError(f"未知の初期化方法です: {method}")
 
 # --- 一般的なK-meansクラスタリングアルゴリズム ---
-def general_kmeans_algorithm(X_data, k, metric='euclidean', weights=None, max_iterations=100):
-    C = initialize_centroids(X_data, k)
+def update_centroids(X_data, labels, k):
+    """割り当てに基づいてセントロイドを更新（空のクラスターはデータの範囲内でランダムに再初期化）"""
+    # ラベルで安定ソートして各クラスターを連続区間として取り出す（X_data[labels == i] と同じ順序の行）
+    order = np.argsort(labels, kind='stable')
+    boundaries = np.searchsorted(labels[order], np.arange(k + 1))
+    X_sorted = X_data[order]
+
+    new_C = np.zeros((k, X_data.shape[1]))
+    for i in range(k):
+        points_in_cluster = X_sorted[boundaries[i]:boundaries[i + 1]]
+        if len(points_in_cluster) > 0:
+            new_C[i] = np.mean(points_in_cluster, axis=0)
+        else:
+            # クラスターが空になった場合、データ全体の範囲内でランダムに再初期化する
+            min_val = np.min(X_data, axis=0)
+            max_val = np.max(X_data, axis=0)
+            new_C[i] = np.random.uniform(min_val, max_val, X_data.shape[1])
+    return new_C
+
+def paired_dist(A, B, metric='euclidean', weights=None):
+    """A[i] と B[i] の距離を行ごとに計算（dist() と同じ距離、ユークリッド・マンハッタンのみ）"""
+    diff = np.asarray(A, dtype=float) - np.asarray(B, dtype=float)
+    w = np.ones(diff.shape[1]) if weights is None else np.asarray(weights, dtype=float)
+    if metric == 'euclidean':
+        return np.sqrt((diff * diff) @ w)
+    if metric == 'manhattan':
+        return np.abs(diff) @ w
+    raise ValueError(f"未知の距離関数です: {metric}")
+
+def _hamerly_kmeans(X_data, C, k, metric, weights, max_iterations):
+    """
+    三角不等式で距離計算を省くLloyd反復（Hamerlyの方法）
+
+    各点について割り当て先セントロイドまでの距離の上界と、2番目に近いセントロイドまでの距離の下界を保持し、
+    セントロイドの移動量で更新する。上界 < max(下界, 最寄りの他セントロイドまでの距離/2) の点は割り当てが
+    変わらないので距離を計算しない。距離の公理を満たす metric（ユークリッド・マンハッタン）でのみ有効
+    """
+    n = X_data.shape[0]
+    rows = np.arange(n)
+
+    D = pairwise_dist(X_data, C, metric, weights)
+    labels = np.argmin(D, axis=1)
+    upper = D[rows, labels]
+    D[rows, labels] = np.inf
+    lower = D.min(axis=1)
+
+    for iteration in range(max_iterations):
+        new_C = update_centroids(X_data, labels, k)
+        if np.allclose(C, new_C):
+            break
+
+        # セントロイドの移動量で境界を更新（下界は自分以外の最大移動量だけ下げる）
+        drift = paired_dist(C, new_C, metric, weights)
+        C = new_C
+        upper += drift[labels]
+        order = np.argsort(drift)
+        max_drift = drift[order[-1]]
+        second_drift = drift[order[-2]] if k > 1 else 0.0
+        lower -= np.where(labels == order[-1], second_drift, max_drift)
+
+        CC = pairwise_dist(C, C, metric, weights)
+        np.fill_diagonal(CC, np.inf)
+        bound = np.maximum(0.5 * CC.min(axis=1)[labels], lower)
+
+        # 上界を締め直しても境界を超える点だけ全セントロイドとの距離を計算（同距離は全計算に回す）
+        candidates = np.flatnonzero(upper >= bound)
+        if len(candidates) > 0:
+            upper[candidates] = paired_dist(X_data[candidates], C[labels[candidates]], metric, weights)
+            candidates = candidates[upper[candidates] >= bound[candidates]]
+        if len(candidates) > 0:
+            Dc = pairwise_dist(X_data[candidates], C, metric, weights)
+            candidate_rows = np.arange(len(candidates))
+            nearest = np.argmin(Dc, axis=1)
+            labels[candidates] = nearest
+            upper[candidates] = Dc[candidate_rows, nearest]
+            Dc[candidate_rows, nearest] = np.inf
+            lower[candidates] = Dc.min(axis=1)
+
+    return C, labels
+
+def general_kmeans_algorithm(X_data, k, metric='euclidean', weights=None, max_iterations=100, init='k-means++', random_state=42,
+                             accelerated=False, initial_centroids=None):
+    # 前回のモデルのセントロイドがあればそこから開始（ウォームスタート）
+    if initial_centroids is None:
+        C = initialize_centroids(X_data, k, metric, weights, method=init, random_state=random_state)
+    else:
+        C = np.array(initial_centroids, dtype=float)
+
+    if accelerated:
+        # 三角不等式による高速化（ほとんどの点の距離計算を省略、ラベルは通常版と同じ）
+        if metric in ('euclidean', 'manhattan') and k > 1:
+            return _hamerly_kmeans(np.asarray(X_data, dtype=float), C, k, metric, weights, max_iterations)
+        print(f"⚠️ {metric}距離では高速化を使えないため通常のK-meansで実行します")
 
     for iteration in range(max_iterations):
-        # ステップ 1: 各データポイントを最も近いセントロイドに割り当てる
-        labels = np.zeros(len(X_data), dtype=int)
-        for i, S in enumerate(X_data):
-            dists = [dist(c, S, metric, weights=weights) for c in C]
-            labels[i] = np.argmin(dists)
+        # ステップ 1: 各データポイントを最も近いセントロイドに割り当てる（距離行列を一括計算）
+        labels = assign_labels(X_data, C, metric, weights)
 
         # ステップ 2: 新しいクラスター割り当てに基づいてセントロイドを更新
-        new_C = np.zeros((k, X_data.shape[1]))
-        for i in range(k):
-            points_in_cluster = X_data[labels == i]
-            if len(points_in_cluster) > 0:
-                new_C[i] = np.mean(points_in_cluster, axis=0)
-            else:
-                # クラスターが空になった場合、データ全体の範囲内でランダムに再初期化する
-                min_val = np.min(X_data, axis=0)
-                max_val = np.max(X_data, axis=0)
-                new_C[i] = np.random.uniform(min_val, max_val, X_data.shape[1])
+        new_C = update_centroids(X_data, labels, k)
 
         # 収束判定: セントロイドがほとんど変化しなくなったら停止
         if np.allclose(C, new_C):
@@ -214,15 +451,13 @@ def general_kmeans_algorithm(X_data, k, metric='euclidean', weights=None, max_it
         C = new_C
 
     # 最終的なラベル付け
-    final_labels = np.zeros(len(X_data), dtype=int)
-    for i, S in enumerate(X_data):
-        dists = [dist(c, S, metric, weights=weights) for c in C]
-        final_labels[i] = np.argmin(dists)
+    final_labels = assign_labels(X_data, C, metric, weights)
 
     return C, final_labels
 
 # --- 正解判定関数を利用したクラスタリングアルゴリズム ---
-def clustering_algorithm_with_correctness(X_data, k, is_correct_fn, metric='euclidean', weights=None, max_iterations=100):
+def clustering_algorithm_with_correctness(X_data, k, is_correct_fn, metric='euclidean', weights=None, max_iterations=100,
+                                          init='k-means++', random_state=42, initial_centroids=None, initial_counts=None):
     """
     正解判定関数を利用したK-meansクラスタリング
 
@@ -233,17 +468,24 @@ def clustering_algorithm_with_correctness(X_data, k, is_correct_fn, metric='eucl
         metric: 距離計算方法
         weights: 特徴量の重み
         max_iterations: 最大反復回数
+        init: 初期化方法 ('k-means++' または 'k-means||')
+        random_state: 初期化の乱数シード
+        initial_centroids: 前回のセントロイド（ウォームスタート、Noneの場合は初期化）
+        initial_counts: 前回までの各クラスターの要素数（学習率 1/N の N の初期値）
 
     Returns:
         C: 最終セントロイド
         final_labels: 最終ラベル
     """
-    C = initialize_centroids(X_data, k)
-    N = np.zeros(k)  # 各クラスターに割り当てられたデータポイントの数
+    if initial_centroids is None:
+        C = initialize_centroids(X_data, k, metric, weights, method=init, random_state=random_state)
+    else:
+        C = np.array(initial_centroids, dtype=float)
+    N = np.zeros(k) if initial_counts is None else np.asarray(initial_counts, dtype=float).copy()  # 各クラスターに割り当てられたデータポイントの数
 
     for S in X_data:
         # 各データポイント S を最も近いセントロイドに割り当てる
-        dists = [dist(c, S, metric, weights=weights) for c in C]
+        dists = pairwise_dist(S[np.newaxis, :], C, metric, weights)[0]
         min_c = np.argmin(dists)  # 割り当てられたクラスターのインデックス
 
         N[min_c] += 1
@@ -254,10 +496,7 @@ def clustering_algorithm_with_correctness(X_data, k, is_correct_fn, metric='eucl
             C[min_c] = C[min_c] + (1 / N[min_c]) * (S - C[min_c])
 
     # 最終的なラベル付け
-    final_labels = np.zeros(len(X_data), dtype=int)
-    for i, S in enumerate(X_data):
-        dists = [dist(c, S, metric, weights=weights) for c in C]
-        final_labels[i] = np.argmin(dists)
+    final_labels = assign_labels(X_data, C, metric, weights)
 
     return C, final_labels
 
@@ -1098,7 +1337,16 @@ def display_clustering_results(final_labels, C_final, file_names=None, dataset_n
 
     print("=" * 80)
 
-def main(algorithm_type: str, dataset_name: str, preloaded_data=None, target_directory: str = None, k_clusters: int = None):
+def main(algorithm_type: str, dataset_name: str, preloaded_data=None, target_directory: str = None, k_clusters: int = None,
+         model_file: str = None):
+    """
+    クラスタリングを実行して結果を保存
+
+    Args:
+        model_file: クラスタリングモデル（.npz）。存在すれば前回のセントロイド・標準化の状態からウォームスタートし、
+                    新しい提出だけを標準化の統計量に追加する（学習後に書き換えられた提出は watch_mode と同じく
+                    割り当てのみ）。実行後は更新したモデル（学習済みファイルは前回との和集合）を保存する
+    """
     # データセットの生成または事前ロード済みデータの使用
     if preloaded_data is None:
         result = create_dataset(dataset_name, target_directory=target_directory, k_clusters=k_clusters)
@@ -1116,11 +1364,42 @@ def main(algorithm_type: str, dataset_name: str, preloaded_data=None, target_dir
         file_names = None
         file_paths = None
 
+    weights = FEATURE_WEIGHTS if dataset_name == 'real_code_features' else None
+
+    # --- 前回のモデル（ウォームスタート、学習済みのファイルが分かる場合のみ） ---
+    model = None
+    file_hashes = None
+    if model_file is not None and file_paths is not None:
+        from clustering_model import file_content_hashes
+        file_hashes = file_content_hashes(file_paths)
+    if model_file is not None and os.path.exists(model_file) and file_paths is not None:
+        from clustering_model import ClusteringModel
+        try:
+            model = ClusteringModel.load(model_file)
+            if not model.compatible_with(k_clusters, X.shape[1], 'euclidean', weights):
+                print(f"⚠️ モデルの条件（クラスタ数・次元数・重み）が異なるため使用しません: {model_file}")
+                model = None
+        except Exception as e:
+            print(f"⚠️ モデル読み込みエラー: {e}")
+            model = None
+
     # --- データの標準化処理（平均0、分散1に正規化） ---
     print("\n🔄 データ標準化中...")
-    scaler = OnlineStandardScaler(n_features=X.shape[1])
     X_original = X.copy()  # 元のデータを保存
-    X = scaler.fit_transform(X)  # 標準化されたデータ
+    new_mask = np.ones(len(X), dtype=bool)
+    if model is not None:
+        # 前回の統計量に新しい提出だけを追加
+        # 書き換えられた提出は古い寄与を取り除けないため、watch_mode と同じく割り当てのみ（統計量・セントロイドは更新しない）
+        new_mask = ~model.learned_mask(file_paths)
+        modified_count = int(model.modified_mask(file_paths, file_hashes).sum())
+        print(f"♻️ ウォームスタート: {model_file}（学習済み{int((~new_mask).sum()) - modified_count}件, "
+              f"変更{modified_count}件（割り当てのみ）, 新規{int(new_mask.sum())}件）")
+        scaler = model.scaler
+        scaler.partial_fit(X[new_mask])
+        X = scaler.transform(X)
+    else:
+        scaler = OnlineStandardScaler(n_features=X.shape[1])
+        X = scaler.fit_transform(X)  # 標準化されたデータ
 
     print(f"✅ 標準化完了: 平均={scaler.mean.round(4)}, 標準偏差={scaler.std.round(4)}")
 
@@ -1138,31 +1417,53 @@ def main(algorithm_type: str, dataset_name: str, preloaded_data=None, target_dir
 
     # クラスタリングアルゴリズムの選択と実行
     C_final, final_labels = None, None
+    initial_centroids = None if model is None else model.scaled_centroids()
     if algorithm_type == 'general':
         C_final, final_labels = general_kmeans_algorithm(
             X_data=X,  # 標準化されたデータを使用
             k=k_clusters,
             metric='euclidean',
-            weights=FEATURE_WEIGHTS if dataset_name == 'real_code_features' else None
+            weights=weights,
+            initial_centroids=initial_centroids
         )
         algo_title = "General K-means"
     elif algorithm_type == 'correctness_guided':
         if true_centers is None:
             raise ValueError("正解判定関数を利用したクラスタリングには真のセントロイドが必要です。")
 
+        # ウォームスタート時は新しい提出だけを1点ずつ処理し、全データのラベルは最後に割り当てる
         C_final, final_labels = clustering_algorithm_with_correctness(
-            X_data=X,  # 標準化されたデータを使用
+            X_data=X[new_mask],  # 標準化されたデータを使用
             k=k_clusters,
             is_correct_fn=is_correct_fn_factory(true_centers),
             metric='euclidean',
-            weights=FEATURE_WEIGHTS if dataset_name == 'real_code_features' else None
+            weights=weights,
+            initial_centroids=initial_centroids,
+            initial_counts=None if model is None else model.counts
         )
+        if model is not None:
+            final_labels = assign_labels(X, C_final, 'euclidean', weights)
         algo_title = "Correctness-Guided K-means"
     else:
         raise ValueError(f"不明なアルゴリズムタイプです: {algorithm_type}. 'general' または 'correctness_guided' を指定してください。")
 
     # セントロイドを元のスケールに戻す（結果保存・可視化用）
     C_final_original = scaler.inverse_transform(C_final)
+
+    # 次回のウォームスタート用にモデルを保存（学習済みファイルは前回の分との和集合）
+    if model_file is not None:
+        from clustering_model import ClusteringModel
+        try:
+            new_model = ClusteringModel(scaler, C_final_original, np.bincount(final_labels, minlength=k_clusters),
+                                        weights=weights, metric='euclidean', k=k_clusters,
+                                        file_paths=[] if model is None else model.file_paths,
+                                        file_hashes=[] if model is None else model.file_hashes)
+            if file_paths is not None:
+                new_model.add_learned_files(file_paths, file_hashes)
+            new_model.save(model_file)
+            print(f"💾 クラスタリングモデル保存: {model_file}")
+        except Exception as e:
+            print(f"❌ モデル保存エラー: {e}")
     if true_centers is not None:
         true_centers_display = true_centers_original
     else:
@@ -1204,6 +1505,22 @@ def main(algorithm_type: str, dataset_name: str, preloaded_data=None, target_dir
 def visualize_clustering_results(X, y_true, final_labels, C_final, true_centers,
                                dataset_name, algo_title, k_clusters, n_features, file_paths=None, output_dir=None):
     """クラスタリング結果の可視化（パターン別色分け対応）"""
+    # 可視化・次元削減ライブラリはここで読み込む
+    import matplotlib.pyplot as plt
+    import matplotlib.cm as cm
+    from sklearn.decomposition import PCA
+
+    try:
+        from sklearn.manifold import TSNE
+        TSNE_AVAILABLE = True
+    except ImportError:
+        TSNE_AVAILABLE = False
+
+    try:
+        import umap
+        UMAP_AVAILABLE = True
+    except ImportError:
+        UMAP_AVAILABLE = False
 
     # 結果保存用ディレクトリを作成（シンプルな1階層）
     if output_dir is None:
@@ -1379,6 +1696,19 @@ def visualize_clustering_results(X, y_true, final_labels, C_final, true_centers,
         plt.show()
 
 if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="コード特徴量のK-meansクラスタリング")
+    parser.add_argument('--model-dir', default=None,
+                        help="クラスタリングモデル（.npz）のディレクトリ（指定時は対象ディレクトリ・アルゴリズムごとにウォームスタートし、実行後に保存）")
+    args = parser.parse_args()
+
+    def model_file_for(directory_name, algorithm_type):
+        """対象ディレクトリ・アルゴリズムごとのモデルファイル（--model-dir 未指定ならNone）"""
+        if args.model_dir is None:
+            return None
+        os.makedirs(args.model_dir, exist_ok=True)
+        return os.path.join(args.model_dir, f"clustering_model_{directory_name}_{algorithm_type}.npz")
 
     # --- 実際のコード特徴量を使ったクラスタリング ---
     if FEATURE_EXTRACTION_AVAILABLE:
@@ -1400,6 +1730,7 @@ if __name__ == '__main__':
 
             if shared_data is not None:
                 # 実行したディレクトリを記録
+                current_dir = "unknown"
                 if len(shared_data) >= 7:
                     current_dir = os.path.basename(os.path.dirname(shared_data[6][0])) if shared_data[6] else "unknown"
                     if current_dir not in executed_directories:
@@ -1407,7 +1738,8 @@ if __name__ == '__main__':
 
                 try:
                     # 1. 一般的なK-meansアルゴリズム
-                    general_result_file, general_output_dir = main(algorithm_type='general', dataset_name='real_code_features', preloaded_data=shared_data)
+                    general_result_file, general_output_dir = main(algorithm_type='general', dataset_name='real_code_features', preloaded_data=shared_data,
+                                                               model_file=model_file_for(current_dir, 'general'))
                     saved_files.append(('general', general_result_file, general_output_dir))
                     all_saved_files.append(('general', general_result_file, general_output_dir, current_dir))
                 except Exception as e:
@@ -1415,7 +1747,8 @@ if __name__ == '__main__':
 
                 try:
                     # 2. 正解判定関数を利用したクラスタリング
-                    correctness_result_file, correctness_output_dir = main(algorithm_type='correctness_guided', dataset_name='real_code_features', preloaded_data=shared_data)
+                    correctness_result_file, correctness_output_dir = main(algorithm_type='correctness_guided', dataset_name='real_code_features', preloaded_data=shared_data,
+                                                                           model_file=model_file_for(current_dir, 'correctness_guided'))
                     saved_files.append(('correctness_guided', correctness_result_file, correctness_output_dir))
                     all_saved_files.append(('correctness_guided', correctness_result_file, correctness_output_dir, current_dir))
                 except Exception as e:
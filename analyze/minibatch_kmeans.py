@@ -0,0 +1,288 @@
+# ミニバッチK-means（特徴量キャッシュからのストリーミング）
+# - 複数の特徴量キャッシュ（JSON/SQLite）を一定サイズのバッチで読みながらクラスタリングし、
+#   全データの行列をメモリに載せずに typical90 の全問題をまとめてクラスタリングする
+# - 1パス目: OnlineStandardScaler の学習と、初期化用サンプルのリザーバサンプリング
+# - 2パス目以降: バッチごとに最寄りのセントロイドへ割り当て、セントロイドを学習率 1/N で更新
+#   （N: そのセントロイドにこれまで割り当てられた点の数、clustering_algorithm_with_correctness と同じ更新）
+# - キャッシュはファイル順（= パターン順）に並んでいるため、シャッフルバッファで読み込み順の偏りを減らす
+# - メモリ使用量はバッチサイズ・シャッフルバッファ・初期化用サンプルで決まる
+#   （SQLiteキャッシュは行単位で読む。JSONキャッシュは1ファイルずつ読み込む）
+#
+# 使用例:
+#   python minibatch_kmeans.py "feature_cache_submissions_typical90_*.sqlite" --k 16 --batch-size 4096
+
+import os
+import glob
+import json
+from datetime import datetime
+
+import numpy as np
+
+from kmeans_final_clean import (
+    FEATURE_WEIGHTS,
+    OnlineStandardScaler,
+    initialize_centroids,
+    assign_labels,
+    paired_dist,
+    hungarian_cluster_pattern_assignment
+)
+from feature_cache_db import is_sqlite_cache, open_cache_db, iter_results
+
+DEFAULT_BATCH_SIZE = 1024
+DEFAULT_MAX_EPOCHS = 10
+
+# --- キャッシュからのストリーミング ---
+def _load_cache_data(cache_file):
+    """JSON/pickleキャッシュの data を読み込む"""
+    if cache_file.endswith('.pkl'):
+        import pickle
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f).get('data', [])
+    with open(cache_file, 'r', encoding='utf-8') as f:
+        return json.load(f).get('data', [])
+
+def iter_cache_records(cache_files, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    特徴量キャッシュの成功データを batch_size 件ずつ返すジェネレータ
+
+    Args:
+        cache_files (list): キャッシュファイル（.json / .pkl / .sqlite）
+        batch_size (int): 1回に返す件数（SQLiteの読み込み単位）
+
+    Yields:
+        list: {'source_file', 'integrated_vector'} のリスト
+    """
+    for cache_file in cache_files:
+        if is_sqlite_cache(cache_file):
+            conn = open_cache_db(cache_file)
+            try:
+                yield from iter_results(conn, batch_size, successful_only=True)
+            finally:
+                conn.close()
+            continue
+
+        data = [r for r in _load_cache_data(cache_file) if 'error' not in r]
+        for start in range(0, len(data), batch_size):
+            yield data[start:start + batch_size]
+
+def iter_cache_batches(cache_files, batch_size=DEFAULT_BATCH_SIZE, shuffle_buffer=None, random_state=None):
+    """
+    特徴量キャッシュを (ファイルパスのリスト, 特徴量 (m, d)) のバッチで返すジェネレータ
+
+    Args:
+        cache_files (list): キャッシュファイル
+        batch_size (int): バッチサイズ
+        shuffle_buffer (int): シャッフルバッファの件数（Noneの場合はシャッフルしない、キャッシュの順序のまま）
+        random_state: シャッフルの乱数シード
+    """
+    if not shuffle_buffer:
+        for records in iter_cache_records(cache_files, batch_size):
+            yield [r['source_file'] for r in records], np.array([r['integrated_vector'] for r in records], dtype=float)
+        return
+
+    rng = np.random.default_rng(random_state)
+    buffer = []
+    for records in iter_cache_records(cache_files, batch_size):
+        buffer.extend(records)
+        while len(buffer) >= max(shuffle_buffer, batch_size):
+            # バッファからランダムに batch_size 件取り出す
+            picked = set(rng.choice(len(buffer), size=batch_size, replace=False).tolist())
+            batch = [buffer[i] for i in picked]
+            buffer = [r for i, r in enumerate(buffer) if i not in picked]
+            yield [r['source_file'] for r in batch], np.array([r['integrated_vector'] for r in batch], dtype=float)
+
+    order = rng.permutation(len(buffer))
+    for start in range(0, len(buffer), batch_size):
+        batch = [buffer[i] for i in order[start:start + batch_size]]
+        yield [r['source_file'] for r in batch], np.array([r['integrated_vector'] for r in batch], dtype=float)
+
+# --- ミニバッチK-means ---
+def minibatch_kmeans_algorithm(batch_source, k, metric='euclidean', weights=None, scaler=None, init='k-means++',
+                               init_size=None, max_epochs=DEFAULT_MAX_EPOCHS, tol=1e-4, random_state=42):
+    """
+    ストリーミングされるバッチからのミニバッチK-means
+
+    Args:
+        batch_source (callable): 呼ぶたびに (ファイルパスのリスト, 特徴量 (m, d)) のイテレータを返す関数（1エポック1回）
+        k: クラスター数
+        metric: 距離計算方法 ('euclidean', 'manhattan', 'cosine')
+        weights: 特徴量の重み
+        scaler (OnlineStandardScaler): 学習済みの標準化（Noneの場合は1パス目で学習）
+        init: 初期化方法 ('k-means++' または 'k-means||')
+        init_size: 初期化に使うサンプル数（Noneの場合は max(3k, 1024)）
+        max_epochs: 最大エポック数
+        tol: 1エポックでのセントロイドの最大移動量がこれ未満なら収束
+        random_state: 乱数シード
+
+    Returns:
+        tuple: (C: 標準化空間のセントロイド (k, d), counts: 各セントロイドに割り当てられた点の数, scaler)
+    """
+    rng = np.random.default_rng(random_state)
+    if init_size is None:
+        init_size = max(3 * k, 1024)
+
+    # 1パス目: 標準化の学習と初期化用サンプル（リザーバサンプリング、元のスケール）
+    fit_scaler = scaler is None
+    sample = None
+    seen = 0
+    for _, X_batch in batch_source():
+        if len(X_batch) == 0:
+            continue
+        if scaler is None:
+            scaler = OnlineStandardScaler(X_batch.shape[1])
+        if fit_scaler:
+            scaler.partial_fit(X_batch)
+        if sample is None:
+            sample = np.empty((init_size, X_batch.shape[1]))
+
+        indices = np.arange(seen, seen + len(X_batch))
+        fill = indices < init_size
+        sample[indices[fill]] = X_batch[fill]
+        slots = rng.integers(0, indices[~fill] + 1)
+        keep = slots < init_size
+        sample[slots[keep]] = X_batch[~fill][keep]
+        seen += len(X_batch)
+
+    if seen == 0:
+        raise ValueError("クラスタリングするデータがありません")
+    sample = sample[:min(seen, init_size)]
+    print(f"📊 ミニバッチK-means: {seen}件, 初期化サンプル{len(sample)}件")
+
+    C = initialize_centroids(scaler.transform(sample), k, metric, weights, method=init, random_state=random_state)
+    counts = np.zeros(k, dtype=np.int64)
+
+    # 2パス目以降: バッチごとに割り当て、セントロイドを学習率 1/N で更新
+    for epoch in range(max_epochs):
+        C_prev = C.copy()
+        for _, X_batch in batch_source():
+            if len(X_batch) == 0:
+                continue
+            X_scaled = scaler.transform(X_batch)
+            labels = assign_labels(X_scaled, C, metric, weights)
+            batch_counts = np.bincount(labels, minlength=k)
+            sums = np.zeros_like(C)
+            np.add.at(sums, labels, X_scaled)
+
+            # 1点ずつの更新 C += (x - C) / N をバッチ分まとめて行うのと同じ（割り当て済み全点の平均）
+            counts += batch_counts
+            updated = batch_counts > 0
+            C[updated] += (sums[updated] - batch_counts[updated, None] * C[updated]) / counts[updated, None]
+
+        shift = paired_dist(C_prev, C).max()
+        print(f"   🔄 エポック{epoch + 1}: セントロイドの最大移動量 {shift:.6f}")
+        if shift < tol:
+            break
+
+    return C, counts, scaler
+
+def predict_batches(batch_source, C, scaler, metric='euclidean', weights=None):
+    """
+    バッチごとに最寄りのセントロイドを割り当てる
+
+    Returns:
+        tuple: (ファイルパスのリスト, ラベル配列)
+    """
+    file_paths = []
+    labels = []
+    for paths, X_batch in batch_source():
+        if len(X_batch) == 0:
+            continue
+        file_paths.extend(paths)
+        labels.append(assign_labels(scaler.transform(X_batch), C, metric, weights))
+    return file_paths, (np.concatenate(labels) if labels else np.zeros(0, dtype=np.int64))
+
+def cluster_feature_caches(cache_files, k, batch_size=DEFAULT_BATCH_SIZE, shuffle_buffer=None, metric='euclidean',
+                           weights=FEATURE_WEIGHTS, init='k-means++', max_epochs=DEFAULT_MAX_EPOCHS, random_state=42):
+    """
+    複数の特徴量キャッシュをまとめてミニバッチK-meansでクラスタリング
+
+    Args:
+        cache_files (list): キャッシュファイル
+        k: クラスター数
+        batch_size: バッチサイズ
+        shuffle_buffer: シャッフルバッファの件数（Noneの場合はバッチサイズの16倍）
+
+    Returns:
+        dict: {'centroids'(元のスケール), 'counts', 'scaler', 'file_paths', 'labels'}
+    """
+    if shuffle_buffer is None:
+        shuffle_buffer = batch_size * 16
+    epochs = iter(range(1, max_epochs + 2))
+
+    def shuffled_batches():
+        # エポックごとに異なる順序で読む
+        return iter_cache_batches(cache_files, batch_size, shuffle_buffer, random_state=(random_state, next(epochs)))
+
+    C, counts, scaler = minibatch_kmeans_algorithm(shuffled_batches, k, metric, weights, init=init,
+                                                   max_epochs=max_epochs, random_state=random_state)
+    file_paths, labels = predict_batches(lambda: iter_cache_batches(cache_files, batch_size), C, scaler, metric, weights)
+    return {
+        'centroids': scaler.inverse_transform(C),
+        'counts': counts,
+        'scaler': scaler,
+        'file_paths': file_paths,
+        'labels': labels
+    }
+
+def main(cache_pattern, k, batch_size=DEFAULT_BATCH_SIZE, max_epochs=DEFAULT_MAX_EPOCHS, init='k-means++', output_file=None):
+    """
+    キャッシュをまとめてクラスタリングし、ハンガリアン法でパターンと対応付けて結果を保存
+
+    Args:
+        cache_pattern (str): キャッシュファイルのglobパターン（例: "feature_cache_submissions_typical90_*.sqlite"）
+        k (int): クラスター数
+        batch_size (int): バッチサイズ
+        max_epochs (int): 最大エポック数
+        init (str): 初期化方法
+        output_file (str): 結果の保存先（Noneの場合は minibatch_kmeans_<日時>.json）
+    """
+    cache_files = sorted(glob.glob(cache_pattern))
+    if not cache_files:
+        print(f"❌ キャッシュが見つかりません: {cache_pattern}")
+        return None
+    print(f"📂 キャッシュ: {len(cache_files)}ファイル")
+
+    result = cluster_feature_caches(cache_files, k, batch_size=batch_size, init=init, max_epochs=max_epochs)
+    labels = result['labels']
+
+    assignment_dict, _, _, _, assignment_score = hungarian_cluster_pattern_assignment(labels, result['file_paths'])
+    if assignment_dict:
+        print(f"🎯 ハンガリアン法による対応付け: {assignment_score}/{len(labels)} ファイル一致")
+
+    if output_file is None:
+        output_file = f"minibatch_kmeans_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    scaler = result['scaler']
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'cache_files': cache_files,
+        'k': k,
+        'batch_size': batch_size,
+        'total_files': len(labels),
+        'centroids': result['centroids'].tolist(),
+        'counts': result['counts'].tolist(),
+        'scaler': {'n_samples': scaler.n_samples, 'mean': scaler.mean.tolist(), 'std': scaler.std.tolist()},
+        'cluster_pattern_assignment': {str(c): p for c, p in (assignment_dict or {}).items()},
+        'assignment_score': int(assignment_score),
+        'labels': {path: int(label) for path, label in zip(result['file_paths'], labels)}
+    }
+    tmp_file = f"{output_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_file, output_file)
+    print(f"💾 結果保存: '{output_file}'")
+    return report
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="特徴量キャッシュをまとめてミニバッチK-meansでクラスタリング")
+    parser.add_argument('cache_pattern', nargs='?', default="feature_cache_submissions_typical90_*.json",
+                        help="キャッシュファイルのglobパターン")
+    parser.add_argument('--k', type=int, default=16, help="クラスター数")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="バッチサイズ")
+    parser.add_argument('--epochs', type=int, default=DEFAULT_MAX_EPOCHS, help="最大エポック数")
+    parser.add_argument('--init', choices=['k-means++', 'k-means||'], default='k-means++', help="初期化方法")
+    parser.add_argument('--output', default=None, help="結果の保存先JSON")
+    args = parser.parse_args()
+
+    main(args.cache_pattern, args.k, args.batch_size, args.epochs, args.init, args.output)
@@ -0,0 +1,69 @@
+# 1ファイル分の解析セッション
+# parse_source / fast_cfgs_from_source をファイルごとに1回だけ実行し、
+# CFG特徴量（ext_cfg_feature.py）とデータフロー特徴量（ext_feature_data_flow.py）で共有する
+
+from pyjoern import parse_source, fast_cfgs_from_source
+
+from pipeline_profiler import stage
+
+
+class ParsedProgram:
+    """
+    1ファイル分のJoernフロントエンド解析結果を保持するセッション
+
+    各フロントエンドは最初にアクセスされた時点で1回だけ実行され、
+    以降は同じ結果（失敗した場合は同じ例外）を返す
+    """
+    def __init__(self, source_file):
+        self.source_file = source_file
+        self._source_code = None
+        self._functions = None
+        self._functions_error = None
+        self._cfgs = None
+        self._cfgs_error = None
+
+    @property
+    def source_code(self):
+        """ソースコード文字列（読み込み失敗時は空文字列）"""
+        if self._source_code is None:
+            try:
+                with open(self.source_file, 'r', encoding='utf-8') as f:
+                    self._source_code = f.read()
+            except Exception as e:
+                print(f"読み込みエラー: {e}")
+                self._source_code = ""
+        return self._source_code
+
+    @property
+    def functions(self):
+        """parse_source() の結果 {関数名: Function}"""
+        if self._functions is None and self._functions_error is None:
+            try:
+                with stage('joern_parse_source'):
+                    self._functions = parse_source(self.source_file)
+            except Exception as e:
+                self._functions_error = e
+        if self._functions_error is not None:
+            raise self._functions_error
+        return self._functions
+
+    @property
+    def cfgs(self):
+        """fast_cfgs_from_source() の結果 {CFG名: nx.DiGraph}"""
+        if self._cfgs is None and self._cfgs_error is None:
+            try:
+                with stage('joern_fast_cfgs'):
+                    self._cfgs = fast_cfgs_from_source(self.source_file)
+            except Exception as e:
+                self._cfgs_error = e
+        if self._cfgs_error is not None:
+            raise self._cfgs_error
+        return self._cfgs
+
+    def module_cfg(self):
+        """<module> CFGを返す（エスケープされた形式も考慮、見つからなければNone）"""
+        cfgs = self.cfgs or {}
+        for cfg_name in ['<module>', '&lt;module&gt;']:
+            if cfg_name in cfgs:
+                return cfgs[cfg_name]
+        return None
@@ -0,0 +1,304 @@
+# 特徴量抽出パイプラインの段階別計測
+# - ファイルごとに段階（Joernの解析・サイクル数・パス数・データフロー集計など）の所要時間と
+#   カウンタ（CFGのノード数・辺数・パス数・サイクル数など）を記録する
+# - 段階は入れ子にでき、記録するのは各段階の自分だけの時間（子の段階を除く）なので、
+#   1ファイルの段階の合計 = そのファイルの処理時間 になる
+# - 計測が無効の場合 stage() / count() はほぼ何もしない
+# - 並列抽出（JoernWorkerPool）では環境変数 PYJOERN_PROFILE_DIR のディレクトリに
+#   プロセスごとのJSON Linesで書き出し、親プロセスで集計する
+#
+# 使用例:
+#   with profile_file(source_file):
+#       with stage('cfg_paths'):
+#           ...
+#       count('cfg_nodes', cfg.number_of_nodes())
+
+import os
+import json
+import math
+import time
+import threading
+from datetime import datetime
+
+PROFILE_DIR_ENV = 'PYJOERN_PROFILE_DIR'
+
+_state = threading.local()
+_collector = None
+
+class FileProfile:
+    """1ファイル分の計測結果"""
+    def __init__(self, source_file):
+        self.source_file = source_file
+        self.stages = {}    # 段階名 -> 秒（子の段階を除く）
+        self.counters = {}  # カウンタ名 -> 値
+        self.total = 0.0
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        return {
+            'source_file': self.source_file,
+            'total': self.total,
+            'stages': self.stages,
+            'counters': self.counters
+        }
+
+class ProfileCollector:
+    """このプロセスで計測したファイルごとの結果と、ファイルに属さない段階（キャッシュ保存など）"""
+    def __init__(self):
+        self.records = []
+        self.run_profile = FileProfile(None)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record.to_dict())
+
+def enable_profiling():
+    """このプロセスでの計測を有効にする（既に有効なら同じコレクタを返す）"""
+    global _collector
+    if _collector is None:
+        _collector = ProfileCollector()
+    return _collector
+
+def disable_profiling():
+    """計測を無効にし、それまでのコレクタを返す"""
+    global _collector
+    collector, _collector = _collector, None
+    return collector
+
+def profiling_enabled():
+    return _collector is not None or bool(os.environ.get(PROFILE_DIR_ENV))
+
+def _frames():
+    frames = getattr(_state, 'frames', None)
+    if frames is None:
+        frames = _state.frames = []
+    return frames
+
+def _current_profile():
+    frames = getattr(_state, 'frames', None)
+    if frames:
+        return frames[-1].profile
+    if _collector is not None:
+        return _collector.run_profile
+    return None
+
+class _Frame:
+    """計測中の段階（子の段階の時間を差し引くために保持）"""
+    __slots__ = ('profile', 'name', 'start', 'children')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+        self.start = time.perf_counter()
+        self.children = 0.0
+
+class stage:
+    """
+    段階の所要時間を計測するコンテキストマネージャ（計測が無効なら何もしない）
+
+    Args:
+        name (str): 段階名（例: 'joern_parse_source', 'cfg_paths', 'dataflow_counting'）
+    """
+    __slots__ = ('name', '_frame')
+
+    def __init__(self, name):
+        self.name = name
+        self._frame = None
+
+    def __enter__(self):
+        profile = _current_profile()
+        if profile is not None:
+            self._frame = _Frame(profile, self.name)
+            _frames().append(self._frame)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        frame = self._frame
+        if frame is None:
+            return False
+        elapsed = time.perf_counter() - frame.start
+        frames = _frames()
+        frames.pop()
+        frame.profile.add_stage(frame.name, elapsed - frame.children)
+        if frames:
+            frames[-1].children += elapsed
+        self._frame = None
+        return False
+
+def count(name, value=1):
+    """計測中のファイルのカウンタに加算（計測が無効なら何もしない）"""
+    profile = _current_profile()
+    if profile is not None:
+        profile.add_count(name, value)
+
+class profile_file:
+    """
+    1ファイル分の計測範囲（この中の stage() / count() がそのファイルに記録される）
+
+    計測が無効な場合は何もしない。終了時にコレクタ（enable_profiling）と
+    PYJOERN_PROFILE_DIR のJSON Linesファイルに結果を渡す
+    """
+    __slots__ = ('source_file', '_profile', '_saved', '_start')
+
+    def __init__(self, source_file):
+        self.source_file = source_file
+        self._profile = None
+
+    def __enter__(self):
+        if not profiling_enabled():
+            return self
+        self._profile = FileProfile(self.source_file)
+        self._saved = getattr(_state, 'frames', None)
+        _state.frames = [_Frame(self._profile, 'other')]
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        profile = self._profile
+        if profile is None:
+            return False
+        root = _state.frames[0]
+        profile.total = time.perf_counter() - self._start
+        other = profile.total - root.children
+        if other > 0:
+            profile.add_stage('other', other)
+        _state.frames = self._saved
+        self._profile = None
+
+        # PYJOERN_PROFILE_DIR があればそちらにだけ書き出す（親プロセスで全ワーカー分をまとめて読む）
+        profile_dir = os.environ.get(PROFILE_DIR_ENV)
+        if profile_dir:
+            _append_record(profile_dir, profile)
+        elif _collector is not None:
+            _collector.add(profile)
+        return False
+
+def _append_record(profile_dir, profile):
+    try:
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"profile_{os.getpid()}.jsonl")
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(profile.to_dict(), ensure_ascii=False) + '\n')
+    except OSError as e:
+        print(f"⚠️ 計測結果の書き出しエラー: {e}")
+
+def load_profile_records(profile_dir):
+    """PYJOERN_PROFILE_DIR に書き出された全プロセスの計測結果を読み込む"""
+    records = []
+    if not profile_dir or not os.path.isdir(profile_dir):
+        return records
+    for name in sorted(os.listdir(profile_dir)):
+        if not name.endswith('.jsonl'):
+            continue
+        with open(os.path.join(profile_dir, name), 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    return records
+
+def _percentile(sorted_values, q):
+    """最近傍順位法のパーセンタイル（sorted_values は昇順）"""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+def summarize(records, top_n=10):
+    """
+    ファイルごとの計測結果を集計
+
+    Args:
+        records (list): FileProfile.to_dict() のリスト
+        top_n (int): 最も遅いファイルをいくつ残すか
+
+    Returns:
+        dict: {'files', 'total_seconds', 'stages': {段階: {count, total, p50, p95, max}},
+               'counters': {カウンタ: {total, max}}, 'slowest_files': [...]}
+    """
+    stage_values = {}
+    counter_totals = {}
+    counter_max = {}
+    for record in records:
+        for name, seconds in record['stages'].items():
+            stage_values.setdefault(name, []).append(seconds)
+        for name, value in record['counters'].items():
+            counter_totals[name] = counter_totals.get(name, 0) + value
+            counter_max[name] = max(counter_max.get(name, value), value)
+
+    stages = {}
+    for name, values in stage_values.items():
+        values.sort()
+        stages[name] = {
+            'count': len(values),
+            'total': sum(values),
+            'p50': _percentile(values, 50),
+            'p95': _percentile(values, 95),
+            'max': values[-1]
+        }
+    stages = dict(sorted(stages.items(), key=lambda item: item[1]['total'], reverse=True))
+
+    slowest = sorted(records, key=lambda record: record['total'], reverse=True)[:top_n]
+    slowest_files = []
+    for record in slowest:
+        top_stage = max(record['stages'].items(), key=lambda item: item[1], default=(None, 0.0))
+        slowest_files.append({
+            'source_file': record['source_file'],
+            'total': record['total'],
+            'slowest_stage': top_stage[0],
+            'slowest_stage_seconds': top_stage[1],
+            'counters': record['counters']
+        })
+
+    return {
+        'files': len(records),
+        'total_seconds': sum(record['total'] for record in records),
+        'stages': stages,
+        'counters': {name: {'total': counter_totals[name], 'max': counter_max[name]} for name in counter_totals},
+        'slowest_files': slowest_files
+    }
+
+def print_summary(summary):
+    """集計結果を表示"""
+    print(f"⏱️ 段階別計測: {summary['files']}ファイル, 合計{summary['total_seconds']:.2f}秒")
+    for name, values in summary['stages'].items():
+        print(f"   {name:<24} 合計{values['total']:8.3f}秒  p50 {values['p50'] * 1000:8.1f}ms  "
+              f"p95 {values['p95'] * 1000:8.1f}ms  max {values['max'] * 1000:8.1f}ms")
+    for name, values in summary['counters'].items():
+        print(f"   {name:<24} 合計{values['total']}  最大{values['max']}")
+    for record in summary['slowest_files'][:5]:
+        print(f"   🐢 {record['source_file']}: {record['total']:.2f}秒 "
+              f"({record['slowest_stage']} {record['slowest_stage_seconds']:.2f}秒)")
+
+def save_report(records, report_file, run_stages=None, top_n=10):
+    """
+    計測結果をJSONで保存（集計 + ファイルごとの記録）
+
+    Args:
+        records (list): FileProfile.to_dict() のリスト
+        report_file (str): 出力ファイル
+        run_stages (dict): ファイルに属さない段階の時間（キャッシュ保存など）
+        top_n (int): 最も遅いファイルをいくつ残すか
+
+    Returns:
+        dict: 集計結果
+    """
+    summary = summarize(records, top_n)
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'summary': summary,
+        'run_stages': run_stages or {},
+        'records': records
+    }
+    tmp_file = f"{report_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_file, report_file)
+    print(f"💾 計測レポート保存: '{report_file}'")
+    return summary
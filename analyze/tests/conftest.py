@@ -0,0 +1,10 @@
+# analyze/ 以下のモジュールはスクリプトとして実行される前提で、同じディレクトリからの
+# 相対インポート（from cfg_arrays import ... など）を使っているため、各ディレクトリを検索パスに入れる
+import os
+import sys
+
+_ANALYZE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _subdir in ('', 'control-flow', 'data-flow'):
+    _path = os.path.join(_ANALYZE_DIR, _subdir)
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
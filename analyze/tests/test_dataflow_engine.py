@@ -0,0 +1,153 @@
+# dataflow_engine.analyze_function_dataflow（1回の字句解析で数えるエンジン）と
+# ext_feature_data_flow.py の従来の変数ごとの正規表現による数え方の一致テスト
+# pyjoernの関数オブジェクトの代わりに、ステートメント文字列を持つノードのグラフを生成して比較する
+# 実行: python -m pytest analyze/tests
+
+import random
+from types import SimpleNamespace
+
+import networkx as nx
+import pytest
+
+from dataflow_engine import analyze_function_dataflow, analyze_function_dataflow_legacy
+from ext_feature_data_flow import analyze_variables_from_statements
+
+class FakeNode:
+    """pyjoernのASTノードの代わり（statements は str() でステートメント文字列になるもの）"""
+    def __init__(self, addr, statements):
+        self.addr = addr
+        self.statements = statements
+
+    def __repr__(self):
+        return f"<Node {self.addr}>"
+
+def make_function(nodes):
+    """[(addr, [ステートメント文字列, ...]), ...] から関数オブジェクトを作る"""
+    ast = nx.DiGraph()
+    previous = None
+    for addr, statements in nodes:
+        node = FakeNode(addr, statements)
+        ast.add_node(node)
+        if previous is not None:
+            ast.add_edge(previous, node)
+        previous = node
+    return SimpleNamespace(ast=ast)
+
+def assert_parity(func_obj):
+    var_analysis = analyze_variables_from_statements(func_obj)
+    expected = analyze_function_dataflow_legacy(func_obj, var_analysis)
+    actual = analyze_function_dataflow(func_obj, var_analysis)
+    assert actual[0] == expected[0], "複合代入が一致しない"
+    assert actual[1] == expected[1], "読み込み数が一致しない"
+    assert actual[2] == expected[2], "書き込み数が一致しない"
+    return var_analysis, actual
+
+# pyjoernが実際に出力する形のステートメントで書いた関数
+HANDWRITTEN_FUNCTIONS = {
+    # def solve(n, a): ans = 0; for i in range(n): ans += a[i]; return ans
+    'for_loop_sum': [
+        (1, ['<UnsupportedStmt: (PARAM,n)<SUB>1</SUB>>', '<UnsupportedStmt: PARAM,a:list>']),
+        (2, ['<UnsupportedStmt: LOCAL,ans:ANY>', '<UnsupportedStmt: LOCAL,i:ANY>',
+             '<UnsupportedStmt: LOCAL,tmp0:ANY>']),
+        (3, ['ans = 0']),
+        (4, ['<UnsupportedStmt: CONTROL_STRUCTURE,FOR,for i in range(n)>', 'tmp0 = range(n).__iter__()']),
+        (5, ['i = tmp0.__next__()', '<UnsupportedStmt: __next__,tmp0.__next__()>']),
+        (6, ['ans += a[i]', '<UnsupportedStmt: IDENTIFIER,ans,ans>']),
+        (7, ['return ans']),
+    ],
+    # def f(x): while x > 0: x //= 2; y = x; print(y)
+    'while_loop': [
+        (1, ['<UnsupportedStmt: PARAM,x:int>']),
+        (2, ['<UnsupportedStmt: LOCAL,y:ANY>', '<UnsupportedStmt: LOCAL,print:ANY>']),
+        (3, ['<UnsupportedStmt: CONTROL_STRUCTURE,WHILE,while x > 0>', 'x > 0']),
+        (4, ['x //= 2', 'y = x']),
+        (5, ['print(y)', '<UnsupportedStmt: TYPE_REF,__builtins__.print,__builtins__.print>']),
+    ],
+    # 同じアドレスに複数のノード・ループ変数の重複した書き込み・名前の前方一致
+    'shared_addresses': [
+        (1, ['<UnsupportedStmt: (PARAM,xs)<SUB>1</SUB>>']),
+        (2, ['<UnsupportedStmt: LOCAL,x:ANY>', '<UnsupportedStmt: LOCAL,x1:ANY>']),
+        (3, ['for x in xs', 'x = tmp1.__next__()']),
+        (3, ['x = tmp1.__next__()', 'x1 = x + 1']),
+        (4, ['xs[x] = x1', 'x1 == x', 'x1)']),
+    ],
+    # 変数のない関数（どちらも空の結果を返す）
+    'no_variables': [
+        (1, ['print(1)']),
+    ],
+}
+
+# ランダム生成に使う変数名（大文字小文字違い・前方/後方一致・組み込み名を含む）
+PARAMETER_NAMES = ['n', 'a', 'xs', 'N']
+LOCAL_NAMES = ['i', 'I', 'x', 'x1', 'ix', 'ans', 'total', 'tmp0', 'len']
+OPERATORS = ['+=', '-=', '*=', '/=', '//=', '%=', '**=', '&=', '|=', '^=', '<<=', '>>=']
+
+STATEMENT_TEMPLATES = [
+    '{v} = {w} + {k}',
+    '{v}={w}*{k}',
+    '{v} {op} {w}',
+    '{v}{op}{k}',
+    '{v} == {w}',
+    '{v} != {w}',
+    '{v} <= {w}',
+    'for {v} in range({w})',
+    'FOR {v} IN range({w})',
+    'for {v} in {w}',
+    '<UnsupportedStmt: CONTROL_STRUCTURE,FOR,for {v} in range({w})>',
+    'CONTROL_STRUCTURE,FOR,{v}',
+    '<UnsupportedStmt: CONTROL_STRUCTURE,IF,if {v} > {w}>',
+    'tmp{k} = range({w})',
+    'tmp{k} = {w}.__iter__()',
+    '{v} = tmp{k}.__next__()',
+    '<UnsupportedStmt: __next__,tmp{k}.__next__()>',
+    '<UnsupportedStmt: IDENTIFIER,{v},{v}>',
+    '<UnsupportedStmt: LITERAL,{k},{k}>',
+    '<UnsupportedStmt: BLOCK,{v} = {w}>',
+    '<UnsupportedStmt: {v} {op} {k}>',
+    '<UnsupportedStmt: for {v} in {w}>',
+    '{v}[{w}] = {k}',
+    '{v}.append({w})',
+    'ans = max(ans, {v} * {w})',
+    'print({v}, {w})',
+    '{v})',
+    'return {v}',
+    'pre{v} = {w}',
+    '{v}_{w} {op} 1',
+]
+
+def random_function(rng):
+    """パラメータ・LOCAL定義と、テンプレートから作ったステートメントを持つ関数"""
+    parameters = rng.sample(PARAMETER_NAMES, rng.randint(0, 2))
+    local_names = rng.sample(LOCAL_NAMES, rng.randint(0, 5))
+    names = parameters + local_names + ['y']  # y は定義されていない変数
+
+    nodes = [(1, [rng.choice(['<UnsupportedStmt: (PARAM,{})<SUB>1</SUB>>', '<UnsupportedStmt: PARAM,{}:int>']).format(p)
+                  for p in parameters])]
+    nodes.append((2, [f'<UnsupportedStmt: LOCAL,{v}:ANY>' for v in local_names]))
+    for _ in range(rng.randint(1, 8)):
+        addr = rng.randint(3, 8)  # 同じアドレスを持つノードを作る
+        statements = []
+        for _ in range(rng.randint(0, 4)):
+            template = rng.choice(STATEMENT_TEMPLATES)
+            statements.append(template.format(
+                v=rng.choice(names), w=rng.choice(names), k=rng.randint(0, 2), op=rng.choice(OPERATORS)
+            ))
+        nodes.append((addr, statements))
+    return make_function(nodes)
+
+@pytest.mark.parametrize('name', sorted(HANDWRITTEN_FUNCTIONS))
+def test_handwritten_functions(name):
+    assert_parity(make_function(HANDWRITTEN_FUNCTIONS[name]))
+
+@pytest.mark.parametrize('seed', range(300))
+def test_random_functions(seed):
+    assert_parity(random_function(random.Random(seed)))
+
+def test_for_loop_counts():
+    """エンジン自体の値（従来と一致するだけでなく、想定どおりの値か）"""
+    var_analysis, (compound, reads, writes) = assert_parity(make_function(HANDWRITTEN_FUNCTIONS['for_loop_sum']))
+    assert var_analysis['parameters'] == {'n', 'a'}
+    assert var_analysis['local_vars'] == {'ans', 'i'}
+    assert [info['operator'] for info in compound['ans']] == ['+=']
+    assert reads == {'n': 0, 'a': 1, 'ans': 3, 'i': 1}
+    assert writes == {'n': 1, 'a': 1, 'ans': 2, 'i': 2}
@@ -0,0 +1,198 @@
+# count_all_paths（cfg_arrays.py の計数版）と collect_all_paths（列挙版）の件数の回帰テスト
+# 生成した小さなCFG（ネストしたループ・break/continue・自己ループ・ランダムなグラフ）で、
+# 全エントリー/出口の組のパス数が一致することを確認する
+# 実行: python -m pytest analyze/tests
+
+import random
+
+import networkx as nx
+import pytest
+
+import cfg_arrays
+from cfg_arrays import CFGArrays
+from path_dfs import collect_all_paths, count_all_paths, path_count_mismatches
+
+# 列挙版が現実的な時間で終わるパス数の上限（これを超えるケースは列挙しない）
+MAX_ENUMERATED_PATHS = 20000
+
+class FakeBlock:
+    """pyjoernのブロックの代わり（ハッシュは同一性ベース）"""
+    def __init__(self, addr):
+        self.addr = addr
+        self._is_entrypoint = False
+        self._is_exitpoint = False
+
+    def __repr__(self):
+        return f"<Block {self.addr}>"
+
+class StructuredCFGBuilder:
+    """
+    構造化プログラム（文・if・while・break・continue）からCFGを作る
+
+    プログラムはリストで表す:
+        's'                      -- 単文
+        ('if', then, else_)      -- else_ が None なら else なし
+        ('while', body)          -- ループヘッダがそのまま条件判定ノード
+        'break' / 'continue'     -- 直近の while に対して
+    """
+    def __init__(self):
+        self.cfg = nx.DiGraph()
+
+    def new_node(self, preds):
+        node = FakeBlock(self.cfg.number_of_nodes())
+        self.cfg.add_node(node)
+        for pred in preds:
+            self.cfg.add_edge(pred, node)
+        return node
+
+    def block(self, stmts, preds, loop):
+        for stmt in stmts:
+            preds = self.stmt(stmt, preds, loop)
+        return preds
+
+    def stmt(self, stmt, preds, loop):
+        if stmt == 'break':
+            loop['breaks'].extend(preds)
+            return []
+        if stmt == 'continue':
+            for pred in preds:
+                self.cfg.add_edge(pred, loop['header'])
+            return []
+
+        node = self.new_node(preds)
+        if stmt == 's':
+            return [node]
+        if stmt[0] == 'if':
+            then_exits = self.block(stmt[1], [node], loop)
+            else_exits = self.block(stmt[2], [node], loop) if stmt[2] is not None else [node]
+            return then_exits + else_exits
+        if stmt[0] == 'while':
+            inner = {'header': node, 'breaks': []}
+            for pred in self.block(stmt[1], [node], inner):
+                self.cfg.add_edge(pred, node)
+            return [node] + inner['breaks']
+        raise ValueError(f"未知の文: {stmt!r}")
+
+def build_structured_cfg(program):
+    """プログラムからCFGを作り、先頭を_is_entrypoint・末尾を_is_exitpointにする"""
+    builder = StructuredCFGBuilder()
+    entry = builder.new_node([])
+    exit_node = builder.new_node(builder.block(program, [entry], None))
+    entry._is_entrypoint = True
+    exit_node._is_exitpoint = True
+    return builder.cfg
+
+def random_program(rng, depth, in_loop, max_stmts=3):
+    """ランダムな構造化プログラム（depth はネストの残り段数）"""
+    program = []
+    for _ in range(rng.randint(1, max_stmts)):
+        choices = ['s', 's']
+        if depth > 0:
+            choices += ['if', 'while']
+        if in_loop:
+            choices += ['break', 'continue']
+        kind = rng.choice(choices)
+        if kind == 'if':
+            else_ = random_program(rng, depth - 1, in_loop, 2) if rng.random() < 0.5 else None
+            program.append(('if', random_program(rng, depth - 1, in_loop, 2), else_))
+        elif kind == 'while':
+            program.append(('while', random_program(rng, depth - 1, True, 2)))
+        else:
+            program.append(kind)
+        if kind in ('break', 'continue'):
+            break
+    return program
+
+def random_digraph(rng, num_nodes, num_edges):
+    """自己ループ・還元不可能なループを含みうるランダムな有向グラフ"""
+    nodes = [FakeBlock(i) for i in range(num_nodes)]
+    cfg = nx.DiGraph()
+    cfg.add_nodes_from(nodes)
+    for _ in range(num_edges):
+        cfg.add_edge(rng.choice(nodes), rng.choice(nodes))
+    nodes[0]._is_entrypoint = True
+    nodes[-1]._is_exitpoint = True
+    return cfg
+
+# 手で書いたループ構造（ネストしたSCC・複数の出口・break/continue）
+HANDWRITTEN_PROGRAMS = {
+    'single_loop': [('while', ['s'])],
+    'loop_with_branch': [('while', [('if', ['s'], ['s'])])],
+    'nested_loops': [('while', [('while', ['s']), 's'])],
+    'triple_nested_loops': [('while', [('while', [('while', ['s'])])])],
+    'sibling_loops_in_loop': [('while', [('while', ['s']), ('while', ['s'])])],
+    'break_and_continue': [('while', [('if', ['break'], None), ('if', ['continue'], ['s']), 's'])],
+    'nested_break': [('while', [('while', [('if', ['break'], ['s'])]), ('if', ['break'], None)])],
+    'loops_in_sequence': [('while', ['s']), ('if', [('while', ['s'])], ['s']), ('while', ['s'])],
+}
+
+def self_loop_cfg():
+    """自己ループと、ループ内に入れ子になった2ノードのSCC"""
+    a, b, c, d, e = (FakeBlock(i) for i in range(5))
+    cfg = nx.DiGraph([(a, b), (b, b), (b, c), (c, d), (d, c), (d, b), (d, e)])
+    a._is_entrypoint = True
+    e._is_exitpoint = True
+    return cfg
+
+def irreducible_cfg():
+    """2つの入口を持つループ（還元不可能なCFG）と、途中の出口"""
+    a, b, c, d, e = (FakeBlock(i) for i in range(5))
+    cfg = nx.DiGraph([(a, b), (a, c), (b, c), (c, b), (b, d), (c, e)])
+    a._is_entrypoint = True
+    d._is_exitpoint = True
+    e._is_exitpoint = True
+    return cfg
+
+def assert_counts_match(cfg, max_visits):
+    """全エントリー/出口の組で件数が一致することを確認（列挙が大きすぎる組は飛ばす）"""
+    arrays = CFGArrays.from_cfg(cfg)
+    index = {node: i for i, node in enumerate(arrays.nodes)}
+    entries, exits = arrays.entry_exit_nodes()
+    compared = 0
+    for entry in entries.tolist():
+        for exit_node in exits.tolist():
+            actual = cfg_arrays.count_all_paths(arrays, entry, exit_node, max_visits=max_visits)
+            if actual > MAX_ENUMERATED_PATHS:
+                continue
+            start, end = arrays.nodes[entry], arrays.nodes[exit_node]
+            expected = len(collect_all_paths(cfg, start, end, max_visits=max_visits))
+            assert actual == expected, f"{start} -> {end} (max_visits={max_visits}): 計数={actual}, 列挙={expected}"
+            assert count_all_paths(cfg, start, end, max_visits=max_visits) == expected
+            compared += 1
+    assert compared > 0
+
+@pytest.mark.parametrize('max_visits', [1, 2, 3])
+@pytest.mark.parametrize('name', sorted(HANDWRITTEN_PROGRAMS))
+def test_handwritten_loops(name, max_visits):
+    assert_counts_match(build_structured_cfg(HANDWRITTEN_PROGRAMS[name]), max_visits)
+
+@pytest.mark.parametrize('max_visits', [1, 2, 3])
+@pytest.mark.parametrize('make_cfg', [self_loop_cfg, irreducible_cfg])
+def test_special_cycles(make_cfg, max_visits):
+    assert_counts_match(make_cfg(), max_visits)
+
+@pytest.mark.parametrize('max_visits', [1, 2])
+@pytest.mark.parametrize('seed', range(40))
+def test_random_structured_programs(seed, max_visits):
+    rng = random.Random(seed)
+    program = random_program(rng, depth=3, in_loop=False)
+    assert_counts_match(build_structured_cfg(program), max_visits)
+
+@pytest.mark.parametrize('max_visits', [1, 2])
+@pytest.mark.parametrize('seed', range(40))
+def test_random_digraphs(seed, max_visits):
+    rng = random.Random(seed)
+    num_nodes = rng.randint(2, 7)
+    assert_counts_match(random_digraph(rng, num_nodes, rng.randint(num_nodes, 2 * num_nodes)), max_visits)
+
+def test_path_count_mismatches_reports_nothing_for_nested_loops():
+    cfg = build_structured_cfg(HANDWRITTEN_PROGRAMS['nested_break'])
+    assert path_count_mismatches(cfg, max_visits=2) == []
+
+def test_edge_cases():
+    cfg = build_structured_cfg(HANDWRITTEN_PROGRAMS['single_loop'])
+    entry = next(node for node in cfg if node._is_entrypoint)
+    exit_node = next(node for node in cfg if node._is_exitpoint)
+    assert count_all_paths(cfg, entry, entry) == 1
+    assert count_all_paths(cfg, entry, exit_node, max_visits=0) == 0
+    assert count_all_paths(cfg, exit_node, entry) == len(collect_all_paths(cfg, exit_node, entry)) == 0
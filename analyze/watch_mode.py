@@ -0,0 +1,358 @@
+# 提出ディレクトリの監視モード（新しい提出が届くたびに増分抽出・オンライン割り当て）
+# - inotify（inotify_simple がある場合）でファイルの書き込み完了・移動・削除を監視し、
+#   なければ os.scandir の定期走査（file_scanner.scan_files）で変更を検出する
+# - イベントはデバウンスしてまとめ、静かになってから1回だけ処理する
+# - 新規・変更ファイルだけを update_cache_incrementally で抽出してキャッシュを更新する
+# - クラスタ割り当ては OnlineClusterModel でオンラインに更新する（コーパス全体は再処理しない）
+#   新規ファイル: 最も近いクラスタに追加（セントロイドを 1/N で更新）
+#   変更ファイル: 既存の寄与を取り除けないため、割り当てのみ更新（モデルは変更しない）
+#   削除ファイル: 割り当てから除く
+
+import os
+import json
+import time
+from datetime import datetime
+
+try:
+    import inotify_simple
+    INOTIFY_AVAILABLE = True
+except ImportError:
+    INOTIFY_AVAILABLE = False
+
+from file_scanner import DEFAULT_EXTENSIONS, scan_files
+from ext_cfg_dfg_feature import (
+    detect_file_changes,
+    update_cache_incrementally,
+    save_feature_vectors,
+    load_feature_vectors,
+    analyze_file_groups,
+    open_feature_store
+)
+from feature_cache_db import is_sqlite_cache
+from cluster_service import OnlineClusterModel, DEFAULT_MAX_CLUSTERS
+
+DEFAULT_DEBOUNCE = 2.0       # 最後のイベントからこの秒数だけ静かになったら処理
+DEFAULT_MAX_DELAY = 30.0     # イベントが続いても最初のイベントからこの秒数で処理
+DEFAULT_POLL_INTERVAL = 2.0  # ポーリング時の走査間隔（秒）
+
+def _has_extension(path, file_extensions):
+    return os.path.splitext(path)[1].lower() in file_extensions
+
+class PollingWatcher:
+    """定期的にディレクトリを走査して変更されたパスを返す（inotifyがない環境用）"""
+    def __init__(self, directory, file_extensions=DEFAULT_EXTENSIONS, interval=DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.file_extensions = file_extensions
+        self.interval = interval
+        self._previous = scan_files(directory, file_extensions)
+
+    def wait(self, timeout):
+        """
+        変更を待つ
+
+        Args:
+            timeout (float): 最大待ち時間（秒）
+
+        Returns:
+            set: 変更（追加・更新・削除）されたファイルパス
+        """
+        time.sleep(min(timeout, self.interval))
+        current = scan_files(self.directory, self.file_extensions)
+        changed = {path for path, stat in current.items() if self._previous.get(path) != stat}
+        changed.update(path for path in self._previous if path not in current)
+        self._previous = current
+        return changed
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """inotifyでディレクトリ以下を監視（新しいサブディレクトリにも監視を追加）"""
+    def __init__(self, directory, file_extensions=DEFAULT_EXTENSIONS):
+        flags = inotify_simple.flags
+        self.file_extensions = tuple(ext.lower() for ext in file_extensions)
+        self._mask = (flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM |
+                      flags.DELETE | flags.CREATE | flags.ATTRIB)
+        self._inotify = inotify_simple.INotify()
+        self._paths = {}  # watch descriptor -> ディレクトリ
+        self._add_tree(directory)
+
+    def _add_tree(self, directory):
+        """directory以下の全ディレクトリを監視に追加し、既に存在する対象ファイルを返す"""
+        existing = set()
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            try:
+                wd = self._inotify.add_watch(current, self._mask)
+                self._paths[wd] = current
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.name.startswith('.'):
+                            continue
+                        if entry.is_dir():
+                            stack.append(entry.path)
+                        elif _has_extension(entry.name, self.file_extensions):
+                            existing.add(entry.path)
+            except OSError as e:
+                print(f"⚠️ 監視追加エラー {current}: {e}")
+        return existing
+
+    def wait(self, timeout):
+        """変更されたファイルパスの集合を返す（timeout秒でイベントがなければ空集合）"""
+        flags = inotify_simple.flags
+        changed = set()
+        for event in self._inotify.read(timeout=int(timeout * 1000)):
+            directory = self._paths.get(event.wd)
+            if directory is None or not event.name or event.name.startswith('.'):
+                continue
+            path = os.path.join(directory, event.name)
+            if event.mask & flags.ISDIR:
+                if event.mask & (flags.CREATE | flags.MOVED_TO):
+                    # 新しいディレクトリ: 監視を追加し、監視開始前に置かれたファイルも拾う
+                    changed.update(self._add_tree(path))
+                continue
+            if _has_extension(event.name, self.file_extensions):
+                changed.add(path)
+        return changed
+
+    def close(self):
+        self._inotify.close()
+
+def open_watcher(directory, file_extensions=DEFAULT_EXTENSIONS, poll_interval=DEFAULT_POLL_INTERVAL, polling=False):
+    """inotifyが使えればInotifyWatcher、なければPollingWatcherを返す"""
+    if INOTIFY_AVAILABLE and not polling:
+        try:
+            watcher = InotifyWatcher(directory, file_extensions)
+            print("👀 inotifyで監視")
+            return watcher
+        except OSError as e:
+            print(f"⚠️ inotifyを使えません（ポーリングで監視）: {e}")
+    print(f"👀 ポーリングで監視（{poll_interval}秒間隔）")
+    return PollingWatcher(directory, file_extensions, poll_interval)
+
+class WatchSession:
+    """
+    監視対象ディレクトリ・特徴量キャッシュ・クラスタリングモデルをまとめた監視セッション
+    """
+    def __init__(self, target_directory, cache_file=None, cache_format='json', model_file=None,
+                 k=DEFAULT_MAX_CLUSTERS, pool=None, workers=None, store=None):
+        """
+        Args:
+            target_directory (str): 監視する提出ディレクトリ
+            cache_file (str): 特徴量キャッシュ（Noneの場合は feature_cache_<ディレクトリ名>.<形式>）
+            cache_format (str): キャッシュ形式 'json' または 'sqlite'
+            model_file (str): クラスタリングモデルの保存先（Noneの場合は cluster_model_<ディレクトリ名>.npz）
+            k (int): 最大クラスタ数
+            pool (JoernWorkerPool): 常駐ワーカープール（Noneの場合はこのプロセスで抽出）
+            workers (int): 並列ワーカー数（pool未指定時）
+            store (FeatureStore): 特徴量ストア
+        """
+        base_name = os.path.basename(os.path.normpath(target_directory))
+        if cache_file is None:
+            cache_extension = 'sqlite' if cache_format == 'sqlite' else 'json'
+            cache_file = f"feature_cache_{base_name}.{cache_extension}"
+        if model_file is None:
+            model_file = f"cluster_model_{base_name}.npz"
+
+        self.target_directory = target_directory
+        self.cache_file = cache_file
+        self.cache_format = 'sqlite' if is_sqlite_cache(cache_file) else cache_format
+        self.model_file = model_file
+        self.assignments_file = f"{os.path.splitext(model_file)[0]}_assignments.json"
+        self.k = k
+        self.pool = pool
+        self.workers = workers
+        self.store = store
+        self.model = None
+        self.assignments = {}  # ファイルパス -> {'cluster_id', 'distance', 'updated_at'}
+
+    # --- モデル ---
+    def load_model(self):
+        """保存済みのモデルと割り当てを読み込む（なければキャッシュから構築、キャッシュもなければ空）"""
+        if os.path.exists(self.model_file):
+            self.model = OnlineClusterModel.load(self.model_file)
+            print(f"📂 モデル読み込み: {self.model_file}")
+            if os.path.exists(self.assignments_file):
+                with open(self.assignments_file, 'r', encoding='utf-8') as f:
+                    self.assignments = json.load(f)
+            return
+
+        self.model = None
+        if os.path.exists(self.cache_file):
+            try:
+                self.model = OnlineClusterModel.from_feature_cache(self.cache_file, k=self.k)
+                print(f"🆕 キャッシュからモデル構築: {self.cache_file}")
+                self._assign_cached_files()
+            except ValueError as e:
+                print(f"⚠️ {e}")
+        if self.model is None:
+            self.model = OnlineClusterModel(k=self.k)
+            print("🆕 空のモデルで開始（最初のk件がセントロイドになります）")
+
+    def _assign_cached_files(self):
+        """キャッシュ済みの全ファイルの割り当てを求める（モデルは変更しない）"""
+        cached_data = load_feature_vectors(self.cache_file)
+        for result in (cached_data or {}).get('data', []):
+            if 'error' not in result:
+                self._record(result['source_file'], self.model.assign(result['integrated_vector'], update=False))
+
+    def _record(self, source_file, assignment):
+        self.assignments[source_file] = {
+            'cluster_id': assignment['cluster_id'],
+            'distance': assignment['distance'],
+            'updated_at': datetime.now().isoformat()
+        }
+
+    def save_model(self):
+        """モデルと割り当てを保存（一時ファイル経由で置き換え）"""
+        self.model.save(self.model_file)
+        tmp_file = f"{self.assignments_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.assignments, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, self.assignments_file)
+
+    # --- 差分処理 ---
+    def sync(self):
+        """
+        ディレクトリとキャッシュの差分を処理（新規・変更ファイルだけ抽出し、オンラインで割り当て）
+
+        Returns:
+            dict: detect_file_changes の結果（変更がなければ None）
+        """
+        scan = scan_files(self.target_directory)
+        file_changes = detect_file_changes(self.target_directory, self.cache_file, scan=scan)
+        if not any(file_changes[key] for key in ['new_files', 'modified_files', 'deleted_files']):
+            return None
+
+        start = time.perf_counter()
+        updated_data = update_cache_incrementally(self.target_directory, self.cache_file, file_changes,
+                                                  pool=self.pool, workers=self.workers, store=self.store)
+        groups = analyze_file_groups(list(scan), self.target_directory)
+        save_feature_vectors(updated_data, groups, self.target_directory, self.cache_file, format=self.cache_format)
+
+        # 新規・変更ファイルだけをオンラインで割り当て
+        new_files = set(file_changes['new_files'])
+        processed = new_files | set(file_changes['modified_files'])
+        assigned = 0
+        for result in updated_data:
+            source_file = result.get('source_file')
+            if source_file not in processed:
+                continue
+            if 'error' in result:
+                self.assignments.pop(source_file, None)
+                continue
+            assignment = self.model.assign(result['integrated_vector'], update=source_file in new_files)
+            self._record(source_file, assignment)
+            assigned += 1
+        for source_file in file_changes['deleted_files']:
+            self.assignments.pop(source_file, None)
+
+        self.save_model()
+        elapsed = time.perf_counter() - start
+        print(f"✅ 更新完了: 割り当て{assigned}件, クラスタ{len(self.model.centroids)}個 ({elapsed:.1f}秒)")
+        return file_changes
+
+    def run(self, debounce=DEFAULT_DEBOUNCE, max_delay=DEFAULT_MAX_DELAY, poll_interval=DEFAULT_POLL_INTERVAL,
+            polling=False):
+        """
+        監視ループ（Ctrl+Cで停止）
+
+        Args:
+            debounce (float): 最後のイベントからこの秒数だけ静かになったら処理
+            max_delay (float): イベントが続いても最初のイベントからこの秒数で処理
+            poll_interval (float): ポーリング時の走査間隔
+            polling (bool): inotifyがあってもポーリングを使う
+        """
+        if self.model is None:
+            self.load_model()
+
+        # 監視開始前に届いていた提出を先に処理
+        watcher = open_watcher(self.target_directory, poll_interval=poll_interval, polling=polling)
+        self.sync()
+
+        print(f"🚀 監視開始: {self.target_directory}")
+        pending = set()
+        first_event = last_event = None
+        try:
+            while True:
+                changed = watcher.wait(debounce)
+                now = time.monotonic()
+                if changed:
+                    pending.update(changed)
+                    last_event = now
+                    if first_event is None:
+                        first_event = now
+                if pending and (now - last_event >= debounce or now - first_event >= max_delay):
+                    print(f"🔄 変更検出: {len(pending)}ファイル")
+                    try:
+                        self.sync()
+                    except Exception as e:
+                        print(f"❌ 更新エラー: {e}")
+                    pending.clear()
+                    first_event = last_event = None
+        except KeyboardInterrupt:
+            print("\n🛑 停止中...")
+        finally:
+            watcher.close()
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="提出ディレクトリを監視して増分抽出・オンラインクラスタリング")
+    parser.add_argument('target_directory', help="監視する提出ディレクトリ（例: submissions_typical90_d）")
+    parser.add_argument('--cache-format', choices=['json', 'sqlite'], default='json', help="キャッシュ形式")
+    parser.add_argument('--cache', default=None, help="特徴量キャッシュ（既定: feature_cache_<ディレクトリ名>.<形式>）")
+    parser.add_argument('--model', default=None, help="モデルの保存先（既定: cluster_model_<ディレクトリ名>.npz）")
+    parser.add_argument('--k', type=int, default=DEFAULT_MAX_CLUSTERS, help="最大クラスタ数（デフォルト: 16）")
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE, help="デバウンス秒数")
+    parser.add_argument('--max-delay', type=float, default=DEFAULT_MAX_DELAY, help="最初のイベントから処理までの最大秒数")
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL, help="ポーリング間隔（秒）")
+    parser.add_argument('--polling', action='store_true', help="inotifyを使わずにポーリングで監視")
+    parser.add_argument('--once', action='store_true', help="差分を1回だけ処理して終了")
+    parser.add_argument('--workers', type=int, default=1, help="常駐ワーカー数（0でこのプロセスで抽出）")
+    parser.add_argument('--timeout', type=float, default=120, help="1ファイルあたりの抽出タイムアウト秒数")
+    parser.add_argument('--memory-limit', type=float, default=None, help="1ファイルあたりのメモリ上限MB（Joernを含む常駐メモリ）")
+    parser.add_argument('--store-dir', default=None, help="特徴量ストアのディレクトリ")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.target_directory):
+        print(f"❌ ディレクトリが存在しません: {args.target_directory}")
+        return
+
+    pool = None
+    if args.workers > 0:
+        from joern_worker_pool import JoernWorkerPool
+        pool = JoernWorkerPool(n_workers=args.workers, job_timeout=args.timeout, memory_limit_mb=args.memory_limit).start()
+
+    session = WatchSession(args.target_directory, args.cache, args.cache_format, args.model, args.k,
+                           pool=pool, store=open_feature_store(args.store_dir))
+    try:
+        if args.once:
+            session.load_model()
+            session.sync()
+        else:
+            session.run(args.debounce, args.max_delay, args.poll_interval, args.polling)
+    finally:
+        if pool is not None:
+            pool.close()
+
+if __name__ == "__main__":
+    main()
+
+# 使用例:
+#
+# # 提出ディレクトリを監視（inotify_simple があればinotify、なければ2秒間隔のポーリング）
+# python watch_mode.py submissions_typical90_d --model model_d.npz
+#
+# # SQLiteキャッシュ・ポーリング固定・デバウンス5秒
+# python watch_mode.py submissions_typical90_d --cache-format sqlite --polling --debounce 5
+#
+# # cron等から差分だけ1回処理
+# python watch_mode.py submissions_typical90_d --once
+#
+# from watch_mode import WatchSession
+# session = WatchSession("submissions_typical90_d")
+# session.load_model()
+# session.sync()
+# print(session.assignments)  # {ファイルパス: {'cluster_id', 'distance', 'updated_at'}}
@@ -9,6 +9,11 @@ from datetime import datetime
 import ast
 import keyword
 import re
+import sys
+
+# ステートメント文字列インデックス（analyze/data-flow/statement_index.py）
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analyze', 'data-flow'))
+from statement_index import statement_index
 
 # Pyjoernを利用してPythonコードのCFG、AST、DDGを解析・視覚化するツール
 # グラフ化したいコードはmain関数から指定
@@ -127,6 +132,7 @@ def analyze_python_construct(stmt_str):
 
 def create_node_labels(graph, graph_type="CFG"):
     """グラフノードのラベルを作成（絵文字なし）"""
+    index = statement_index(graph)
     labels = {}
 
     for node in graph.nodes():
@@ -142,20 +148,19 @@ def create_node_labels(graph, graph_type="CFG"):
                 stmt_count = len(node.statements)
 
                 # 特別処理: FUNCTION_START + 条件判定の場合
-                has_function_start = any('FUNCTION_START' in str(stmt) for stmt in node.statements)
-                has_condition = any('Compare:' in str(stmt) for stmt in node.statements if 'FUNCTION_START' not in str(stmt))
+                has_function_start = any('FUNCTION_START' in text for text in index.texts(node))
+                has_condition = any('Compare:' in text for text in index.texts(node) if 'FUNCTION_START' not in text)
 
                 if has_function_start and has_condition:
                     # 問題のノードの場合、明確に分離表示
                     base_label = "[START] FUNCTION ENTRY\n" + "="*16
-                    for i, stmt in enumerate(node.statements):
-                        if 'FUNCTION_START' in str(stmt):
+                    for i, stmt_str in enumerate(index.texts(node)):
+                        if 'FUNCTION_START' in stmt_str:
                             base_label += f"\n[START] Function begins"
-                        elif 'Compare:' in str(stmt):
-                            condition = str(stmt).replace('Compare: ', '')
+                        elif 'Compare:' in stmt_str:
+                            condition = stmt_str.replace('Compare: ', '')
                             base_label += f"\n[COND] if {condition}"
                         else:
-                            stmt_str = str(stmt)
                             if len(stmt_str) > 25:
                                 stmt_str = stmt_str[:22] + "..."
                             base_label += f"\n[{i}]: {stmt_str}"
@@ -168,8 +173,7 @@ def create_node_labels(graph, graph_type="CFG"):
                     primary_content = ""
 
                     # 主要なステートメントタイプを特定（汎用的なパターン検出）
-                    for stmt in node.statements:
-                        stmt_str = str(stmt)
+                    for stmt_str in index.texts(node):
 
                         # ループ構造の判定
                         if 'iteratorNonEmptyOrException' in stmt_str or 'iterator' in stmt_str.lower():
@@ -231,7 +235,7 @@ def create_node_labels(graph, graph_type="CFG"):
                     else:
                         # フォールバック：最初のステートメントのみ表示
                         if len(node.statements) > 0:
-                            stmt_str = str(node.statements[0])
+                            stmt_str = index.texts(node)[0]
                             if len(stmt_str) > 25:
                                 stmt_str = stmt_str[:22] + "..."
                             base_label += f"\n[STMT] {stmt_str}"
@@ -271,6 +275,7 @@ def create_node_labels(graph, graph_type="CFG"):
 
 def get_edge_colors_and_styles(graph, graph_type="CFG"):
     """エッジの色とスタイルを決定"""
+    index = statement_index(graph)
     edge_colors = []
     edge_styles = []
 
@@ -284,7 +289,7 @@ def get_edge_colors_and_styles(graph, graph_type="CFG"):
         if hasattr(source, 'addr') and hasattr(target, 'addr'):
             if source.addr > target.addr:  # 後ろから前へのエッジはループバック
                 # ただし、関数終了ノードからのエッジは除外
-                source_stmts = [str(stmt) for stmt in source.statements] if hasattr(source, 'statements') and source.statements else []
+                source_stmts = index.texts(source)
 
                 # 関数終了や出口ノードからのエッジはループではない
                 is_function_end_source = any('FUNCTION_END' in stmt for stmt in source_stmts)
@@ -303,7 +308,7 @@ def get_edge_colors_and_styles(graph, graph_type="CFG"):
 
         # 条件分岐エッジ（汎用的な検出）
         if hasattr(source, 'statements') and source.statements:
-            source_stmts = [str(stmt) for stmt in source.statements]
+            source_stmts = index.texts(source)
             # Compare文があるかどうかで条件分岐を判定（汎用的）
             has_condition = any('Compare:' in stmt for stmt in source_stmts)
 
@@ -320,6 +325,7 @@ def get_edge_colors_and_styles(graph, graph_type="CFG"):
 
 def get_edge_labels(graph, graph_type="CFG"):
     """エッジにラベルを追加（True/False分岐など）"""
+    index = statement_index(graph)
     edge_labels = {}
 
     if graph_type != "CFG":
@@ -334,8 +340,8 @@ def get_edge_labels(graph, graph_type="CFG"):
             # 後ろから前へのエッジ（アドレスが逆順）はループバック
             if source.addr > target.addr:
                 # ただし、関数終了ノードからのエッジは除外
-                source_stmts = [str(stmt) for stmt in source.statements] if hasattr(source, 'statements') and source.statements else []
-                target_stmts = [str(stmt) for stmt in target.statements] if hasattr(target, 'statements') and target.statements else []
+                source_stmts = index.texts(source)
+                target_stmts = index.texts(target)
 
                 # 関数終了や出口ノードからのエッジはループではない
                 is_function_end_source = any('FUNCTION_END' in stmt for stmt in source_stmts)
@@ -348,7 +354,7 @@ def get_edge_labels(graph, graph_type="CFG"):
 
         # ソースノードが条件判定ノードかチェック（汎用的）
         if hasattr(source, 'statements') and source.statements:
-            source_stmts = [str(stmt) for stmt in source.statements]
+            source_stmts = index.texts(source)
 
             # 条件判定がある場合（Compare文で汎用的に判定）
             has_condition = any('Compare:' in stmt for stmt in source_stmts)
@@ -362,6 +368,7 @@ def get_edge_labels(graph, graph_type="CFG"):
 
 def get_node_colors(graph, graph_type="CFG"):
     """グラフタイプに応じたノードの色を決定"""
+    index = statement_index(graph)
     colors = []
 
     for node in graph.nodes():
@@ -370,8 +377,8 @@ def get_node_colors(graph, graph_type="CFG"):
 
             # 特別処理: FUNCTION_START + 条件判定の組み合わせノード
             if hasattr(node, 'statements') and node.statements:
-                has_function_start = any('FUNCTION_START' in str(stmt) for stmt in node.statements)
-                has_condition = any('Compare:' in str(stmt) for stmt in node.statements if 'FUNCTION_START' not in str(stmt))
+                has_function_start = any('FUNCTION_START' in text for text in index.texts(node))
+                has_condition = any('Compare:' in text for text in index.texts(node) if 'FUNCTION_START' not in text)
 
                 if has_function_start and has_condition:
                     colors.append('#FF6B6B')  # 問題のノードは赤系で警告
@@ -386,7 +393,7 @@ def get_node_colors(graph, graph_type="CFG"):
             else:
                 # ステートメントタイプに応じた色分け
                 if hasattr(node, 'statements') and node.statements:
-                    stmt_types = [str(stmt) for stmt in node.statements]
+                    stmt_types = index.texts(node)
                     if any('Compare:' in stmt for stmt in stmt_types):
                         colors.append('#87CEFA')  # 条件判定は薄い青
                     elif any('Call:' in stmt for stmt in stmt_types):
@@ -9,6 +9,11 @@ from datetime import datetime
 import ast
 import keyword
 import re
+import sys
+
+# ステートメント文字列インデックス（analyze/data-flow/statement_index.py）
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analyze', 'data-flow'))
+from statement_index import statement_index
 
 # Pyjoernを利用してPythonコードのCFG、AST、DDGを解析・視覚化するツール
 # 関数レベルとモジュールレベルの両方に対応
@@ -127,6 +132,7 @@ def analyze_python_construct(stmt_str):
 
 def create_node_labels(graph, graph_type="CFG"):
     """グラフノードのラベルを作成（絵文字なし）"""
+    index = statement_index(graph)
     labels = {}
 
     for node in graph.nodes():
@@ -142,7 +148,7 @@ def create_node_labels(graph, graph_type="CFG"):
                 stmt_count = len(node.statements)
 
                 # 特別処理: FUNCTION_START を含むノードは常にすべて表示
-                has_function_start = any('FUNCTION_START' in str(stmt) for stmt in node.statements)
+                has_function_start = any('FUNCTION_START' in text for text in index.texts(node))
 
                 if has_function_start:
                     # FUNCTION_STARTを含むノードはすべてのステートメントを詳細表示
@@ -154,8 +160,8 @@ def create_node_labels(graph, graph_type="CFG"):
                     print(f"Address: {getattr(node, 'addr', 'N/A')}")
                     print(f"Statement count: {len(node.statements)}")
 
-                    for i, stmt in enumerate(node.statements):
-                        stmt_str = str(stmt)
+                    for i, entry in enumerate(index.statements(node)):
+                        stmt, stmt_str = entry.stmt, entry.text
                         stmt_type = type(stmt).__name__ if hasattr(stmt, '__class__') else 'Unknown'
 
                         # UnsupportedStmtを含むステートメントはスキップ
@@ -203,8 +209,7 @@ def create_node_labels(graph, graph_type="CFG"):
                     primary_content = ""
 
                     # 主要なステートメントタイプを特定（汎用的なパターン検出）
-                    for stmt in node.statements:
-                        stmt_str = str(stmt)
+                    for stmt_str in index.texts(node):
 
                         # ループ構造の判定
                         if 'iteratorNonEmptyOrException' in stmt_str or 'iterator' in stmt_str.lower():
@@ -266,8 +271,8 @@ def create_node_labels(graph, graph_type="CFG"):
                     # else:
 
                     # 意味のあるステートメントのみを表示（UnsupportedStmtを除外）
-                    for i, stmt in enumerate(node.statements):
-                        stmt_str = str(stmt)
+                    for i, entry in enumerate(index.statements(node)):
+                        stmt, stmt_str = entry.stmt, entry.text
 
                         # UnsupportedStmtを含むステートメントはスキップ
                         if 'UnsupportedStmt' in stmt_str:
@@ -337,6 +342,7 @@ def create_node_labels(graph, graph_type="CFG"):
 
 def get_edge_colors_and_styles(graph, graph_type="CFG"):
     """エッジの色とスタイルを決定"""
+    index = statement_index(graph)
     edge_colors = []
     edge_styles = []
 
@@ -350,7 +356,7 @@ def get_edge_colors_and_styles(graph, graph_type="CFG"):
         if hasattr(source, 'addr') and hasattr(target, 'addr'):
             if source.addr > target.addr:  # 後ろから前へのエッジはループバック
                 # ただし、関数終了ノードからのエッジは除外
-                source_stmts = [str(stmt) for stmt in source.statements] if hasattr(source, 'statements') and source.statements else []
+                source_stmts = index.texts(source)
 
                 # 関数終了や出口ノードからのエッジはループではない
                 is_function_end_source = any('FUNCTION_END' in stmt for stmt in source_stmts)
@@ -369,7 +375,7 @@ def get_edge_colors_and_styles(graph, graph_type="CFG"):
 
         # 条件分岐エッジ（汎用的な検出）
         if hasattr(source, 'statements') and source.statements:
-            source_stmts = [str(stmt) for stmt in source.statements]
+            source_stmts = index.texts(source)
             # Compare文があるかどうかで条件分岐を判定（汎用的）
             has_condition = any('Compare:' in stmt for stmt in source_stmts)
 
@@ -386,6 +392,7 @@ def get_edge_colors_and_styles(graph, graph_type="CFG"):
 
 def get_edge_labels(graph, graph_type="CFG"):
     """エッジにラベルを追加（True/False分岐など）"""
+    index = statement_index(graph)
     edge_labels = {}
 
     if graph_type != "CFG":
@@ -400,8 +407,8 @@ def get_edge_labels(graph, graph_type="CFG"):
             # 後ろから前へのエッジ（アドレスが逆順）はループバック
             if source.addr > target.addr:
                 # ただし、関数終了ノードからのエッジは除外
-                source_stmts = [str(stmt) for stmt in source.statements] if hasattr(source, 'statements') and source.statements else []
-                target_stmts = [str(stmt) for stmt in target.statements] if hasattr(target, 'statements') and target.statements else []
+                source_stmts = index.texts(source)
+                target_stmts = index.texts(target)
 
                 # 関数終了や出口ノードからのエッジはループではない
                 is_function_end_source = any('FUNCTION_END' in stmt for stmt in source_stmts)
@@ -414,7 +421,7 @@ def get_edge_labels(graph, graph_type="CFG"):
 
         # ソースノードが条件判定ノードかチェック（汎用的）
         if hasattr(source, 'statements') and source.statements:
-            source_stmts = [str(stmt) for stmt in source.statements]
+            source_stmts = index.texts(source)
 
             # 条件判定がある場合（Compare文で汎用的に判定）
             has_condition = any('Compare:' in stmt for stmt in source_stmts)
@@ -428,6 +435,7 @@ def get_edge_labels(graph, graph_type="CFG"):
 
 def get_node_colors(graph, graph_type="CFG"):
     """グラフタイプに応じたノードの色を決定"""
+    index = statement_index(graph)
     colors = []
 
     for node in graph.nodes():
@@ -436,8 +444,8 @@ def get_node_colors(graph, graph_type="CFG"):
 
             # 特別処理: FUNCTION_START + 条件判定の組み合わせノード
             if hasattr(node, 'statements') and node.statements:
-                has_function_start = any('FUNCTION_START' in str(stmt) for stmt in node.statements)
-                has_condition = any('Compare:' in str(stmt) for stmt in node.statements if 'FUNCTION_START' not in str(stmt))
+                has_function_start = any('FUNCTION_START' in text for text in index.texts(node))
+                has_condition = any('Compare:' in text for text in index.texts(node) if 'FUNCTION_START' not in text)
 
                 if has_function_start and has_condition:
                     colors.append('#FF6B6B')  # 問題のノードは赤系で警告
@@ -452,7 +460,7 @@ def get_node_colors(graph, graph_type="CFG"):
             else:
                 # ステートメントタイプに応じた色分け
                 if hasattr(node, 'statements') and node.statements:
-                    stmt_types = [str(stmt) for stmt in node.statements]
+                    stmt_types = index.texts(node)
                     if any('Compare:' in stmt for stmt in stmt_types):
                         colors.append('#87CEFA')  # 条件判定は薄い青
                     elif any('Call:' in stmt for stmt in stmt_types):